@@ -4,8 +4,11 @@ import csv
 import os
 import asyncio
 import httpx
-import json
 import glob
+import time
+from urllib.parse import urlsplit
+
+from common import aio, cassette, latency, metrics, profiling, serialization
 
 # Custom User-Agent header
 USER_AGENT = (
@@ -16,17 +19,42 @@ USER_AGENT = (
 
 LIMIT = 1000
 
+# API host; override with GROUND_NEWS_API to run against a local stand-in (see benchmark/)
+API_BASE = os.environ.get("GROUND_NEWS_API", "https://web-api-cdn.ground.news")
+API_DOMAIN = urlsplit(API_BASE).netloc
+
+# Rate-limiting sleeps, as (base, random extra) seconds
+STORY_SLEEP = (0.5, 5)
+FILE_SLEEP = (10, 60)
+
+# Multiplier applied to every rate-limiting sleep (set with --sleep-scale)
+SLEEP_SCALE = 1.0
+
+# Request timeout until enough latencies are observed for an adaptive one (see common/latency.py)
+API_TIMEOUT = 10
+
 async def fetch_news_source(client: httpx.AsyncClient, story_id: str) -> dict:
     """
     Fetch news source data for a given story ID.
     """
-    url = f"https://web-api-cdn.ground.news/api/v06/story/{story_id}/sourcesForWeb"
+    url = f"{API_BASE}/api/v06/story/{story_id}/sourcesForWeb"
     headers = {"User-Agent": USER_AGENT}
+    key = ("sources_for_web", API_DOMAIN)
+    tic = time.perf_counter()
     try:
-        response = await client.get(url, headers=headers, timeout=10)
+        with metrics.span("fetch"):
+            response = await client.get(url, headers=headers, timeout=latency.TRACKER.timeout(key, API_TIMEOUT))
+        metrics.observe_request("sources_for_web", API_DOMAIN, response.status_code,
+                                time.perf_counter() - tic, len(response.content))
+        # Error responses come back quickly and say nothing about the timeout; only timeouts count
+        if response.is_success:
+            latency.TRACKER.observe(key, time.perf_counter() - tic)
         response.raise_for_status()
         return response.json()
     except Exception as e:
+        if isinstance(e, httpx.TimeoutException):
+            latency.TRACKER.observe(key, time.perf_counter() - tic, ok=False)
+        metrics.observe_error("news_sources", e)
         print(f"[ERROR] Fetching story {story_id}: {e}")
         return {}
 
@@ -41,9 +69,10 @@ def read_story_ids_from_csv(csv_filename: str) -> list:
             story_ids.append(row["story_id"])
     return story_ids
 
-async def process_csv_file(csv_file: str, output_dir: str):
+async def process_csv_file(csv_file: str, output_dir: str, writer: aio.AsyncWriter = None):
     """
     Process a single CSV file by sequentially fetching story data and saving all results to a JSON file.
+    The CSV is read in a thread and the JSON written through `writer`, so neither blocks the loop.
     """
     print(f"[INFO] Processing CSV file: {csv_file}")
     base_name = os.path.splitext(os.path.basename(csv_file))[0]
@@ -52,36 +81,41 @@ async def process_csv_file(csv_file: str, output_dir: str):
         print(f"[INFO] Output file already exists: {output_file}. Skipping.")
         return
     
-    story_ids = read_story_ids_from_csv(csv_file)
+    story_ids = await asyncio.to_thread(read_story_ids_from_csv, csv_file)
     if LIMIT and len(story_ids) > LIMIT:
         story_ids = story_ids[:LIMIT]
     
     results = {}
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(transport=cassette.async_transport()) as client:
         for story_id in story_ids:
             data = await fetch_news_source(client, story_id)
             if data:
                 results[story_id] = data
+                metrics.ITEMS.inc(stage="news_sources", outcome="fetched")
                 print(f"[INFO] Fetched news source for story ID {story_id}")
-            await asyncio.sleep(0.5 + 5 * random.random())  # Rate limiting
+            else:
+                metrics.ITEMS.inc(stage="news_sources", outcome="failed")
+            await asyncio.sleep((STORY_SLEEP[0] + STORY_SLEEP[1] * random.random()) * SLEEP_SCALE)  # Rate limiting
 
 
-    with open(output_file, "w", encoding="utf-8") as file:
-        json.dump(results, file, indent=4)
+    with metrics.span("persist"):
+        await aio.write(writer, serialization.dump, results, output_file, key=output_file)
 
-    print(f"[INFO] Saved aggregated news sources for {csv_file} to {output_file}")
-    await asyncio.sleep(10 + 60 * random.random())  # Rate limiting
+    print(f"[INFO] Saving aggregated news sources for {csv_file} to {output_file}")
+    await asyncio.sleep((FILE_SLEEP[0] + FILE_SLEEP[1] * random.random()) * SLEEP_SCALE)  # Rate limiting
 
-async def worker(queue: asyncio.Queue, output_dir: str):
+async def worker(queue: asyncio.Queue, output_dir: str, writer: aio.AsyncWriter = None):
     """
     Worker that continuously gets CSV file paths from the queue, processes them sequentially, and marks tasks as done.
     """
     while True:
         csv_file = await queue.get()
+        metrics.QUEUE_DEPTH.set(queue.qsize(), queue="csv_files")
         if csv_file is None:  # Sentinel to signal worker shutdown
             queue.task_done()
             break
-        await process_csv_file(csv_file, output_dir)
+        with metrics.busy("csv_files"), metrics.span("csv_file"):
+            await process_csv_file(csv_file, output_dir, writer)
         queue.task_done()
 
 async def main():
@@ -92,8 +126,17 @@ async def main():
     parser.add_argument('-i', '--input-dir', required=True, help="Directory containing CSV files (each must include a 'story_id' column).")
     parser.add_argument("-o", '--output-dir', default="news_sources", help="Directory to save aggregated JSON files (default: news_sources).")
     parser.add_argument('-w', '--num-workers', type=int, default=5, help="Number of workers to process CSV files (default: 5).")
+    parser.add_argument('--sleep-scale', type=float, default=1.0, help="Multiplier for the rate-limiting sleeps (default: 1.0).")
+    parser.add_argument('--metrics-port', type=int, default=None, help="Expose Prometheus metrics on this local port (default: off).")
+    profiling.add_argument(parser)
+    aio.add_argument(parser)
     args = parser.parse_args()
 
+    global SLEEP_SCALE
+    SLEEP_SCALE = args.sleep_scale
+    metrics.start_metrics_server(args.metrics_port)
+    profiling.start(args.profile)
+
     os.makedirs(args.output_dir, exist_ok=True)
 
     # Enqueue all CSV files found in the input directory.
@@ -105,15 +148,20 @@ async def main():
     queue = asyncio.Queue()
     for csv_file in csv_files:
         queue.put_nowait(csv_file)
+    metrics.QUEUE_DEPTH.set(queue.qsize(), queue="csv_files")
+    metrics.WORKERS_TOTAL.set(args.num_workers, pool="csv_files")
 
-    workers = [asyncio.create_task(worker(queue, args.output_dir)) for _ in range(args.num_workers)]
+    monitor = aio.LoopMonitor(args.stall_ms / 1000).start()
+    async with aio.AsyncWriter() as writer:
+        workers = [asyncio.create_task(worker(queue, args.output_dir, writer)) for _ in range(args.num_workers)]
 
-    await queue.join()
+        await queue.join()
 
-    # Signal workers to shut down.
-    for _ in range(args.num_workers):
-        queue.put_nowait(None)
-    await asyncio.gather(*workers)
+        # Signal workers to shut down.
+        for _ in range(args.num_workers):
+            queue.put_nowait(None)
+        await asyncio.gather(*workers)
+    monitor.stop()
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -1,14 +1,37 @@
 import random
 import argparse
+import csv
 import os
+import time
 import asyncio
 import httpx
 import json
-import pandas as pd
-from typing import Set, Tuple
+from typing import TYPE_CHECKING, Optional, Tuple
+from urllib.parse import urlsplit
+
+from common import aio, cassette, latency, metrics, profiling, serialization
+
+if TYPE_CHECKING:
+    from common.idset import UuidSet
 
 STEP = 100  # Number of story IDs to fetch in each request
 
+# API host; override with GROUND_NEWS_API to run against a local stand-in (see benchmark/)
+API_BASE = os.environ.get("GROUND_NEWS_API", "https://web-api-cdn.ground.news")
+API_DOMAIN = urlsplit(API_BASE).netloc
+
+# Multiplier applied to every rate-limiting sleep (set with --sleep-scale)
+SLEEP_SCALE = 1.0
+
+# Request timeout until enough latencies are observed for an adaptive one (see common/latency.py)
+API_TIMEOUT = 10
+
+# Refresh scheduling: an interest is refreshed again after `interval` seconds, where
+# the interval halves for hot interests and doubles for cold ones, within these bounds.
+REFRESH_MIN_INTERVAL = 6 * 3600
+REFRESH_MAX_INTERVAL = 7 * 24 * 3600
+REFRESH_TARGET_NEW = STEP // 2  # Aim for roughly half a page of new stories per refresh
+
 # Custom User-Agent header
 USER_AGENT = (
     "Mozilla/5.0 (Windows NT 10.0; WOW64; x64) "
@@ -16,84 +39,214 @@ USER_AGENT = (
     "Chrome/132.0.6788.76 Safari/537.36"
 )
 
-# --- Progress helpers using an in-memory dictionary ---
+CHECKPOINT_INTERVAL = 30  # Seconds between periodic progress checkpoints
+
+# --- Progress tracking with O(1) counters and atomic checkpoints ---
 
-def load_progress(progress_csv_path: str) -> dict:
+class ProgressTracker:
     """
-    Load progress from CSV if it exists; otherwise, return an empty dict.
+    Per-interest progress (finished flag and last fetched offset) for a single event loop.
+    All mutations happen on the loop thread between awaits, so no lock is needed.
+    """
+
+    def __init__(self, progress_csv_path: str, total_count: int = 0):
+        self.progress_csv_path = progress_csv_path
+        self.total_count = total_count
+        self.state = {}  # interest_slug -> {"finished": bool, "last_offset": int or None}
+        self.finished_count = 0
+        self.dirty = False
+
+    def load(self) -> None:
+        """
+        Load progress from CSV if it exists. Older files without a last_offset column are accepted.
+        """
+        if not os.path.exists(self.progress_csv_path):
+            return
+        with open(self.progress_csv_path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                last_offset = row.get("last_offset")
+                self.state[row["interest_slug"]] = {
+                    "finished": row["finished"] == "True",
+                    "last_offset": int(last_offset) if last_offset else None,
+                }
+        self.finished_count = sum(1 for v in self.state.values() if v["finished"])
+
+    def is_finished(self, interest_slug: str) -> bool:
+        return self.state.get(interest_slug, {}).get("finished", False)
+
+    def last_offset(self, interest_slug: str):
+        return self.state.get(interest_slug, {}).get("last_offset")
+
+    def update(self, interest_slug: str, finished: bool = None, last_offset: int = None) -> None:
+        """
+        Update (or add) an interest record, keeping the finished counter in sync.
+        """
+        entry = self.state.setdefault(interest_slug, {"finished": False, "last_offset": None})
+        if finished is not None and finished != entry["finished"]:
+            self.finished_count += 1 if finished else -1
+            entry["finished"] = finished
+        if last_offset is not None:
+            entry["last_offset"] = last_offset
+        self.dirty = True
+
+    def snapshot(self) -> list:
+        """
+        Progress rows as of now, for writing outside the loop thread. Clears the dirty flag.
+        """
+        self.dirty = False
+        return [[slug, v["finished"], "" if v["last_offset"] is None else v["last_offset"]]
+                for slug, v in self.state.items()]
+
+    def write(self, rows: list) -> None:
+        """
+        Atomically write progress rows to CSV: write to a temporary file, then rename over the old one.
+        """
+        tmp_path = self.progress_csv_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["interest_slug", "finished", "last_offset"])
+            writer.writerows(rows)
+        os.replace(tmp_path, self.progress_csv_path)
+
+    def checkpoint(self) -> None:
+        """
+        Atomically write the current progress to CSV.
+        """
+        self.write(self.snapshot())
+
+async def checkpoint_loop(progress: ProgressTracker, interval: int = CHECKPOINT_INTERVAL,
+                          writer: aio.AsyncWriter = None) -> None:
     """
-    if os.path.exists(progress_csv_path):
-        df = pd.read_csv(progress_csv_path, dtype={"interest_slug": str, "finished": bool})
-        return dict(zip(df["interest_slug"], df["finished"]))
+    Periodically checkpoint progress so that a hard kill loses at most `interval` seconds of work.
+    The CSV is written off the loop; only the row snapshot is taken on it.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        if progress.dirty:
+            try:
+                rows = progress.snapshot()
+                if writer is None:
+                    await asyncio.to_thread(progress.write, rows)
+                else:
+                    await writer.snapshot(progress.progress_csv_path, progress.write, rows)
+            except Exception as e:
+                print(f"[ERROR] Failed to checkpoint progress: {e}")
+
+# --- Refresh state helpers (per-interest high-water marks) ---
+
+def load_refresh_state(refresh_state_path: str) -> dict:
+    """
+    Load the per-interest refresh state from JSON if it exists; otherwise, return an empty dict.
+    """
+    if os.path.exists(refresh_state_path):
+        return serialization.load(refresh_state_path)
     return {}
 
-async def update_progress(progress: dict, interest_slug: str, finished: bool, lock: asyncio.Lock) -> None:
+def save_refresh_state(refresh_state: dict, refresh_state_path: str) -> None:
     """
-    Update (or add) an interest record in the in-memory progress dictionary.
+    Atomically save the per-interest refresh state to a JSON file.
     """
-    async with lock:
-        progress[interest_slug] = finished
+    serialization.dump(refresh_state, refresh_state_path, atomic=True)
 
-async def is_interest_finished(progress: dict, interest_slug: str, lock: asyncio.Lock) -> bool:
+def is_refresh_due(entry: dict, now: float) -> bool:
     """
-    Check if the interest is already marked as finished in the in-memory progress dictionary.
+    Check whether an interest is due for a refresh according to its schedule.
     """
-    async with lock:
-        return progress.get(interest_slug, False)
+    return now >= entry.get("next_refresh", 0)
 
-def save_progress(progress: dict, progress_csv_path: str) -> None:
+def schedule_next_refresh(entry: dict, new_count: int, now: float) -> None:
     """
-    Save the in-memory progress dictionary to a CSV file using pandas.
+    Update the refresh interval of an interest based on how many new stories the last refresh found.
+    Hot interests (many new stories) are refreshed more often, cold ones less often.
     """
-    df = pd.DataFrame(list(progress.items()), columns=["interest_slug", "finished"])
-    df.to_csv(progress_csv_path, index=False)
+    interval = entry.get("interval", REFRESH_MIN_INTERVAL)
+    if new_count >= REFRESH_TARGET_NEW:
+        interval = max(REFRESH_MIN_INTERVAL, interval // 2)
+    elif new_count < REFRESH_TARGET_NEW // 4:
+        interval = min(REFRESH_MAX_INTERVAL, interval * 2)
+    entry["interval"] = interval
+    entry["last_refresh"] = now
+    entry["last_new_count"] = new_count
+    entry["next_refresh"] = now + interval
+
+# --- CSV helpers for story IDs ---
+
+def read_existing_story_csv(filename: str) -> "UuidSet":
+    """
+    Read an existing CSV file and return the set of unique story IDs in it, as a compact UuidSet.
+    common.idset (and NumPy) is imported here, off the startup path.
+    """
+    from common.idset import UuidSet
 
-# --- CSV helpers for story IDs using pandas ---
+    if not os.path.exists(filename):
+        return UuidSet()
+    with open(filename, "r", encoding="utf-8", newline="") as f:
+        return UuidSet(row["story_id"] for row in csv.DictReader(f))
 
-def read_existing_story_csv(filename: str) -> Tuple[pd.DataFrame, Set[str]]:
+def append_story_csv(filename: str, rows: list) -> None:
     """
-    Read an existing CSV file and return a DataFrame and a set of unique story IDs.
+    Append {"offset", "story_id"} rows to a CSV file, writing the header if the file is new.
     """
-    if os.path.exists(filename):
-        df = pd.read_csv(filename, dtype={"offset": int, "story_id": str})
-        unique_ids = set(df["story_id"].tolist())
-    else:
-        df = pd.DataFrame(columns=["offset", "story_id"])
-        unique_ids = set()
-    return df, unique_ids
-
-def write_story_csv(filename: str, df: pd.DataFrame) -> None:
+    write_header = not os.path.exists(filename) or os.path.getsize(filename) == 0
+    with open(filename, "a", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["offset", "story_id"])
+        if write_header:
+            writer.writeheader()
+        writer.writerows(rows)
+
+async def append_story_rows(writer: aio.AsyncWriter, filename: str, rows: list) -> None:
     """
-    Write the DataFrame to a CSV file.
+    Append story rows through the writer, or in a thread if there is none.
     """
-    df.to_csv(filename, index=False)
+    if writer is None:
+        await asyncio.to_thread(append_story_csv, filename, rows)
+    else:
+        await writer.append(append_story_csv, filename, rows)
 
 # --- Fetching and processing functions ---
 
-async def fetch_story_ids(client: httpx.AsyncClient, interest_id: str, offset: int) -> list:
+async def fetch_story_ids(client: httpx.AsyncClient, interest_id: str, offset: int, sort: str = None) -> list:
     """
     Fetch story IDs for a given interest (by interest_id) starting from the specified offset.
     """
-    url = f"https://web-api-cdn.ground.news/api/public/interest/{interest_id}/events?offset={offset}"
+    url = f"{API_BASE}/api/public/interest/{interest_id}/events?offset={offset}"
+    if sort:
+        url += f"&sort={sort}"
     headers = {"User-Agent": USER_AGENT}
+    key = ("interest_events", API_DOMAIN)
+    tic = time.perf_counter()
     try:
-        response = await client.get(url, headers=headers, timeout=10)
+        with metrics.span("fetch"):
+            response = await client.get(url, headers=headers, timeout=latency.TRACKER.timeout(key, API_TIMEOUT))
+        metrics.observe_request("interest_events", API_DOMAIN, response.status_code,
+                                time.perf_counter() - tic, len(response.content))
+        # Error responses come back quickly and say nothing about the timeout; only timeouts count
+        if response.is_success:
+            latency.TRACKER.observe(key, time.perf_counter() - tic)
         response.raise_for_status()
         return response.json().get("eventIds", [])
     except Exception as e:
+        if isinstance(e, httpx.TimeoutException):
+            latency.TRACKER.observe(key, time.perf_counter() - tic, ok=False)
+        metrics.observe_error("story_ids", e)
         print(f"[ERROR] Interest {interest_id} at offset {offset}: {e}")
         return []
 
 async def process_event(interest_id: str, interest_slug: str, initial_offset: int, top_n: int,
                         client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
-                        output_dir: str, progress: dict, progress_lock: asyncio.Lock) -> None:
+                        output_dir: str, progress: ProgressTracker, emit=None,
+                        writer: aio.AsyncWriter = None) -> None:
     """
     Repeatedly fetch story IDs until we have at least top_n unique IDs for the interest.
     When a request returns no new IDs or the target is reached, mark the interest as finished.
+    Resumes from the last checkpointed offset of the interest, if any.
+    If given, `emit(interest_slug, story_ids)` is awaited with the new IDs of every page.
+    New rows are appended through `writer` (see common/aio.py), off the event loop.
     """
     filename = os.path.join(output_dir, "story_ids_by_interest", f"story_ids_{interest_slug}.csv")
-    df, unique_ids = read_existing_story_csv(filename)
-    current_offset = initial_offset
+    unique_ids = await asyncio.to_thread(read_existing_story_csv, filename)
+    resume_offset = progress.last_offset(interest_slug)
+    current_offset = resume_offset if resume_offset is not None else initial_offset
 
     while len(unique_ids) < top_n:
         async with semaphore:
@@ -101,7 +254,7 @@ async def process_event(interest_id: str, interest_slug: str, initial_offset: in
 
         if not new_ids_list:
             print(f"[INFO] No new IDs returned for interest {interest_slug} at offset {current_offset}. Marking as finished.")
-            await update_progress(progress, interest_slug, True, progress_lock)
+            progress.update(interest_slug, finished=True)
             break
 
         new_id_count = 0
@@ -115,76 +268,242 @@ async def process_event(interest_id: str, interest_slug: str, initial_offset: in
 
         print(f"[INFO] Interest {interest_slug} | Offset {current_offset} | Added {new_id_count} new IDs. Total unique IDs: {len(unique_ids)}")
         if new_rows:
-            new_df = pd.DataFrame(new_rows)
-            df = pd.concat([df, new_df], ignore_index=True)
-            write_story_csv(filename, df)
+            await append_story_rows(writer, filename, new_rows)
+            if emit is not None:
+                await emit(interest_slug, [row["story_id"] for row in new_rows])
 
         if len(unique_ids) >= top_n:
             print(f"[INFO] Reached target of {top_n} unique IDs for interest {interest_slug}. Marking as finished.")
-            await update_progress(progress, interest_slug, True, progress_lock)
+            progress.update(interest_slug, finished=True)
             break
 
         current_offset += STEP
-        await asyncio.sleep(random.random() + 0.2)
+        progress.update(interest_slug, last_offset=current_offset)
+        await asyncio.sleep((random.random() + 0.2) * SLEEP_SCALE)
 
     print(f"[DONE] Finished processing interest {interest_slug}. Total unique story IDs: {len(unique_ids)}. CSV saved as {filename}")
 
-async def process_interest(interest_name: str, endpoint: str, initial_offset: int, top_n: int,
+async def refresh_event(interest_id: str, interest_slug: str, max_pages: int,
+                        client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
+                        output_dir: str, refresh_state: dict, writer: aio.AsyncWriter = None) -> None:
+    """
+    Fetch only the stories published since the last run, newest first from offset 0.
+    Stops at the page containing the previous high-water mark, or at the first page made
+    entirely of known IDs, then reschedules the interest based on how many were new.
+    A refresh that runs out of pages first records where it stopped (gap_offset) and keeps
+    the old high-water mark. The next one continues there once it reaches known IDs, and
+    walks on past known pages until it finds the high-water mark.
+    """
+    filename = os.path.join(output_dir, "story_ids_by_interest", f"story_ids_{interest_slug}.csv")
+    unique_ids = await asyncio.to_thread(read_existing_story_csv, filename)
+    entry = refresh_state.setdefault(interest_slug, {})
+    high_water_id = entry.get("high_water_id")
+    gap_offset = entry.get("gap_offset")
+    newest_id = None
+    new_rows = []
+    current_offset = 0
+    reached = False
+    in_gap = gap_offset is not None  # Until the high-water mark, known pages do not end the refresh
+
+    for _ in range(max_pages):
+        async with semaphore:
+            page_ids = await fetch_story_ids(client, interest_id, current_offset, sort="time")
+        if not page_ids:
+            break
+        if newest_id is None:
+            newest_id = page_ids[0]
+
+        page_new = 0
+        for i, sid in enumerate(page_ids):
+            if sid in unique_ids:
+                continue
+            page_new += 1
+            new_rows.append({"offset": current_offset + i, "story_id": sid})
+            unique_ids.add(sid)
+
+        print(f"[INFO] Refresh {interest_slug} | Offset {current_offset} | Added {page_new} new IDs.")
+        if high_water_id is not None and high_water_id in page_ids:
+            reached = True
+            break
+        if page_new == 0 and gap_offset is not None:
+            # Caught up with the newest stories: continue where the last refresh stopped,
+            # pushed down by the stories published since
+            current_offset = max(current_offset + STEP, gap_offset + len(new_rows))
+            gap_offset = None
+            in_gap = True
+        elif page_new == 0 and (high_water_id is None or not in_gap):
+            reached = True
+            break
+        else:
+            current_offset += STEP
+        await asyncio.sleep((random.random() + 0.2) * SLEEP_SCALE)
+
+    if new_rows:
+        await append_story_rows(writer, filename, new_rows)
+
+    if newest_id is None:
+        # The first page could not be fetched: keep the schedule, so the interest is retried
+        print(f"[ERROR] Refresh of interest {interest_slug} got no first page; keeping its schedule.")
+        return
+    if reached:
+        entry["high_water_id"] = newest_id
+        entry.pop("gap_offset", None)
+    else:
+        entry["gap_offset"] = current_offset
+    schedule_next_refresh(entry, len(new_rows), time.time())
+    print(f"[DONE] Refreshed interest {interest_slug}. {len(new_rows)} new story IDs"
+          f"{'' if reached else f', stopped short at offset {current_offset}'}, "
+          f"next refresh in {entry['interval'] / 3600:.1f}h.")
+
+# --- Interest resolution (endpoint -> slug and interest_id) with an on-disk cache ---
+
+def load_interest_cache(interest_cache_path: str) -> dict:
+    """
+    Load the endpoint -> {slug, interest_id, fetched_at} cache if it exists; otherwise, return an empty dict.
+    """
+    if os.path.exists(interest_cache_path):
+        return serialization.load(interest_cache_path)
+    return {}
+
+def save_interest_cache(interest_cache: dict, interest_cache_path: str) -> None:
+    """
+    Atomically save the interest resolution cache to a JSON file.
+    """
+    serialization.dump(interest_cache, interest_cache_path, atomic=True)
+
+def should_skip_interest(interest_slug: str, progress: ProgressTracker, refresh_state: dict = None) -> bool:
+    """
+    Check whether an interest needs no work this run: finished in a normal run, or not due in refresh mode.
+    """
+    if refresh_state is not None:
+        return not is_refresh_due(refresh_state.get(interest_slug, {}), time.time())
+    return progress.is_finished(interest_slug)
+
+async def resolve_interest(interest_name: str, endpoint: str,
                            client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
-                           output_dir: str, progress: dict, progress_lock: asyncio.Lock) -> None:
+                           output_dir: str, interest_cache: dict, max_age: float,
+                           writer: aio.AsyncWriter = None) -> Optional[Tuple[str, str]]:
     """
-    For a given interest, fetch its metadata, save it, extract its ID, and process story ID extraction.
-    Skips the interest if it is already marked as finished in the in-memory progress.
+    Resolve an interest endpoint to (slug, interest_id), fetching and saving its metadata only when
+    the cached entry is missing or older than max_age seconds. Returns None if it cannot be resolved.
+    The metadata is saved through `writer`, or in a thread if there is none.
     """
+    entry = interest_cache.get(endpoint)
+    if entry and time.time() - entry["fetched_at"] < max_age:
+        return entry["slug"], entry["interest_id"]
+
     headers = {"User-Agent": USER_AGENT}
-    url = f"https://web-api-cdn.ground.news/api/public{endpoint}"
+    url = f"{API_BASE}/api/public{endpoint}"
+    key = ("interest", API_DOMAIN)
+    tic = None
     try:
-        response = await client.get(url, headers=headers, timeout=10, follow_redirects=True)
+        async with semaphore:
+            tic = time.perf_counter()
+            response = await client.get(url, headers=headers, timeout=latency.TRACKER.timeout(key, API_TIMEOUT),
+                                        follow_redirects=True)
+        metrics.observe_request("interest", API_DOMAIN, response.status_code,
+                                time.perf_counter() - tic, len(response.content))
+        if response.is_success:
+            latency.TRACKER.observe(key, time.perf_counter() - tic)
         response.raise_for_status()
         metadata = response.json()
     except Exception as e:
+        if isinstance(e, httpx.TimeoutException) and tic is not None:
+            latency.TRACKER.observe(key, time.perf_counter() - tic, ok=False)
+        metrics.observe_error("resolve", e)
         print(f"[ERROR] Failed to fetch metadata for '{interest_name}' from {url}: {e}")
-        return
+        # A stale resolution is still better than none
+        return (entry["slug"], entry["interest_id"]) if entry else None
 
     interest_info = metadata.get("interest", {})
     interest_id = interest_info.get("id")
     interest_slug = interest_info.get("slug") or interest_name.replace(" ", "_")
     if not interest_id:
         print(f"[ERROR] No interest id found in metadata for '{interest_name}'")
-        return
-
-    if await is_interest_finished(progress, interest_slug, progress_lock):
-        print(f"[INFO] Interest {interest_slug} is already marked as finished. Skipping processing.")
-        return
+        return None
 
     metadata_filename = os.path.join(output_dir, "interests", f"metadata_{interest_slug}.json")
     try:
-        with open(metadata_filename, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, indent=4)
-        print(f"[INFO] Saved metadata for '{interest_name}' as {metadata_filename}")
+        await aio.write(writer, serialization.dump, metadata, metadata_filename, key=metadata_filename)
+        print(f"[INFO] Saving metadata for '{interest_name}' as {metadata_filename}")
     except Exception as e:
         print(f"[ERROR] Could not save metadata for '{interest_name}': {e}")
 
+    interest_cache[endpoint] = {"slug": interest_slug, "interest_id": interest_id, "fetched_at": time.time()}
+    return interest_slug, interest_id
+
+async def resolve_interests(interests: dict, client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
+                            output_dir: str, interest_cache: dict, max_age: float,
+                            progress: ProgressTracker, refresh_state: dict = None,
+                            writer: aio.AsyncWriter = None) -> list:
+    """
+    Resolve all interests concurrently up front and return the (slug, interest_id) pairs that need work.
+    Interests whose cached slug is already finished (or not due) are skipped without any request.
+    """
+    pending = []
+    skipped = 0
+    for interest_name, endpoint in interests.items():
+        entry = interest_cache.get(endpoint)
+        if entry and should_skip_interest(entry["slug"], progress, refresh_state):
+            skipped += 1
+            continue
+        pending.append((interest_name, endpoint))
+
+    resolved = await asyncio.gather(*[
+        resolve_interest(interest_name, endpoint, client, semaphore, output_dir, interest_cache, max_age, writer)
+        for interest_name, endpoint in pending
+    ])
+
+    to_process = []
+    for item in resolved:
+        if item is None:
+            continue
+        if should_skip_interest(item[0], progress, refresh_state):
+            skipped += 1
+            continue
+        to_process.append(item)
+    print(f"[INFO] Resolved {len(pending)} interests, {len(to_process)} to process, {skipped} skipped.")
+    return to_process
+
+async def process_interest(interest_slug: str, interest_id: str, initial_offset: int, top_n: int,
+                           client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
+                           output_dir: str, progress: ProgressTracker,
+                           refresh_state: dict = None, max_pages: int = 10,
+                           writer: aio.AsyncWriter = None) -> None:
+    """
+    For a resolved interest, process story ID extraction.
+    In refresh mode (refresh_state given), only new stories are fetched, regardless of progress.
+    """
+    if refresh_state is not None:
+        await refresh_event(interest_id, interest_slug, max_pages,
+                            client, semaphore, output_dir, refresh_state, writer)
+        return
+
     await process_event(interest_id, interest_slug, initial_offset, top_n,
-                        client, semaphore, output_dir, progress, progress_lock)
+                        client, semaphore, output_dir, progress, writer=writer)
 
 async def worker(queue: asyncio.Queue, client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
                  output_dir: str, initial_offset: int, top_n: int,
-                 progress: dict, progress_lock: asyncio.Lock, total_count: int) -> None:
+                 progress: ProgressTracker,
+                 refresh_state: dict = None, max_pages: int = 10,
+                 writer: aio.AsyncWriter = None) -> None:
     """
     Worker that continuously processes interests from the queue.
     After each interest is processed, prints overall progress.
     """
     while True:
         item = await queue.get()
+        metrics.QUEUE_DEPTH.set(queue.qsize(), queue="interests")
         if item is None:
             queue.task_done()
             break
-        interest_name, endpoint = item
-        await process_interest(interest_name, endpoint, initial_offset, top_n,
-                               client, semaphore, output_dir, progress, progress_lock)
-        finished_count = sum(1 for v in progress.values() if v)
-        print(f"[OVERALL PROGRESS] {finished_count}/{total_count} interests finished.")
+        interest_slug, interest_id = item
+        with metrics.busy("interests"), metrics.span("interest"):
+            await process_interest(interest_slug, interest_id, initial_offset, top_n,
+                                   client, semaphore, output_dir, progress,
+                                   refresh_state, max_pages, writer)
+        metrics.ITEMS.inc(stage="interest", outcome="finished" if progress.is_finished(interest_slug) else "partial")
+        print(f"[OVERALL PROGRESS] {progress.finished_count}/{progress.total_count} interests finished.")
         queue.task_done()
 
 async def main() -> None:
@@ -201,16 +520,37 @@ async def main() -> None:
                         help="Number of concurrent worker tasks and maximum concurrent HTTP requests (default: 5).")
     parser.add_argument('-o', '--output-dir', type=str, default='.',
                         help="Directory to save output files (default: current directory).")
+    parser.add_argument('--refresh', action='store_true',
+                        help="Only fetch stories published since the last run, for interests that are due (default: off).")
+    parser.add_argument('--max-pages', type=int, default=10,
+                        help="Maximum number of pages to fetch per interest in refresh mode (default: 10).")
+    parser.add_argument('--metadata-max-age', type=float, default=7,
+                        help="Days after which cached interest metadata is refetched (default: 7).")
+    parser.add_argument('--sleep-scale', type=float, default=1.0,
+                        help="Multiplier for the rate-limiting sleeps between requests (default: 1.0).")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Expose Prometheus metrics on this local port (default: off).")
+    profiling.add_argument(parser)
+    aio.add_argument(parser)
     args = parser.parse_args()
 
+    global SLEEP_SCALE
+    SLEEP_SCALE = args.sleep_scale
+    metrics.start_metrics_server(args.metrics_port)
+    profiling.start(args.profile)
+
     # Ensure output directories exist
     os.makedirs(args.output_dir, exist_ok=True)
     os.makedirs(os.path.join(args.output_dir, "story_ids_by_interest"), exist_ok=True)
     os.makedirs(os.path.join(args.output_dir, "interests"), exist_ok=True)
 
     progress_csv_path = os.path.join(args.output_dir, "progress.csv")
-    progress = load_progress(progress_csv_path)
-    progress_lock = asyncio.Lock()
+    progress = ProgressTracker(progress_csv_path)
+    progress.load()
+    refresh_state_path = os.path.join(args.output_dir, "refresh_state.json")
+    refresh_state = load_refresh_state(refresh_state_path) if args.refresh else None
+    interest_cache_path = os.path.join(args.output_dir, "interest_cache.json")
+    interest_cache = load_interest_cache(interest_cache_path)
 
     try:
         with open(args.input_file, "r", encoding="utf-8") as f:
@@ -219,30 +559,43 @@ async def main() -> None:
         print(f"[ERROR] Failed to load interests file '{args.input_file}': {e}")
         return
 
-    total_count = len(interests)
-    queue: asyncio.Queue = asyncio.Queue()
-    for interest_name, endpoint in interests.items():
-        queue.put_nowait((interest_name, endpoint))
-
-    semaphore = asyncio.Semaphore(args.workers)
+    progress.total_count = len(interests)
+    semaphore = asyncio.Semaphore(args.num_workers)
+    monitor = aio.LoopMonitor(args.stall_ms / 1000).start()
+    writer = aio.AsyncWriter()
+    writer.start()
 
     try:
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(transport=cassette.async_transport()) as client:
+            resolved = await resolve_interests(interests, client, semaphore, args.output_dir,
+                                               interest_cache, args.metadata_max_age * 86400,
+                                               progress, refresh_state, writer)
+            # Cache entries are replaced rather than mutated, so a shallow copy is a stable snapshot
+            await writer.snapshot(interest_cache_path, save_interest_cache, dict(interest_cache), interest_cache_path)
+
+            queue: asyncio.Queue = asyncio.Queue()
+            for item in resolved:
+                queue.put_nowait(item)
+            metrics.QUEUE_DEPTH.set(queue.qsize(), queue="interests")
+            metrics.WORKERS_TOTAL.set(args.num_workers, pool="interests")
+
+            checkpoint_task = asyncio.create_task(checkpoint_loop(progress, writer=writer))
             worker_tasks = [
                 asyncio.create_task(worker(queue, client, semaphore, args.output_dir,
-                                             args.offset, args.n, progress, progress_lock, total_count))
-                for _ in range(args.workers)
+                                             args.offset, args.n, progress,
+                                             refresh_state, args.max_pages, writer))
+                for _ in range(args.num_workers)
             ]
 
             # Add termination signals for each worker.
-            for _ in range(args.workers):
+            for _ in range(args.num_workers):
                 await queue.put(None)
 
             await queue.join()
 
-            for task in worker_tasks:
+            for task in worker_tasks + [checkpoint_task]:
                 task.cancel()
-            await asyncio.gather(*worker_tasks, return_exceptions=True)
+            await asyncio.gather(*worker_tasks, checkpoint_task, return_exceptions=True)
     except KeyboardInterrupt:
         print("[INFO] Keyboard interrupt received. Saving progress and exiting.")
         raise
@@ -250,8 +603,14 @@ async def main() -> None:
         print(f"[ERROR] Fatal error encountered: {e}")
         raise
     finally:
-        save_progress(progress, progress_csv_path)
+        # Queued story rows and metadata are written before the final progress checkpoint
+        await writer.close()
+        monitor.stop()
+        progress.checkpoint()
         print(f"[INFO] Progress saved to {progress_csv_path}")
+        if refresh_state is not None:
+            save_refresh_state(refresh_state, refresh_state_path)
+            print(f"[INFO] Refresh state saved to {refresh_state_path}")
 
 if __name__ == '__main__':
     try:
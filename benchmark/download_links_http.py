@@ -0,0 +1,36 @@
+import os
+import csv
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from full_text_collection import download_links
+
+# Runs only the HTTP tier of download_links.process_task (no browser is started),
+# so its throughput can be measured against the mock server.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the HTTP path of download_links.py over a URL mapping CSV")
+    parser.add_argument("-i", "--input_file", required=True, help="Path to the CSV file containing URLs")
+    parser.add_argument("-o", "--output_dir", required=True, help="Directory where HTML and JSON files will be saved")
+    parser.add_argument("--num_workers", type=int, default=8, help="Number of worker threads (default: 8)")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of URLs to process (default: all)")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.join(args.output_dir, "html"), exist_ok=True)
+    os.makedirs(os.path.join(args.output_dir, "json"), exist_ok=True)
+
+    with open(args.input_file, "r", encoding="utf-8", newline="") as f:
+        tasks = [(int(row["index"]), row["url"]) for row in csv.DictReader(f)]
+    if args.limit:
+        tasks = tasks[:args.limit]
+
+    with ThreadPoolExecutor(max_workers=args.num_workers) as executor:
+        for task_id, link in tasks:
+            executor.submit(download_links.process_task, task_id, link, None, args.output_dir)
+    download_links.shutdown_pdf_pool()
+    print(f"Processed {len(tasks)} tasks")
+
+
+if __name__ == "__main__":
+    main()
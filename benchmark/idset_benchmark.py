@@ -0,0 +1,78 @@
+import gc
+import time
+import uuid
+import random
+import argparse
+import tracemalloc
+
+from common.idset import FingerprintSet, UuidSet
+
+# Compares memory, build time and lookup time of plain Python sets against the compact
+# ID sets in common/idset.py, on random story IDs (UUIDs) and synthetic article URLs.
+
+
+def measure(build, hits, misses):
+    tic = time.perf_counter()
+    container = build()
+    build_s = time.perf_counter() - tic
+    del container
+    # Built again under tracemalloc, which slows allocation down too much to time the first build
+    gc.collect()
+    tracemalloc.start()
+    container = build()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tic = time.perf_counter()
+    found = sum(1 for item in hits if item in container)
+    hit_s = time.perf_counter() - tic
+    tic = time.perf_counter()
+    false_hits = sum(1 for item in misses if item in container)
+    miss_s = time.perf_counter() - tic
+    assert found == len(hits) and false_hits == 0
+    return memory, build_s, hit_s / len(hits), miss_s / len(misses)
+
+
+def report(title, items, candidates, lookups):
+    hits = random.sample(items, min(lookups, len(items)))
+    misses = candidates.pop("_misses")
+    print(f"\n{title}: {len(items)} entries, {len(hits)} hit and {len(misses)} miss lookups")
+    print(f"{'container':<24}{'bytes/entry':>12}{'build s':>10}{'hit us':>9}{'miss us':>9}")
+    for name, build in candidates.items():
+        memory, build_s, hit_s, miss_s = measure(build, hits, misses)
+        print(f"{name:<24}{memory / len(items):>12.1f}{build_s:>10.2f}{hit_s * 1e6:>9.2f}{miss_s * 1e6:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compact ID sets against Python sets")
+    parser.add_argument("-n", type=int, default=1_000_000, help="Number of IDs and URLs (default: 1000000)")
+    parser.add_argument("--lookups", type=int, default=100_000, help="Lookups of each kind (default: 100000)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    # Each build parses the IDs from text, as when reading a CSV, so the set's memory includes
+    # its strings while the compact sets drop them after conversion
+    ids = [str(uuid.UUID(int=random.getrandbits(128), version=4)) for _ in range(args.n)]
+    id_text = "\n".join(ids)
+    id_misses = [str(uuid.UUID(int=random.getrandbits(128), version=4)) for _ in range(args.lookups)]
+    report("Story IDs", ids, {
+        "_misses": id_misses,
+        "set[str]": lambda: set(id_text.split("\n")),
+        "UuidSet": lambda: UuidSet(id_text.split("\n")),
+        "UuidSet + Bloom": lambda: UuidSet(id_text.split("\n"), bloom_capacity=args.n),
+    }, args.lookups)
+
+    urls = [f"https://www.outlet{i % 5000}.com/news/{random.getrandbits(48):x}/story-{i}" for i in range(args.n)]
+    url_text = "\n".join(urls)
+    url_misses = [f"https://www.outlet{i}.com/news/missing-{i}" for i in range(args.lookups)]
+    report("Article URLs", urls, {
+        "_misses": url_misses,
+        "set[str]": lambda: set(url_text.split("\n")),
+        "FingerprintSet": lambda: FingerprintSet(url_text.split("\n")),
+        "FingerprintSet + Bloom": lambda: FingerprintSet(url_text.split("\n"), bloom_capacity=args.n),
+    }, args.lookups)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Stand-in for web-api-cdn.ground.news and the news sites it links to.
+# Point the collectors at it with GROUND_NEWS_API=http://127.0.0.1:<port>.
+
+BIASES = ["Left", "Lean Left", "Center", "Lean Right", "Right", "Unknown"]
+FACTUALITIES = ["High Factuality", "Mixed Factuality", "Low Factuality", "Unknown"]
+WORDS = ("the government said on tuesday that new measures would be announced after talks "
+         "between officials and representatives of the industry ended without agreement").split()
+
+NAMESPACE = uuid.UUID("6f1c1d2e-8a55-4f4b-9d61-8d0f3c7b2a10")
+
+
+def synthetic_id(*parts):
+    """Deterministic UUID for an interest, story, or article."""
+    return str(uuid.uuid5(NAMESPACE, "/".join(str(p) for p in parts)))
+
+
+class MockConfig:
+    def __init__(self, latency_ms=50, jitter_ms=20, error_rate=0.0, rate_limit_rate=0.0,
+                 stories_per_interest=500, sources_per_story=12, paragraphs=12, num_sites=20, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.stories_per_interest = stories_per_interest
+        self.sources_per_story = sources_per_story
+        self.paragraphs = paragraphs
+        self.num_sites = num_sites
+        self.seed = seed
+
+
+class MockStats:
+    """Thread-safe record of every request served: (route, status, seconds)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = []
+
+    def add(self, route, status, elapsed):
+        with self.lock:
+            self.records.append((route, status, elapsed))
+
+    def reset(self):
+        with self.lock:
+            records, self.records = self.records, []
+        return records
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    routes = [
+        ("interest_events", re.compile(r"^/api/public/interest/([^/]+)/events$")),
+        ("interest", re.compile(r"^/api/public/interest/([^/]+)$")),
+        ("sources_for_web", re.compile(r"^/api/v06/story/([^/]+)/sourcesForWeb$")),
+        ("event_sources", re.compile(r"^/api/public/event/([^/]+)/sources$")),
+        ("article", re.compile(r"^/site(\d+)/([^/]+)/(\d+)$")),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        tic = time.perf_counter()
+        parts = urlsplit(self.path)
+        route, match = "unknown", None
+        for name, pattern in self.routes:
+            match = pattern.match(parts.path)
+            if match:
+                route = name
+                break
+
+        config = self.server.config
+        delay = max(0.0, random.gauss(config.latency_ms, config.jitter_ms)) / 1000
+        time.sleep(delay)
+
+        roll = random.random()
+        if match is None:
+            status, body, ctype = 404, b"not found", "text/plain"
+        elif roll < config.rate_limit_rate:
+            status, body, ctype = 429, b"rate limited", "text/plain"
+        elif roll < config.rate_limit_rate + config.error_rate:
+            status, body, ctype = 500, b"server error", "text/plain"
+        else:
+            handler = getattr(self, f"render_{route}")
+            status = 200
+            body, ctype = handler(match, parse_qs(parts.query))
+
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.stats.add(route, status, time.perf_counter() - tic)
+
+    def json_body(self, obj):
+        return json.dumps(obj).encode("utf-8"), "application/json"
+
+    def render_interest(self, match, query):
+        slug = match.group(1)
+        return self.json_body({"interest": {"id": synthetic_id("interest", slug), "slug": slug, "name": slug}})
+
+    def render_interest_events(self, match, query):
+        interest_id = match.group(1)
+        offset = int(query.get("offset", ["0"])[0])
+        total = self.server.config.stories_per_interest
+        ids = [synthetic_id("story", interest_id, i) for i in range(offset, min(offset + 100, total))]
+        return self.json_body({"eventIds": ids})
+
+    def sources(self, story_id):
+        config = self.server.config
+        rng = random.Random(f"{config.seed}/{story_id}")
+        host = f"http://{self.server.server_address[0]}:{self.server.server_address[1]}"
+        sources = []
+        for i in range(rng.randint(1, 2 * config.sources_per_story)):
+            site = rng.randrange(config.num_sites)
+            sources.append({
+                "id": synthetic_id("article", story_id, i),
+                "url": f"{host}/site{site}/{story_id}/{i}",
+                "title": " ".join(rng.choices(WORDS, k=8)),
+                "sourceInfo": {
+                    "name": f"Outlet {site}",
+                    "bias": BIASES[site % len(BIASES)],
+                    "factuality": FACTUALITIES[site % len(FACTUALITIES)],
+                },
+            })
+        return sources
+
+    def render_sources_for_web(self, match, query):
+        return self.json_body({"sources": self.sources(match.group(1))})
+
+    def render_event_sources(self, match, query):
+        return self.json_body(self.sources(match.group(1)))
+
+    def render_article(self, match, query):
+        site, story_id, i = match.groups()
+        rng = random.Random(f"{story_id}/{i}")
+        title = " ".join(rng.choices(WORDS, k=8)).capitalize()
+        paragraphs = "".join(
+            f"<p>{' '.join(rng.choices(WORDS, k=60)).capitalize()}.</p>"
+            for _ in range(self.server.config.paragraphs)
+        )
+        html = (
+            f'<html lang="en"><head><title>{title}</title>'
+            f'<meta property="og:title" content="{title}">'
+            f'<meta name="author" content="Reporter {site}">'
+            f'<meta property="article:published_time" content="2025-03-0{int(site) % 9 + 1}T12:00:00Z">'
+            f"</head><body><nav>Home | World | Politics</nav>"
+            f"<article><h1>{title}</h1>{paragraphs}</article>"
+            f"<footer>Outlet {site}</footer></body></html>"
+        )
+        return html.encode("utf-8"), "text/html; charset=utf-8"
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config, host="127.0.0.1", port=0):
+        super().__init__((host, port), MockHandler)
+        self.config = config
+        self.stats = MockStats()
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        """Serve in a background thread and return self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the ground.news API and news sites.")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--latency_ms", type=float, default=50, help="Mean response latency in ms (default: 50)")
+    parser.add_argument("--jitter_ms", type=float, default=20, help="Latency standard deviation in ms (default: 20)")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of requests answered with 500 (default: 0)")
+    parser.add_argument("--rate_limit_rate", type=float, default=0.0, help="Fraction of requests answered with 429 (default: 0)")
+    args = parser.parse_args()
+
+    server = MockServer(MockConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                   error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate),
+                        port=args.port)
+    print(f"Mock ground.news listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,148 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+from benchmark.mock_server import MockServer, MockConfig, synthetic_id, BIASES, FACTUALITIES
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ["story_ids", "news_sources", "url_mapping", "download_links", "full_texts"]
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def stage_commands(args):
+    """The command line of each stage, run from the benchmark working directory."""
+    py = sys.executable
+    return {
+        "story_ids": [py, "-m", "api.get_story_ids", "-i", "interests.json", "-n", str(args.stories),
+                      "-w", str(args.num_workers), "-o", "story_ids", "--sleep-scale", str(args.sleep_scale)],
+        "news_sources": [py, "-m", "api.download_news_sources", "-i", "story_ids/story_ids_by_interest",
+                         "-o", "news_sources", "-w", str(args.num_workers), "--sleep-scale", str(args.sleep_scale)],
+        "url_mapping": [py, "-m", "full_text_collection.create_url_mapping", "news_sources", "urls.csv",
+                        "--qualify", "none"],
+        "download_links": [py, "-m", "benchmark.download_links_http", "-i", "urls.csv", "-o", "download",
+                           "--num_workers", str(args.num_workers), "--limit", str(args.articles)],
+        "full_texts": [py, "-m", "full_text_collection.get_full_texts", "--source", "bench", "--tag", "bench",
+                       "--qualify", "none"],
+    }
+
+
+def prepare_workdir(workdir, base_url, args):
+    """Write the inputs that do not come from an earlier stage: the interest list and a story file."""
+    interests = {f"Interest {i}": f"/interest/bench-{i}" for i in range(args.interests)}
+    with open(os.path.join(workdir, "interests.json"), "w", encoding="utf-8") as f:
+        json.dump(interests, f)
+
+    # get_full_texts.py reads story_collection/{tag}_interest/{topic}.json relative to the working directory
+    story_dir = os.path.join(workdir, "story_collection", "bench_interest")
+    os.makedirs(story_dir, exist_ok=True)
+    rng = random.Random(0)
+    stories = {}
+    per_story = 10
+    for s in range(max(1, args.articles // per_story)):
+        story_id = synthetic_id("bench-story", s)
+        stories[f"story-{s}"] = [{
+            "index": i,
+            "source_link": f"{base_url}/site{rng.randrange(20)}/{story_id}/{i}",
+            "bias": BIASES[i % len(BIASES)],
+            "factuality": FACTUALITIES[i % len(FACTUALITIES)],
+            "name": f"Outlet {i}",
+            "abstract": "",
+        } for i in range(per_story)]
+    with open(os.path.join(story_dir, "bench.json"), "w", encoding="utf-8") as f:
+        json.dump(stories, f)
+
+
+def run_stage(name, command, workdir, server, env):
+    """Run one stage as a subprocess and combine its resource usage with the server-side request log."""
+    server.stats.reset()
+    tic = time.perf_counter()
+    log_path = os.path.join(workdir, f"{name}.log")
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - tic
+    records = server.stats.reset()
+
+    latencies = [elapsed for _, _, elapsed in records]
+    statuses = {}
+    for _, code, _ in records:
+        statuses[str(code)] = statuses.get(str(code), 0) + 1
+    return {
+        "stage": name,
+        "exit_code": os.waitstatus_to_exitcode(status),
+        "wall_s": wall,
+        "requests": len(records),
+        "requests_per_s": len(records) / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "statuses": statuses,
+        "cpu_s": usage.ru_utime + usage.ru_stime,
+        "peak_rss_mb": usage.ru_maxrss / 1024,
+        "log": log_path,
+    }
+
+
+def print_report(results):
+    header = f"{'stage':<16}{'exit':>5}{'wall s':>9}{'reqs':>7}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'cpu s':>8}{'rss MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['stage']:<16}{r['exit_code']:>5}{r['wall_s']:>9.2f}{r['requests']:>7}{r['requests_per_s']:>9.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['cpu_s']:>8.2f}{r['peak_rss_mb']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the collectors against a local mock of ground.news")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES, help="Stages to run, in order (default: all)")
+    parser.add_argument("--interests", type=int, default=5, help="Number of synthetic interests (default: 5)")
+    parser.add_argument("--stories", type=int, default=200, help="Story IDs to collect per interest (default: 200)")
+    parser.add_argument("--articles", type=int, default=200, help="Articles to fetch in the full-text stages (default: 200)")
+    parser.add_argument("--num_workers", type=int, default=5, help="Worker count passed to every stage (default: 5)")
+    parser.add_argument("--sleep_scale", type=float, default=0.0, help="Multiplier for the collectors' rate-limit sleeps (default: 0)")
+    parser.add_argument("--latency_ms", type=float, default=50, help="Mean mock response latency in ms (default: 50)")
+    parser.add_argument("--jitter_ms", type=float, default=20, help="Mock latency standard deviation in ms (default: 20)")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of mock responses that are 500s (default: 0)")
+    parser.add_argument("--rate_limit_rate", type=float, default=0.0, help="Fraction of mock responses that are 429s (default: 0)")
+    parser.add_argument("--workdir", type=str, default=None, help="Working directory for stage outputs (default: a temp dir)")
+    parser.add_argument("--output", type=str, default=None, help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    server = MockServer(MockConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                   error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate)).start()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="gn_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    prepare_workdir(workdir, server.base_url, args)
+    print(f"Mock server on {server.base_url}, working directory {workdir}")
+
+    env = dict(os.environ, GROUND_NEWS_API=server.base_url, PYTHONUNBUFFERED="1",
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])))
+    commands = stage_commands(args)
+    results = []
+    try:
+        for stage in args.stages:
+            print(f"Running {stage}...")
+            results.append(run_stage(stage, commands[stage], workdir, server, env))
+    finally:
+        server.shutdown()
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+        print(f"Saved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import json
+import glob
+import time
+import argparse
+
+from common import serialization
+
+# Compares encode/decode time and output size of the old stdlib json.dump(indent=4)
+# against the serialization module on real output files.
+
+
+def measure(encode, decode, objs, repeat):
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        encoded = [encode(obj) for obj in objs]
+    encode_s = (time.perf_counter() - tic) / repeat
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        for data in encoded:
+            decode(data)
+    decode_s = (time.perf_counter() - tic) / repeat
+    return encode_s, decode_s, sum(len(data) for data in encoded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON encoders on collected output files")
+    parser.add_argument("patterns", nargs="+", help="Glob patterns of JSON files, e.g. 'download/json/*.json'")
+    parser.add_argument("--max_files", type=int, default=2000, help="Maximum number of files to load (default: 2000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed repetitions (default: 3)")
+    args = parser.parse_args()
+
+    files = sorted(f for pattern in args.patterns for f in glob.glob(pattern))[:args.max_files]
+    if not files:
+        print("No files matched.")
+        return
+    objs = [serialization.load(f) for f in files]
+    disk_bytes = sum(os.path.getsize(f) for f in files)
+    print(f"{len(files)} files, {disk_bytes / 1e6:.1f} MB on disk, serialization backend: {serialization.BACKEND}")
+
+    candidates = {
+        "json indent=4": (lambda o: json.dumps(o, indent=4, ensure_ascii=False).encode("utf-8"), json.loads),
+        "json compact": (lambda o: json.dumps(o, separators=(",", ":"), ensure_ascii=False).encode("utf-8"), json.loads),
+        "serialization compact": (serialization.dumps, serialization.loads),
+        "serialization pretty": (lambda o: serialization.dumps(o, pretty=True), serialization.loads),
+    }
+    print(f"{'encoder':<24}{'encode ms':>11}{'decode ms':>11}{'size MB':>10}")
+    for name, (encode, decode) in candidates.items():
+        encode_s, decode_s, size = measure(encode, decode, objs, args.repeat)
+        print(f"{name:<24}{encode_s * 1000:>11.1f}{decode_s * 1000:>11.1f}{size / 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+from groundnews.__main__ import COMMANDS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imports every collector used to pay at startup before the CLI imported them lazily
+EAGER_IMPORTS = "import pandas, newsplease, undetected_chromedriver, selenium.webdriver, httpx"
+
+
+def time_command(command, repeat):
+    """Median wall time of running a command to completion."""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    timings = []
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        subprocess.run(command, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - tic)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure startup time of each groundnews subcommand")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per command (default: 5)")
+    parser.add_argument("commands", nargs="*", default=list(COMMANDS), help="Subcommands to time (default: all)")
+    args = parser.parse_args()
+
+    baseline = time_command([sys.executable, "-c", "pass"], args.repeat)
+    eager = time_command([sys.executable, "-c", EAGER_IMPORTS], args.repeat)
+    print(f"{'command':<18}{'startup ms':>12}")
+    print(f"{'(interpreter)':<18}{baseline * 1000:>12.0f}")
+    print(f"{'(eager imports)':<18}{eager * 1000:>12.0f}")
+    for name in args.commands:
+        elapsed = time_command([sys.executable, "-m", "groundnews", name, "--help"], args.repeat)
+        print(f"{name:<18}{elapsed * 1000:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from common import metrics
+
+# Keeping blocking file I/O off the event loop of the async collectors.
+#
+# AsyncWriter runs writes on its own small thread pool. Writes go through a bounded queue, so
+# a slow disk slows the producers down instead of piling up memory. The writer task drains
+# up to MAX_BATCH queued writes and runs them in one thread hop. Within a batch, appends to
+# the same file between other writes are merged into one call, and only the latest snapshot under each
+# key is written. Each lane has one thread and keeps the submission order, so with the default
+# single lane a progress checkpoint never lands before the rows it accounts for. With more
+# lanes, writes are spread by file and only the order per file is kept. Arguments are handed
+# to the thread as they are: pass data that is no longer mutated on the loop, or a copy.
+#
+# LoopMonitor reports event loop stalls. A heartbeat task measures how late its sleeps wake
+# up. While a beat is overdue, a watchdog thread samples the loop thread's stack. A stall over
+# the threshold is then reported with the call site seen most often during it. Stalls are
+# counted in gn_loop_stalls_total by site, and the worst sites are printed at exit.
+
+MAX_PENDING = 1000  # Queued writes per lane before submit() waits
+MAX_BATCH = 100  # Writes run per thread hop
+STALL_THRESHOLD = 0.1  # Seconds of loop lag reported as a stall
+TOP_SITES = 5
+
+_THIS = os.path.abspath(__file__)
+ROOT = os.path.dirname(os.path.dirname(_THIS))
+
+WRITES = metrics.Counter("gn_writes_total", "Writes run off the event loop by kind", ["kind"])
+LOOP_LAG = metrics.Histogram("gn_loop_lag_seconds", "Event loop lag over the stall threshold")
+STALLS = metrics.Counter("gn_loop_stalls_total", "Event loop stalls by call site", ["site"])
+
+
+class AsyncWriter:
+    """Runs blocking writes on a bounded thread pool in batches, keeping their order per file."""
+
+    def __init__(self, lanes=1, max_pending=MAX_PENDING, max_batch=MAX_BATCH):
+        self.lanes = lanes
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.queues = []
+        self.tasks = []
+        self.executor = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def start(self):
+        """Start the writer tasks; must be called on the event loop."""
+        self.executor = ThreadPoolExecutor(self.lanes, thread_name_prefix="writer")
+        self.queues = [asyncio.Queue(self.max_pending) for _ in range(self.lanes)]
+        self.tasks = [asyncio.create_task(self._drain(queue)) for queue in self.queues]
+
+    async def close(self):
+        """Wait for every queued write, then stop the writer."""
+        await self.flush()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.executor.shutdown()
+
+    async def flush(self):
+        await asyncio.gather(*[queue.join() for queue in self.queues])
+
+    async def _put(self, key, item):
+        queue = self.queues[hash(key) % self.lanes]
+        await queue.put(item)
+        metrics.QUEUE_DEPTH.set(sum(q.qsize() for q in self.queues), queue="writer")
+
+    async def submit(self, fn, *args, key=None):
+        """Queue fn(*args). Calls with the same key (a file path) run in the order submitted."""
+        await self._put(key, ("call", key, fn, args))
+
+    async def append(self, fn, path, rows):
+        """Queue fn(path, rows). Appends to the same path in one batch are merged into one call."""
+        await self._put(path, ("append", path, fn, list(rows)))
+
+    async def snapshot(self, key, fn, *args):
+        """Queue fn(*args), replacing a snapshot with the same key still waiting in the batch."""
+        await self._put(key, ("snapshot", key, fn, args))
+
+    async def _drain(self, queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                await loop.run_in_executor(self.executor, run_batch, batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+                metrics.QUEUE_DEPTH.set(sum(q.qsize() for q in self.queues), queue="writer")
+
+
+def run_batch(batch):
+    """Run a batch of queued writes in order, merging appends and dropping superseded snapshots."""
+    last_snapshot = {key: i for i, (kind, key, _, _) in enumerate(batch) if kind == "snapshot"}
+    appends = {}  # (fn, path) -> rows, since the last other write
+
+    def flush_appends():
+        for (fn, path), rows in appends.items():
+            _run("append", fn, path, rows)
+        appends.clear()
+
+    for i, (kind, key, fn, args) in enumerate(batch):
+        if kind == "append":
+            appends.setdefault((fn, key), []).extend(args)
+            continue
+        if kind == "snapshot" and last_snapshot[key] != i:
+            WRITES.inc(kind="superseded")
+            continue
+        # Appends submitted before another write are on disk before it
+        flush_appends()
+        _run(kind, fn, *args)
+    flush_appends()
+
+
+def _run(kind, fn, *args):
+    try:
+        fn(*args)
+        WRITES.inc(kind=kind)
+    except Exception as e:
+        metrics.observe_error("write", e)
+        print(f"[ERROR] Write {getattr(fn, '__name__', fn)} failed: {e}")
+
+
+async def write(writer, fn, *args, key=None):
+    """Submit fn(*args) to a writer, or without one, run it in a thread and wait for it."""
+    if writer is None:
+        await asyncio.to_thread(fn, *args)
+    else:
+        await writer.submit(fn, *args, key=key)
+
+
+# --- Loop lag ---
+
+def call_site(frame):
+    """(site, detail) of a stack: the innermost frame of this repository, and the chain around it."""
+    outer = []
+    innermost = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        label = f"{os.path.relpath(filename, ROOT) if filename.startswith(ROOT) else os.path.basename(filename)}" \
+                f":{frame.f_lineno} {frame.f_code.co_name}"
+        if innermost is None:
+            innermost = label
+        if filename.startswith(ROOT) and filename != _THIS:
+            outer.append(label)
+            if len(outer) == 3:
+                break
+        frame = frame.f_back
+    if not outer:
+        return innermost or "unknown", innermost or "unknown"
+    chain = outer if innermost == outer[0] else [innermost] + outer
+    return outer[0], " < ".join(chain)
+
+
+class LoopMonitor:
+    """Reports event loop stalls over threshold seconds with the call site that caused them."""
+
+    def __init__(self, threshold=STALL_THRESHOLD, interval=None):
+        self.threshold = threshold
+        self.interval = interval or threshold / 4
+        self.beat = time.monotonic()
+        self.lock = threading.Lock()
+        self.samples = Counter()  # (site, detail) -> samples during the current stall
+        self.totals = Counter()  # site -> stalled seconds
+        self.counts = Counter()  # site -> stalls
+        self.stopped = threading.Event()
+        self.task = None
+
+    def start(self):
+        """Start monitoring the running loop; must be called on it. A threshold of 0 disables it."""
+        if not self.threshold:
+            return self
+        self.loop_thread = threading.get_ident()
+        self.task = asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-monitor", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.task is None:
+            return
+        self.stopped.set()
+        self.task.cancel()
+        self.task = None
+        if self.totals:
+            print(f"[INFO] Event loop stalls over {self.threshold * 1000:.0f}ms, worst call sites:")
+            for site, seconds in self.totals.most_common(TOP_SITES):
+                print(f"    {seconds:8.2f}s in {self.counts[site]:>5} stalls  {site}")
+
+    async def _heartbeat(self):
+        while True:
+            self.beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = time.monotonic() - self.beat - self.interval
+            with self.lock:
+                samples, self.samples = self.samples, Counter()
+            if lag >= self.threshold:
+                self._report(lag, samples)
+
+    def _watch(self):
+        # Samples the loop thread while a beat is overdue
+        poll = self.interval / 2
+        while not self.stopped.wait(poll):
+            if time.monotonic() - self.beat - self.interval < poll:
+                continue
+            frame = sys._current_frames().get(self.loop_thread)
+            if frame is None:
+                continue
+            sample = call_site(frame)
+            with self.lock:
+                self.samples[sample] += 1
+
+    def _report(self, lag, samples):
+        site, detail = samples.most_common(1)[0][0] if samples else ("unknown", "unknown")
+        LOOP_LAG.observe(lag)
+        STALLS.inc(site=site)
+        self.totals[site] += lag
+        self.counts[site] += 1
+        print(f"[WARNING] Event loop stalled {lag * 1000:.0f}ms in {detail}")
+
+
+def add_argument(parser):
+    """Add the shared --stall-ms option to an async collector's argument parser."""
+    parser.add_argument("--stall-ms", type=float, default=STALL_THRESHOLD * 1000, metavar="MS",
+                        help="Report event loop stalls longer than MS milliseconds with their call site; "
+                             f"0 disables (default: {STALL_THRESHOLD * 1000:.0f})")
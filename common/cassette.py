@@ -0,0 +1,252 @@
+import os
+import gzip
+import time
+import base64
+import asyncio
+import atexit
+import threading
+from collections import defaultdict
+
+from common import serialization
+
+# HTTP record/replay for deterministic offline runs.
+#
+#   GN_CASSETTE=run.cassette GN_CASSETTE_MODE=record python -m api.get_story_ids ...
+#   GN_CASSETTE=run.cassette GN_CASSETTE_MODE=replay GN_REPLAY_SPEED=10 python -m api.get_story_ids ...
+#
+# In record mode every request made through a hooked client is performed as usual and its
+# response (status, headers, body) and duration are appended to the cassette, a gzipped
+# JSON-lines file. In replay mode no network is used: responses are served from the
+# cassette, after their recorded duration divided by GN_REPLAY_SPEED (0 serves them at
+# once). Repeated requests for the same URL are replayed in recorded order, the last one
+# repeating. A request missing from the cassette fails like a connection error.
+#
+# Hooks: httpx clients (async_transport / transport), requests sessions (mount_requests)
+# and plain fetch functions such as SimpleCrawler.fetch_url (call).
+
+FLUSH_EVERY = 100  # Recorded entries buffered before they are appended to the cassette
+_DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+class CassetteMiss(Exception):
+    """A replayed request that was never recorded."""
+
+
+class Cassette:
+    def __init__(self, path, mode, speed=1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Cassette mode must be record or replay, got {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.entries = defaultdict(list)
+        self.served = defaultdict(int)
+        if mode == "replay":
+            with gzip.open(path, "rb") as f:
+                for line in f:
+                    entry = serialization.loads(line)
+                    self.entries[entry["key"]].append(entry)
+            print(f"[INFO] Replaying {sum(len(e) for e in self.entries.values())} responses from {path}")
+        else:
+            atexit.register(self.flush)
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    def record(self, key, status, headers, body, elapsed):
+        entry = {
+            "key": key,
+            "status": status,
+            "headers": {k: v for k, v in (headers or {}).items() if k.lower() not in _DROPPED_HEADERS},
+            "body": base64.b64encode(body).decode("ascii") if body is not None else None,
+            "elapsed": round(elapsed, 4),
+        }
+        with self.lock:
+            self.buffer.append(entry)
+            if len(self.buffer) >= FLUSH_EVERY:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        # Each flush appends one gzip member; gzip readers read the members as one stream
+        with gzip.open(self.path, "ab") as f:
+            f.write(b"".join(serialization.dumps(entry) + b"\n" for entry in self.buffer))
+        self.buffer = []
+
+    def lookup(self, key):
+        """The next recorded entry for a key, as (status, headers, body, delay). Raises CassetteMiss."""
+        with self.lock:
+            entries = self.entries.get(key)
+            if not entries:
+                raise CassetteMiss(f"Not in cassette {self.path}: {key}")
+            entry = entries[min(self.served[key], len(entries) - 1)]
+            self.served[key] += 1
+        body = base64.b64decode(entry["body"]) if entry["body"] is not None else None
+        delay = entry["elapsed"] / self.speed if self.speed else 0.0
+        return entry["status"], entry["headers"], body, delay
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get():
+    """The cassette configured by GN_CASSETTE / GN_CASSETTE_MODE, or None when neither is set."""
+    global _cassette
+    with _cassette_lock:
+        if _cassette is None and os.environ.get("GN_CASSETTE"):
+            _cassette = Cassette(os.environ["GN_CASSETTE"],
+                                 os.environ.get("GN_CASSETTE_MODE", "record"),
+                                 float(os.environ.get("GN_REPLAY_SPEED", "1")))
+        return _cassette
+
+
+# --- Function hook ---
+
+def call(key, fn, *args, **kwargs):
+    """
+    Record or replay a fetch function that returns text or None (e.g. SimpleCrawler.fetch_url).
+    Without a cassette, just calls fn. A request missing from a replayed cassette returns None.
+    """
+    cassette = get()
+    if cassette is None:
+        return fn(*args, **kwargs)
+    if cassette.replaying:
+        try:
+            status, _, body, delay = cassette.lookup(key)
+        except CassetteMiss as e:
+            # Fetch functions report a failed connection by returning None
+            print(f"[ERROR] {e}")
+            return None
+        time.sleep(delay)
+        return body.decode("utf-8") if body is not None else None
+    tic = time.perf_counter()
+    result = fn(*args, **kwargs)
+    cassette.record(key, 200 if result else None, {}, result.encode("utf-8") if result else None,
+                    time.perf_counter() - tic)
+    return result
+
+
+# --- httpx hooks ---
+
+def _request_key(method, url):
+    return f"{method} {url}"
+
+
+def async_transport():
+    """An httpx async transport that records or replays, or None (the default) without a cassette."""
+    cassette = get()
+    if cassette is None:
+        return None
+    import httpx
+
+    class CassetteAsyncTransport(httpx.AsyncBaseTransport):
+        def __init__(self):
+            self.inner = None if cassette.replaying else httpx.AsyncHTTPTransport()
+
+        async def handle_async_request(self, request):
+            key = _request_key(request.method, request.url)
+            if cassette.replaying:
+                try:
+                    status, headers, body, delay = cassette.lookup(key)
+                except CassetteMiss as e:
+                    raise httpx.ConnectError(str(e), request=request) from e
+                await asyncio.sleep(delay)
+                return httpx.Response(status, headers=headers, content=body or b"", request=request)
+            tic = time.perf_counter()
+            response = await self.inner.handle_async_request(request)
+            body = await response.aread()
+            cassette.record(key, response.status_code, dict(response.headers), body, time.perf_counter() - tic)
+            headers = {k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS}
+            return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+        async def aclose(self):
+            if self.inner is not None:
+                await self.inner.aclose()
+
+    return CassetteAsyncTransport()
+
+
+def transport():
+    """The synchronous counterpart of async_transport, for httpx.Client."""
+    cassette = get()
+    if cassette is None:
+        return None
+    import httpx
+
+    class CassetteTransport(httpx.BaseTransport):
+        def __init__(self):
+            self.inner = None if cassette.replaying else httpx.HTTPTransport()
+
+        def handle_request(self, request):
+            key = _request_key(request.method, request.url)
+            if cassette.replaying:
+                try:
+                    status, headers, body, delay = cassette.lookup(key)
+                except CassetteMiss as e:
+                    raise httpx.ConnectError(str(e), request=request) from e
+                time.sleep(delay)
+                return httpx.Response(status, headers=headers, content=body or b"", request=request)
+            tic = time.perf_counter()
+            response = self.inner.handle_request(request)
+            body = response.read()
+            cassette.record(key, response.status_code, dict(response.headers), body, time.perf_counter() - tic)
+            headers = {k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS}
+            return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+        def close(self):
+            if self.inner is not None:
+                self.inner.close()
+
+    return CassetteTransport()
+
+
+# --- requests hook ---
+
+def mount_requests(session, max_retries=None):
+    """Mount a recording or replaying adapter on a requests session; no-op without a cassette."""
+    cassette = get()
+    if cassette is None:
+        return
+    import io
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers
+
+    class CassetteAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            key = _request_key(request.method, request.url)
+            if not cassette.replaying:
+                tic = time.perf_counter()
+                response = super().send(request, **kwargs)
+                body = response.content
+                cassette.record(key, response.status_code, dict(response.headers), body, time.perf_counter() - tic)
+                return response
+            try:
+                status, headers, body, delay = cassette.lookup(key)
+            except CassetteMiss as e:
+                raise requests.exceptions.ConnectionError(str(e), request=request) from e
+            time.sleep(delay)
+            response = requests.Response()
+            response.status_code = status
+            response.headers = CaseInsensitiveDict(headers)
+            response.encoding = get_encoding_from_headers(response.headers)
+            response.raw = io.BytesIO(body or b"")
+            response._content = body or b""
+            response._content_consumed = True
+            response.url = request.url
+            response.request = request
+            return response
+
+    adapter = CassetteAdapter(max_retries=max_retries) if max_retries is not None else CassetteAdapter()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
@@ -0,0 +1,268 @@
+import math
+import uuid
+from bisect import bisect_left
+
+import numpy as np
+
+from common.records import fingerprint
+
+# Compact sets for the millions of IDs the collectors deduplicate against.
+#
+# A Python set of UUID strings costs well over 100 bytes per entry. Here keys are stored as
+# fixed-width integers in sorted NumPy columns: 16 bytes per UUID (two uint64 words) and 8
+# bytes per URL (its 64-bit fingerprint). New keys go to a small buffer that is merged into
+# the sorted columns once it grows past a fraction of them, so adding stays amortized cheap
+# and lookups are a binary search. An optional Bloom filter answers most misses without the
+# search, at about 10 bits per key for a 1% false positive rate.
+#
+# UuidSet and FingerprintSet support in, add, update, len and iteration, so they replace
+# sets of story IDs and URLs. benchmark/idset_benchmark.py measures memory and lookups.
+
+MERGE_MIN = 4096  # Buffered keys before a merge, for small sets
+MERGE_FRACTION = 0.125  # Buffered keys before a merge, as a fraction of the merged keys
+CHUNK = 65536  # Keys converted per step in update()
+_MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+
+
+class BloomFilter:
+    """A Bloom filter over integer keys, sized for capacity keys at error_rate false positives."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _hashes(self, key):
+        # Double hashing: the low word and a mix of the whole key give the bit positions
+        return key & _MASK64, (((key >> 64) ^ key) * _GOLDEN & _MASK64) | 1
+
+    def add(self, key):
+        h1, h2 = self._hashes(key)
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % self.size
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        h1, h2 = self._hashes(key)
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+
+class _SortedKeySet:
+    """Integer keys of WORDS 64-bit words, kept in sorted uint64 columns plus a buffer."""
+
+    WORDS = 1
+
+    def __init__(self, items=(), bloom_capacity=None, error_rate=0.01):
+        self.columns = [np.empty(0, dtype=np.uint64) for _ in range(self.WORDS)]
+        self.views = [memoryview(column) for column in self.columns]
+        self.pending = set()  # Keys not merged yet; never also in the columns
+        self.bloom = BloomFilter(bloom_capacity, error_rate) if bloom_capacity else None
+        self.update(items)
+
+    # --- Key conversion, per subclass ---
+
+    def _key(self, item):
+        raise NotImplementedError
+
+    def _item(self, key):
+        raise NotImplementedError
+
+    def _unkeyed(self, item):
+        """Called with items that have no integer key; they are ignored unless a subclass keeps them."""
+
+    # --- Set API ---
+
+    def __len__(self):
+        return len(self.columns[0]) + len(self.pending)
+
+    def __contains__(self, item):
+        key = self._key(item)
+        return key is not None and self._contains_key(key)
+
+    def add(self, item):
+        key = self._key(item)
+        if key is None:
+            self._unkeyed(item)
+            return
+        if self._contains_key(key):
+            return
+        self.pending.add(key)
+        if self.bloom is not None:
+            self.bloom.add(key)
+        if len(self.pending) >= max(MERGE_MIN, MERGE_FRACTION * len(self.columns[0])):
+            self._merge()
+
+    def update(self, items):
+        """
+        Add many items. Batches smaller than the merge threshold go through the buffer like
+        add(); larger ones are sorted and merged in once instead of buffered one by one.
+        """
+        chunks = []
+        chunk = []
+        for item in items:
+            key = self._key(item)
+            if key is None:
+                self._unkeyed(item)
+                continue
+            chunk.append(key)
+            if len(chunk) >= CHUNK:
+                chunks.append(self._split(chunk))
+                chunk = []
+        if not chunks:
+            if len(chunk) + len(self.pending) < max(MERGE_MIN, MERGE_FRACTION * len(self.columns[0])):
+                for key in chunk:
+                    if not self._contains_key(key):
+                        self.pending.add(key)
+                        if self.bloom is not None:
+                            self.bloom.add(key)
+                return
+            if not chunk:
+                return
+        if chunk:
+            chunks.append(self._split(chunk))
+        if self.bloom is not None:
+            for columns in chunks:
+                for key in self._join(columns):
+                    self.bloom.add(key)
+        self._merge([np.concatenate([columns[w] for columns in chunks]) for w in range(self.WORDS)])
+
+    def __iter__(self):
+        for start in range(0, len(self.columns[0]), CHUNK):
+            for key in self._join([column[start:start + CHUNK] for column in self.columns]):
+                yield self._item(key)
+        for key in list(self.pending):
+            yield self._item(key)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held, in bytes (buffered keys counted as Python ints in a set)."""
+        columns = sum(column.nbytes for column in self.columns)
+        return columns + 64 * len(self.pending) + (self.bloom.nbytes if self.bloom is not None else 0)
+
+    # --- Storage ---
+
+    def _split(self, keys):
+        """Integer keys to WORDS uint64 columns, most significant word first."""
+        shifts = [64 * (self.WORDS - 1 - w) for w in range(self.WORDS)]
+        return [np.fromiter(((key >> shift) & _MASK64 for key in keys), dtype=np.uint64, count=len(keys))
+                for shift in shifts]
+
+    def _join_one(self, words):
+        key = 0
+        for word in words:
+            key = (key << 64) | word
+        return key
+
+    def _join(self, columns):
+        return [self._join_one(words) for words in zip(*(column.tolist() for column in columns))]
+
+    def _merge(self, extra=None):
+        """Merge the buffer (and extra columns) into the sorted, deduplicated columns."""
+        parts = [self.columns]
+        if self.pending:
+            parts.append(self._split(list(self.pending)))
+            self.pending = set()
+        if extra is not None:
+            parts.append(extra)
+        columns = [np.concatenate([part[w] for part in parts]) for w in range(self.WORDS)]
+        # lexsort sorts by its last key first, so the most significant word goes last
+        order = np.lexsort(columns[::-1])
+        columns = [column[order] for column in columns]
+        if len(columns[0]) > 1:
+            distinct = np.zeros(len(columns[0]), dtype=bool)
+            distinct[0] = True
+            for column in columns:
+                distinct[1:] |= column[1:] != column[:-1]
+            columns = [column[distinct] for column in columns]
+        self.columns = columns
+        # Lookups bisect memoryviews of the columns: indexing them yields plain ints, which is
+        # much cheaper per probe than NumPy scalars for one key at a time
+        self.views = [memoryview(column) for column in columns]
+
+    def _contains_key(self, key):
+        if key in self.pending:
+            return True
+        if self.bloom is not None and key not in self.bloom:
+            return False
+        first = self.views[0]
+        word = key >> (64 * (self.WORDS - 1))
+        position = bisect_left(first, word)
+        # Equal leading words are rare, so the run is scanned rather than searched
+        while position < len(first) and first[position] == word:
+            if all(self.views[w][position] == (key >> (64 * (self.WORDS - 1 - w))) & _MASK64
+                   for w in range(1, self.WORDS)):
+                return True
+            position += 1
+        return False
+
+
+class UuidSet(_SortedKeySet):
+    """
+    A set of UUID strings (story and event IDs) at 16 bytes per ID. Iteration yields the
+    canonical lowercase form. Strings that are not UUIDs are kept in a plain set.
+    """
+
+    WORDS = 2
+
+    def __init__(self, items=(), bloom_capacity=None, error_rate=0.01):
+        self.other = set()
+        super().__init__(items, bloom_capacity, error_rate)
+
+    def _key(self, item):
+        try:
+            if len(item) == 36 and item[8] == item[13] == item[18] == item[23] == "-":
+                return int(item.replace("-", ""), 16)
+            return uuid.UUID(item).int
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    def _item(self, key):
+        return str(uuid.UUID(int=key))
+
+    def _unkeyed(self, item):
+        self.other.add(item)
+
+    def __len__(self):
+        return super().__len__() + len(self.other)
+
+    def __contains__(self, item):
+        key = self._key(item)
+        return self._contains_key(key) if key is not None else item in self.other
+
+    def __iter__(self):
+        yield from super().__iter__()
+        yield from self.other
+
+    @property
+    def nbytes(self):
+        return super().nbytes + 100 * len(self.other)
+
+
+class FingerprintSet(_SortedKeySet):
+    """
+    A set of URLs (or other strings) by 64-bit fingerprint, at 8 bytes per entry. Integers
+    are taken as fingerprints already. Iteration yields fingerprints, not the strings.
+    With billions of entries, the chance of two fingerprints colliding is no longer small.
+    """
+
+    WORDS = 1
+
+    def _key(self, item):
+        if isinstance(item, int):
+            return item & _MASK64
+        if isinstance(item, str):
+            return fingerprint(item)
+        return None
+
+    def _item(self, key):
+        return key
@@ -0,0 +1,171 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from common import metrics, profiling, serialization
+
+# Per-domain latency tracking for adaptive timeouts, hedged requests and the slow lane.
+#
+# Every attempt is recorded under a key, (endpoint, domain): successes as latency samples,
+# and attempts that ran into their timeout as timeouts. Quick failures (403s, refused
+# connections, paywalls) are neither, since they say nothing about how long the domain
+# takes. Once a key has MIN_SAMPLES recent successes, its timeout is TIMEOUT_FACTOR times
+# the observed p95 (within MIN_TIMEOUT..MAX_TIMEOUT) instead of the caller's fixed default.
+# hedged_call starts a duplicate attempt when the first has been running longer than the
+# key's p95 and returns whichever succeeds first. Its pool is sized from the caller's worker
+# count (set_workers). Keys whose median latency exceeds SLOW_SECONDS count as slow, so
+# callers can move them to a separate lane with fewer workers.
+
+WINDOW = 100  # Recent attempts kept per key
+MIN_SAMPLES = 10
+TIMEOUT_FACTOR = 2.0
+MIN_TIMEOUT = 2.0
+MAX_TIMEOUT = 30.0
+TIMEOUT_RATIO = 0.2  # Above this fraction of recent attempts timing out, use MAX_TIMEOUT
+SLOW_SECONDS = 5.0
+TIMED_OUT = 0.9  # An attempt failing after this fraction of its timeout counts as timed out
+HEDGE_WORKERS = 32  # Hedge pool size until set_workers is called
+
+HEDGES = metrics.Counter("gn_hedged_requests_total", "Hedged duplicate requests by endpoint and outcome",
+                         ["endpoint", "outcome"])
+
+
+def _quantile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LatencyTracker:
+    """Recent latencies per (endpoint, domain), optionally persisted to a JSON profile."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}  # key -> deque of seconds of successful attempts
+        self.failures = {}  # key -> deque of bools, True for a timed-out attempt
+
+    def observe(self, key, seconds, ok=True):
+        """Record a successful attempt (ok=True) or one that timed out (ok=False)."""
+        with self.lock:
+            if ok:
+                self.samples.setdefault(key, deque(maxlen=WINDOW)).append(seconds)
+            self.failures.setdefault(key, deque(maxlen=WINDOW)).append(not ok)
+
+    def observe_failure(self, key, seconds, timeout):
+        """Record a failed attempt as a timeout if it ran into its timeout; quick failures are ignored."""
+        if seconds >= TIMED_OUT * timeout:
+            self.observe(key, seconds, ok=False)
+
+    def quantile(self, key, q):
+        """The q-quantile of a key's recent successful latencies, or None with too few samples."""
+        with self.lock:
+            samples = list(self.samples.get(key, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return _quantile(samples, q)
+
+    def timeout(self, key, default):
+        with self.lock:
+            failures = list(self.failures.get(key, ()))
+        if len(failures) >= MIN_SAMPLES and sum(failures) / len(failures) > TIMEOUT_RATIO:
+            return MAX_TIMEOUT
+        p95 = self.quantile(key, 0.95)
+        if p95 is None:
+            return default
+        return min(MAX_TIMEOUT, max(MIN_TIMEOUT, TIMEOUT_FACTOR * p95))
+
+    def hedge_delay(self, key):
+        """Seconds after which a duplicate attempt is sent, or None while the key is unknown."""
+        return self.quantile(key, 0.95)
+
+    def is_slow(self, key):
+        median = self.quantile(key, 0.5)
+        return median is not None and median > SLOW_SECONDS
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return
+        for name, samples in serialization.load(path).items():
+            key = tuple(name.split("|", 1))
+            with self.lock:
+                self.samples[key] = deque(samples, maxlen=WINDOW)
+
+    def save(self, path):
+        with self.lock:
+            data = {"|".join(key): list(samples) for key, samples in self.samples.items()}
+        serialization.dump(data, path, atomic=True)
+
+
+TRACKER = LatencyTracker()
+_hedge_pool = None
+_pool_lock = threading.Lock()
+
+
+def set_workers(workers):
+    """
+    Size the hedge pool for a caller with this many worker threads: each can have a first
+    attempt and a hedge running, so attempts never queue behind other workers' attempts.
+    """
+    global _hedge_pool
+    with _pool_lock:
+        previous = _hedge_pool
+        _hedge_pool = ThreadPoolExecutor(max_workers=max(2, 2 * workers), thread_name_prefix="hedge")
+    if previous is not None:
+        previous.shutdown(wait=False)
+
+
+def _pool():
+    global _hedge_pool
+    with _pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+        return _hedge_pool
+
+
+def _attempt(fn, key, timeout, started=None):
+    if started is not None:
+        started.set()
+    tic = time.perf_counter()
+    try:
+        result = fn(timeout)
+    except Exception:
+        TRACKER.observe_failure(key, time.perf_counter() - tic, timeout)
+        raise
+    if result:
+        TRACKER.observe(key, time.perf_counter() - tic)
+    else:
+        TRACKER.observe_failure(key, time.perf_counter() - tic, timeout)
+    return result
+
+
+def hedged_call(key, fn, default_timeout):
+    """
+    Call fn(timeout) with the key's adaptive timeout. If it has not returned after the key's
+    p95 latency, start a second attempt and return the first truthy result of the two.
+    The delay counts from when the first attempt starts, not from when it was queued.
+    The attempt that loses keeps running in the background until its own timeout.
+    """
+    timeout = TRACKER.timeout(key, default_timeout)
+    delay = TRACKER.hedge_delay(key)
+    pool = _pool()
+    started = threading.Event()
+    # Attempts keep the caller's profiling tags (stage, domain) in the pool threads
+    first = pool.submit(profiling.propagate(_attempt), fn, key, timeout, started)
+    if delay is None or delay >= timeout:
+        return first.result()
+    started.wait()
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return first.result()
+
+    second = pool.submit(profiling.propagate(_attempt), fn, key, timeout)
+    pending = {first, second}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None and future.result():
+                HEDGES.inc(endpoint=key[0], outcome="hedge_won" if future is second else "first_won")
+                return future.result()
+    HEDGES.inc(endpoint=key[0], outcome="both_failed")
+    return first.result()
@@ -0,0 +1,187 @@
+import time
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from common import profiling
+
+# Process-wide counters, gauges and histograms, exposed in Prometheus text format
+# on a local HTTP endpoint (start_metrics_server). Recording is always on and cheap;
+# the endpoint is only started when a collector is given --metrics-port.
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        with _lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            items = list(self.values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with _lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self.values.items()]
+        for key, (counts, total, count) in items:
+            for bound, c in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, key, [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{labels} {c}")
+            inf_labels = _format_labels(self.labelnames, key, ['le="+Inf"'])
+            lines.append(f"{self.name}_bucket{inf_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+# --- Metrics shared by all collectors ---
+
+REQUESTS = Counter("gn_requests_total", "HTTP requests by endpoint, domain and status", ["endpoint", "domain", "status"])
+REQUEST_SECONDS = Histogram("gn_request_seconds", "HTTP request latency by endpoint and domain", ["endpoint", "domain"])
+RESPONSE_BYTES = Counter("gn_response_bytes_total", "Response bytes received by endpoint and domain", ["endpoint", "domain"])
+ERRORS = Counter("gn_errors_total", "Errors by stage and exception class", ["stage", "error"])
+QUEUE_DEPTH = Gauge("gn_queue_depth", "Items waiting in a work queue", ["queue"])
+WORKERS_BUSY = Gauge("gn_workers_busy", "Workers currently processing an item", ["pool"])
+WORKERS_TOTAL = Gauge("gn_workers_total", "Workers started", ["pool"])
+STAGE_SECONDS = Histogram("gn_stage_seconds", "Time spent per pipeline stage", ["stage"])
+ITEMS = Counter("gn_items_total", "Items completed by stage and outcome", ["stage", "outcome"])
+
+
+def observe_request(endpoint, domain, status, seconds, nbytes=0):
+    """Record one HTTP request. Use status "error" when no response was received."""
+    REQUESTS.inc(endpoint=endpoint, domain=domain, status=status)
+    REQUEST_SECONDS.observe(seconds, endpoint=endpoint, domain=domain)
+    if nbytes:
+        RESPONSE_BYTES.inc(nbytes, endpoint=endpoint, domain=domain)
+
+
+def observe_error(stage, error):
+    """Record an exception (or an error name) for a stage."""
+    ERRORS.inc(stage=stage, error=error if isinstance(error, str) else type(error).__name__)
+
+
+@contextmanager
+def span(stage):
+    """Time a block of work as one pipeline stage (and tag it for the profiler, if running)."""
+    tic = time.perf_counter()
+    try:
+        with profiling.tag(stage=stage):
+            yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - tic, stage=stage)
+
+
+@contextmanager
+def busy(pool):
+    """Mark a worker of the given pool as busy for the duration of a block."""
+    WORKERS_BUSY.inc(pool=pool)
+    try:
+        yield
+    finally:
+        WORKERS_BUSY.dec(pool=pool)
+
+
+def render():
+    """Render all registered metrics in Prometheus text exposition format."""
+    with _lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve /metrics on a daemon thread. Returns the server, or None if port is falsy."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[INFO] Metrics available at http://{host}:{port}/metrics")
+    return server
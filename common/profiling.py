@@ -0,0 +1,201 @@
+import os
+import sys
+import time
+import atexit
+import threading
+import contextvars
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from common import serialization
+
+# Sampling profiler for the collectors (--profile).
+#
+# A background thread samples the stack of every other thread at a fixed interval. Work is
+# tagged with tag(stage=..., domain=...); metrics.span tags its stage automatically. Each
+# sample is attributed to the sampled thread's innermost tags and to its worker (thread
+# name). Tagged blocks are also timed exactly. On exit two files are written:
+#
+#   <prefix>.folded       folded stacks ("worker;stage;domain;frame;frame count"), readable
+#                         by flamegraph.pl, speedscope or inferno
+#   <prefix>.stages.json  per-stage wall time, calls and sampled share, with the top domains
+#
+# Only threads inside a tagged block are sampled: idle pool threads, queue waits and
+# helper threads would otherwise make up most of the samples. Work handed to a thread pool
+# keeps the submitter's tags when submitted through propagate() (hedged requests are).
+# In asyncio collectors all coroutines share one thread, so sample tags are approximate
+# there. The sampler also needs the GIL, so CPU-bound stages are undersampled relative to
+# waits; the stage timers stay exact. Tagging is a no-op unless the profiler is running.
+
+INTERVAL = 0.005  # Seconds between samples
+MAX_DEPTH = 64
+TOP_DOMAINS = 10
+
+_tags = ContextVar("profile_tags", default={})
+_thread_tags = {}  # Thread ident -> innermost tags, read by the sampler
+_profiler = None
+
+
+@contextmanager
+def tag(**tags):
+    """Attribute the work in a block to a stage, domain, etc."""
+    profiler = _profiler
+    if profiler is None:
+        yield
+        return
+    current = {**_tags.get(), **tags}
+    token = _tags.set(current)
+    ident = threading.get_ident()
+    previous = _thread_tags.get(ident)
+    _thread_tags[ident] = current
+    tic = time.perf_counter()
+    try:
+        yield
+    finally:
+        if "stage" in tags:
+            profiler.time(current, time.perf_counter() - tic)
+        _tags.reset(token)
+        if previous is None:
+            _thread_tags.pop(ident, None)
+        else:
+            _thread_tags[ident] = previous
+
+
+def propagate(fn):
+    """
+    Wrap fn to run in a copy of the calling context, with its tags, when called in another
+    thread (e.g. submitted to a pool). Make one wrapper per submission.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(_run_tagged, fn, args, kwargs)
+
+    return run
+
+
+def _run_tagged(fn, args, kwargs):
+    current = _tags.get()
+    if _profiler is None or not current:
+        return fn(*args, **kwargs)
+    ident = threading.get_ident()
+    previous = _thread_tags.get(ident)
+    _thread_tags[ident] = current
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        if previous is None:
+            _thread_tags.pop(ident, None)
+        else:
+            _thread_tags[ident] = previous
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)})"
+
+
+class SamplingProfiler(threading.Thread):
+    def __init__(self, prefix, interval=INTERVAL):
+        super().__init__(name="profiler", daemon=True)
+        self.prefix = prefix
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.stacks = Counter()  # Folded stack -> samples
+        self.samples = Counter()  # (stage, domain) -> samples
+        self.timers = defaultdict(lambda: [0, 0.0])  # (stage, domain) -> [calls, seconds]
+        self.started = time.perf_counter()
+
+    def time(self, tags, seconds):
+        with self.lock:
+            timer = self.timers[(tags["stage"], tags.get("domain", "-"))]
+            timer[0] += 1
+            timer[1] += seconds
+
+    def run(self):
+        me = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                tags = _thread_tags.get(ident)
+                if ident == me or not tags:
+                    continue
+                stage, domain = tags.get("stage", "untagged"), tags.get("domain", "-")
+                frames = []
+                while frame is not None and len(frames) < MAX_DEPTH:
+                    frames.append(_frame_label(frame))
+                    frame = frame.f_back
+                folded = ";".join([names.get(ident, str(ident)), f"stage:{stage}", f"domain:{domain}"]
+                                  + frames[::-1])
+                with self.lock:
+                    self.stacks[folded] += 1
+                    self.samples[(stage, domain)] += 1
+
+    def breakdown(self):
+        """Per-stage wall time (from the timers) and sampled thread time, with the top domains."""
+        with self.lock:
+            timers = {key: list(value) for key, value in self.timers.items()}
+            samples = Counter(self.samples)
+        stages = {}
+        for (stage, domain), (calls, seconds) in timers.items():
+            entry = stages.setdefault(stage, {"calls": 0, "seconds": 0.0, "sampled_seconds": 0.0, "domains": {}})
+            entry["calls"] += calls
+            entry["seconds"] += seconds
+            if domain != "-":
+                entry["domains"][domain] = entry["domains"].get(domain, 0.0) + seconds
+        for (stage, domain), count in samples.items():
+            entry = stages.setdefault(stage, {"calls": 0, "seconds": 0.0, "sampled_seconds": 0.0, "domains": {}})
+            entry["sampled_seconds"] += count * self.interval
+        total = sum(entry["sampled_seconds"] for entry in stages.values()) or 1.0
+        for entry in stages.values():
+            entry["sampled_share"] = entry["sampled_seconds"] / total
+            top = sorted(entry["domains"].items(), key=lambda item: item[1], reverse=True)[:TOP_DOMAINS]
+            entry["domains"] = dict(top)
+        return {
+            "wall_seconds": time.perf_counter() - self.started,
+            "interval": self.interval,
+            "stages": dict(sorted(stages.items(), key=lambda item: item[1]["sampled_seconds"], reverse=True)),
+        }
+
+    def write(self):
+        with self.lock:
+            stacks = list(self.stacks.items())
+        with open(self.prefix + ".folded", "w", encoding="utf-8") as f:
+            for folded, count in stacks:
+                f.write(f"{folded} {count}\n")
+        report = self.breakdown()
+        serialization.dump(report, self.prefix + ".stages.json", pretty=True)
+
+        print(f"[INFO] Profile written to {self.prefix}.folded and {self.prefix}.stages.json")
+        print(f"{'stage':<16}{'calls':>8}{'seconds':>12}{'sampled %':>11}")
+        for stage, entry in report["stages"].items():
+            print(f"{stage:<16}{entry['calls']:>8}{entry['seconds']:>12.2f}{100 * entry['sampled_share']:>10.1f}%")
+
+
+def start(prefix, interval=INTERVAL):
+    """Start profiling until exit, writing <prefix>.folded and <prefix>.stages.json. No-op if prefix is None."""
+    global _profiler
+    if prefix is None or _profiler is not None:
+        return
+    _profiler = SamplingProfiler(prefix, interval)
+    _profiler.start()
+    atexit.register(stop)
+
+
+def stop():
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return
+    profiler.stopped.set()
+    profiler.join()
+    profiler.write()
+
+
+def add_argument(parser):
+    """Add the shared --profile option to a collector's argument parser."""
+    parser.add_argument("--profile", nargs="?", const="profile", default=None, metavar="PREFIX",
+                        help="Sample stacks per stage, domain and worker and write PREFIX.folded "
+                             "and PREFIX.stages.json on exit (default prefix: profile)")
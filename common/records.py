@@ -0,0 +1,315 @@
+import os
+import glob
+import hashlib
+from array import array
+from datetime import datetime
+
+from common import serialization
+
+# Compact in-memory tables for story and article metadata.
+#
+# json.load gives one dict per article, repeating keys such as "bias", "factuality",
+# "source_link" and "name" and holding a separate string for every value. Here each field
+# is a column instead: categorical fields (bias, factuality, outlet, domain, topic) are
+# small integer codes into a shared Vocabulary, numbers live in typed arrays and URLs in
+# one contiguous buffer. Loaders read one file at a time and keep only the columns, so the
+# peak memory is the tables plus the largest single file.
+
+UNKNOWN_DATE = -1
+_EPOCH = datetime(1970, 1, 1)
+
+
+class Vocabulary:
+    """Interns strings as small integer codes."""
+    __slots__ = ("values", "codes")
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        return value in self.codes
+
+
+class StringColumn:
+    """Append-only column of strings stored in one UTF-8 buffer with an offset array."""
+    __slots__ = ("data", "offsets")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("Q", [0])
+
+    def append(self, value):
+        self.data += (value or "").encode("utf-8")
+        self.offsets.append(len(self.data))
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def fingerprint(url):
+    """64-bit fingerprint of a URL, for counting and joining without keeping the string."""
+    return int.from_bytes(hashlib.blake2b((url or "").encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def date_code(value):
+    """Days since 1970-01-01 for an mm/dd/YYYY or ISO date, or UNKNOWN_DATE."""
+    if not value:
+        return UNKNOWN_DATE
+    for parse in (lambda v: datetime.strptime(v, "%m/%d/%Y"),
+                  lambda v: datetime.fromisoformat(v.replace("Z", "+00:00")).replace(tzinfo=None)):
+        try:
+            return (parse(str(value)) - _EPOCH).days
+        except ValueError:
+            continue
+    return UNKNOWN_DATE
+
+
+def _word_count(text):
+    return len(text.replace("\n", " ").split(" ")) if text else 0
+
+
+class Article:
+    """A read-only view of one row of an ArticleTable."""
+    __slots__ = ("table", "row")
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    @property
+    def story(self):
+        return self.table.story_titles[self.table.story[self.row]]
+
+    @property
+    def topic(self):
+        return self.table.topics[self.table.story_topic[self.table.story[self.row]]]
+
+    @property
+    def index(self):
+        return self.table.article_idx[self.row]
+
+    @property
+    def bias(self):
+        return self.table.biases[self.table.bias[self.row]]
+
+    @property
+    def factuality(self):
+        return self.table.factualities[self.table.factuality[self.row]]
+
+    @property
+    def name(self):
+        return self.table.outlets[self.table.outlet[self.row]]
+
+    @property
+    def domain(self):
+        return self.table.domains[self.table.domain[self.row]]
+
+    @property
+    def url(self):
+        return self.table.urls[self.row] if self.table.urls is not None else None
+
+    @property
+    def words(self):
+        return self.table.words[self.row]
+
+    @property
+    def date(self):
+        return self.table.date[self.row]
+
+
+class ArticleTable:
+    """
+    Struct-of-arrays store of articles grouped into stories. Articles of story s are the
+    rows story_start[s]:story_start[s + 1]. URLs are only kept when keep_urls=True; their
+    64-bit fingerprints always are.
+    """
+
+    def __init__(self, keep_urls=False):
+        # Vocabularies
+        self.topics = Vocabulary()
+        self.biases = Vocabulary()
+        self.factualities = Vocabulary()
+        self.outlets = Vocabulary()
+        self.domains = Vocabulary()
+        # Story columns
+        self.story_titles = StringColumn()
+        self.story_topic = array("I")
+        self.story_start = array("Q", [0])
+        # Article columns
+        self.story = array("I")
+        self.article_idx = array("i")
+        self.bias = array("B")
+        self.factuality = array("B")
+        self.outlet = array("I")
+        self.domain = array("I")
+        self.words = array("I")
+        self.date = array("i")
+        self.url_hash = array("Q")
+        self.urls = StringColumn() if keep_urls else None
+
+    def __len__(self):
+        return len(self.story)
+
+    def __getitem__(self, row):
+        return Article(self, row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield Article(self, row)
+
+    @property
+    def num_stories(self):
+        return len(self.story_topic)
+
+    def story_rows(self, s):
+        return range(self.story_start[s], self.story_start[s + 1])
+
+    def add_story(self, title, topic, articles):
+        """
+        Append a story and its articles. Each article is a dict with any of the keys
+        index, bias, factuality, name, url, date and words.
+        """
+        s = self.num_stories
+        self.story_titles.append(title)
+        self.story_topic.append(self.topics.code(topic))
+        for i, article in enumerate(articles):
+            url = article.get("url") or ""
+            self.story.append(s)
+            self.article_idx.append(article.get("index", i))
+            self.bias.append(self.biases.code(article.get("bias") or "Unknown"))
+            self.factuality.append(self.factualities.code(article.get("factuality") or "Unknown"))
+            self.outlet.append(self.outlets.code(article.get("name") or ""))
+            self.domain.append(self.domains.code(url.split("/")[2] if url.count("/") >= 2 else ""))
+            self.words.append(article.get("words", 0))
+            self.date.append(date_code(article.get("date")))
+            self.url_hash.append(fingerprint(url))
+            if self.urls is not None:
+                self.urls.append(url)
+        self.story_start.append(len(self.story))
+        return s
+
+    def nbytes(self):
+        """Approximate memory held by the columns, in bytes."""
+        arrays = [self.story_topic, self.story_start, self.story, self.article_idx, self.bias,
+                  self.factuality, self.outlet, self.domain, self.words, self.date, self.url_hash,
+                  self.story_titles.offsets]
+        total = sum(a.itemsize * len(a) for a in arrays) + len(self.story_titles.data)
+        if self.urls is not None:
+            total += len(self.urls.data) + self.urls.offsets.itemsize * len(self.urls.offsets)
+        return total
+
+
+# --- Loaders ---
+
+def load_story_metadata(files, table=None, keep_urls=False, unique_titles=True):
+    """
+    Load story_collection/{tag}_interest/{topic}.json files (story title -> article list).
+    With unique_titles, a story title seen in an earlier file is skipped, like merging the files' dicts.
+    """
+    table = table if table is not None else ArticleTable(keep_urls=keep_urls)
+    seen = set()
+    for path in files:
+        topic = os.path.splitext(os.path.basename(path))[0]
+        stories = serialization.load(path, schema=serialization.StoryFile)
+        for title, articles in stories.items():
+            if title == "stats" or (unique_titles and title in seen):
+                continue
+            if unique_titles:
+                seen.add(title)
+            table.add_story(title, topic, [{
+                "index": a.get("index", i),
+                "bias": a.get("bias"),
+                "factuality": a.get("factuality"),
+                "name": a.get("name"),
+                "url": a.get("source_link"),
+                "words": _word_count(a.get("abstract")),
+            } for i, a in enumerate(articles)])
+        del stories
+    return table
+
+
+def load_full_texts(news_dir, table=None, keep_urls=False):
+    """Load every {tag}_news/{topic}/{story}.json full-text file under news_dir."""
+    files = [path for path in sorted(glob.glob(os.path.join(news_dir, "*", "*.json")))
+             if os.path.basename(path) != "0-logs.json"]
+    return load_full_text_files(files, table=table, keep_urls=keep_urls)
+
+
+def load_full_text_files(files, table=None, keep_urls=False):
+    """Load full-text story files (lists of article records); the topic is the parent directory."""
+    table = table if table is not None else ArticleTable(keep_urls=keep_urls)
+    for path in files:
+        topic = os.path.basename(os.path.dirname(path))
+        records = serialization.load(path, schema=serialization.ArticleFile)
+        table.add_story(os.path.splitext(os.path.basename(path))[0], topic, [{
+            "index": r.get("article_idx", i),
+            "bias": r.get("bias"),
+            "factuality": r.get("factuality"),
+            "name": r.get("name"),
+            "url": r.get("url"),
+            "date": r.get("date_publish"),
+            "words": _word_count(r.get("maintext")),
+        } for i, r in enumerate(records)])
+        del records
+    return table
+
+
+def read_news_sources(path):
+    """
+    Read one news source file: a JSON object (api/download_news_sources.py), or JSON lines of
+    one-story objects (the pipeline's .jsonl files, which may end in a line cut off by a kill).
+    """
+    if not path.endswith(".jsonl"):
+        return serialization.load(path)
+    data = {}
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                data.update(serialization.loads(line))
+            except ValueError:
+                continue
+    return data
+
+
+def load_news_sources(files, table=None, keep_urls=True):
+    """
+    Load api/download_news_sources.py output (story ID -> {"sources": [...]}), as .json or
+    .jsonl files. Each file is a topic; URLs are kept by default since the URL mapping needs them.
+    """
+    table = table if table is not None else ArticleTable(keep_urls=keep_urls)
+    for path in files:
+        topic = os.path.splitext(os.path.basename(path))[0]
+        data = read_news_sources(path)
+        for story_id, story in data.items():
+            sources = (story or {}).get("sources", [])
+            table.add_story(story_id, topic, [{
+                "index": i,
+                "bias": (s.get("sourceInfo") or {}).get("bias"),
+                "factuality": (s.get("sourceInfo") or {}).get("factuality"),
+                "name": (s.get("sourceInfo") or {}).get("name"),
+                "url": s.get("url"),
+                "date": s.get("publishDate") or s.get("date"),
+            } for i, s in enumerate(sources)])
+        del data
+    return table
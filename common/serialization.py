@@ -0,0 +1,172 @@
+import os
+import json
+import typing
+import functools
+from typing import List, Optional, TypedDict
+
+# One place for JSON encoding and decoding. Uses orjson when it is installed and the
+# stdlib encoder otherwise. Output is compact unless pretty=True is asked for.
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+
+def dumps(obj, pretty=False) -> bytes:
+    """Encode obj as UTF-8 JSON bytes."""
+    if orjson:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option, default=_default)
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False, default=_default).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default).encode("utf-8")
+
+
+def loads(data):
+    """Decode JSON from bytes or str."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump(obj, path, pretty=False, atomic=False) -> None:
+    """Write obj as JSON to path. With atomic=True, write a temporary file and rename it into place."""
+    target = path + ".tmp" if atomic else path
+    with open(target, "wb") as f:
+        f.write(dumps(obj, pretty=pretty))
+    if atomic:
+        os.replace(target, path)
+
+
+def append_lines(path, objs) -> None:
+    """Append objs to path as JSON lines, in one write."""
+    with open(path, "ab") as f:
+        f.write(b"".join(dumps(obj) + b"\n" for obj in objs))
+
+
+def load(path, schema=None):
+    """
+    Read JSON from path. If a schema is given (see below), the decoded value is validated
+    against it and a ValueError is raised on the first mismatch.
+    """
+    with open(path, "rb") as f:
+        obj = loads(f.read())
+    if schema is not None:
+        validate(obj, schema, where=path)
+    return obj
+
+
+def _default(obj):
+    # datetime and date (e.g. NewsPlease date_publish), sets and anything else with a sensible str()
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)
+
+
+# --- Record schemas ---
+
+class _ArticleRecordExtras(TypedDict, total=False):
+    factuality: Optional[str]
+    name: Optional[str]
+    date_publish: Optional[str]
+    image_url: Optional[str]
+    language: Optional[str]
+    url: Optional[str]
+    source_domain: Optional[str]
+    title: Optional[str]
+    authors: Optional[List[str]]
+    maintext: Optional[str]
+
+
+class ArticleRecord(_ArticleRecordExtras):
+    """
+    A full-text article, as written to {tag}_news/{topic}/{story}.json. Only article_idx and
+    bias are required; the extracted fields are null when the extractor found nothing.
+    """
+    article_idx: int
+    bias: str
+
+
+class _StoryArticleExtras(TypedDict, total=False):
+    index: int
+    factuality: Optional[str]
+    name: Optional[str]
+
+
+class StoryArticle(_StoryArticleExtras):
+    """
+    Article metadata of a story, as written to story_collection/{tag}_interest/{topic}.json.
+    Only source_link and bias are required; the rest is missing or null for some outlets.
+    """
+    source_link: str
+    bias: str
+
+
+# A story file maps story titles to their article lists (plus an optional "stats" entry)
+StoryFile = typing.Dict[str, List[StoryArticle]]
+ArticleFile = List[ArticleRecord]
+
+
+@functools.lru_cache(maxsize=None)
+def _type_hints(tp):
+    return typing.get_type_hints(tp)
+
+
+def _check(value, tp, where):
+    origin = typing.get_origin(tp)
+    if tp is typing.Any:
+        return
+    if origin is typing.Union:
+        for option in typing.get_args(tp):
+            try:
+                _check(value, option, where)
+                return
+            except ValueError:
+                continue
+        raise ValueError(f"{where}: {value!r} does not match {tp}")
+    if origin is list:
+        if not isinstance(value, list):
+            raise ValueError(f"{where}: expected a list, got {type(value).__name__}")
+        (item_type,) = typing.get_args(tp)
+        for i, item in enumerate(value):
+            _check(item, item_type, f"{where}[{i}]")
+        return
+    if origin is dict:
+        if not isinstance(value, dict):
+            raise ValueError(f"{where}: expected an object, got {type(value).__name__}")
+        _, value_type = typing.get_args(tp)
+        for key, item in value.items():
+            if key == "stats":
+                continue
+            _check(item, value_type, f"{where}.{key}")
+        return
+    if typing.is_typeddict(tp):
+        if not isinstance(value, dict):
+            raise ValueError(f"{where}: expected an object, got {type(value).__name__}")
+        hints = _type_hints(tp)
+        for key in tp.__required_keys__:
+            if key not in value:
+                raise ValueError(f"{where}: missing field {key!r}")
+        for key, field_type in hints.items():
+            if key in value:
+                _check(value[key], field_type, f"{where}.{key}")
+        return
+    if tp is type(None):
+        if value is not None:
+            raise ValueError(f"{where}: expected null, got {type(value).__name__}")
+        return
+    if not isinstance(value, tp) or (tp is int and isinstance(value, bool)):
+        raise ValueError(f"{where}: expected {tp.__name__}, got {type(value).__name__}")
+
+
+def validate(obj, schema, where="$"):
+    """Validate a decoded value against a schema type (a TypedDict, or List/Dict/Optional of one)."""
+    _check(obj, schema, where)
+    return obj
@@ -0,0 +1,185 @@
+import asyncio
+import random
+import threading
+
+# Multi-context rendering backend for download_links (--render_backend contexts).
+#
+# Instead of one undetected Chrome per worker thread, a few Chromium processes each host
+# several browser contexts. A context is an isolated profile inside its browser (own
+# cookies, storage and cache), so contexts cannot see each other's sessions. Pages render
+# concurrently, one per context, so rendering concurrency is browsers * contexts while
+# memory grows mostly with the number of browsers.
+#
+# A context is recycled (closed, with its cookies, and recreated on next use) after
+# CONTEXT_PAGES pages or after a failed render. A browser is replaced after BROWSER_PAGES
+# pages: new contexts open in its replacement, and the old process exits once its last
+# context is closed. Playwright runs on its own event loop thread; worker threads call
+# render(), which blocks until their page is done.
+
+CONTEXT_PAGES = 16
+BROWSER_PAGES = 256
+SCROLLS = 3
+SCROLL_PAUSE = 2
+
+BLOCKED_RESOURCES = {"image", "media"}  # Like the Selenium prefs, skip images and videos
+LAUNCH_ARGS = ["--disable-blink-features=AutomationControlled", "--disable-dev-shm-usage", "--disable-gpu"]
+
+
+class _Browser:
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages = 0
+        self.open = 0  # Contexts still open in this browser
+        self.retired = False
+
+
+class _Slot:
+    """One concurrent rendering slot: a context of the browser at index, created lazily."""
+
+    def __init__(self, index):
+        self.index = index
+        self.owner = None
+        self.context = None
+        self.pages = 0
+
+
+class BrowserPool:
+    def __init__(self, browsers=1, contexts=8, user_agents=None, executable_path=None, headless=False,
+                 context_pages=CONTEXT_PAGES, browser_pages=BROWSER_PAGES):
+        self.num_browsers = browsers
+        self.num_contexts = contexts
+        self.user_agents = user_agents or [None]
+        self.executable_path = executable_path
+        self.headless = headless
+        self.context_pages = context_pages
+        self.browser_pages = browser_pages
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="browser-pool", daemon=True)
+        self.playwright = None
+        self.browsers = []
+        self.slots = None
+        self.launch_lock = None
+
+    @property
+    def capacity(self):
+        return self.num_browsers * self.num_contexts
+
+    def start(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+        print(f"[INFO] Browser pool started: {self.num_browsers} browsers x {self.num_contexts} contexts")
+
+    def render(self, link, timeout):
+        """Render a page in a free context and return its HTML. Raises on failure."""
+        return asyncio.run_coroutine_threadsafe(self._render(link, timeout), self.loop).result()
+
+    def close(self):
+        if not self.thread.is_alive():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close(), self.loop).result(timeout=60)
+        except Exception as e:
+            print(f"Error closing browser pool: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    async def _start(self):
+        from playwright.async_api import async_playwright
+
+        self.playwright = await async_playwright().start()
+        self.browsers = [await self._launch() for _ in range(self.num_browsers)]
+        self.launch_lock = asyncio.Lock()
+        self.slots = asyncio.Queue()
+        for _ in range(self.num_contexts):
+            for index in range(self.num_browsers):
+                self.slots.put_nowait(_Slot(index))
+
+    async def _launch(self):
+        launch_args = {"headless": self.headless, "args": LAUNCH_ARGS}
+        if self.executable_path:
+            launch_args["executable_path"] = self.executable_path
+        return _Browser(await self.playwright.chromium.launch(**launch_args))
+
+    async def _open_context(self, slot):
+        async with self.launch_lock:
+            current = self.browsers[slot.index]
+            if current.pages >= self.browser_pages or not current.browser.is_connected():
+                # Retire the browser; its remaining contexts finish their pages first
+                current.retired = True
+                if current.open == 0:
+                    await self._quit(current)
+                current = self.browsers[slot.index] = await self._launch()
+        slot.owner = current
+        slot.context = await current.browser.new_context(user_agent=random.choice(self.user_agents),
+                                                         ignore_https_errors=True)
+        await slot.context.route("**/*", _block_heavy_resources)
+        slot.pages = 0
+        current.open += 1
+
+    async def _close_context(self, slot):
+        owner, context = slot.owner, slot.context
+        slot.owner = slot.context = None
+        try:
+            await context.close()
+        except Exception:
+            pass
+        owner.open -= 1
+        if owner.retired and owner.open == 0:
+            await self._quit(owner)
+
+    async def _quit(self, owner):
+        try:
+            await owner.browser.close()
+        except Exception as e:
+            print(f"Error closing browser: {e}")
+
+    async def _render(self, link, timeout):
+        slot = await self.slots.get()
+        try:
+            if slot.context is not None and slot.owner.retired:
+                await self._close_context(slot)
+            if slot.context is None:
+                await self._open_context(slot)
+            page = await slot.context.new_page()
+            try:
+                await page.goto(link, timeout=timeout * 1000, wait_until="load")
+                # Like load_page: scroll a few times so lazily loaded content renders
+                height = await page.evaluate("document.body.scrollHeight")
+                for _ in range(SCROLLS):
+                    await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+                    await asyncio.sleep(SCROLL_PAUSE)
+                    new_height = await page.evaluate("document.body.scrollHeight")
+                    if new_height == height:
+                        break
+                    height = new_height
+                html = await page.content()
+            finally:
+                await page.close()
+            slot.pages += 1
+            slot.owner.pages += 1
+            if slot.pages >= self.context_pages or slot.owner.retired:
+                await self._close_context(slot)
+            return html
+        except Exception:
+            # A failed render may leave the context in a bad state (popups, challenges): recycle it
+            if slot.context is not None:
+                await self._close_context(slot)
+            raise
+        finally:
+            self.slots.put_nowait(slot)
+
+    async def _close(self):
+        while not self.slots.empty():
+            slot = self.slots.get_nowait()
+            if slot.context is not None:
+                await self._close_context(slot)
+        for owner in self.browsers:
+            await self._quit(owner)
+        await self.playwright.stop()
+
+
+async def _block_heavy_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCES:
+        await route.abort()
+    else:
+        await route.continue_()
@@ -1,75 +1,165 @@
 import os
-import json
+import csv
+import dbm
 import glob
+import heapq
+import hashlib
 import argparse
-import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from tqdm import tqdm
 
+from common import profiling, records
+from story_collection.qualification import DEFAULT_SPEC, StoryFilter
+
 LIMIT = 10
 
+# Query parameters that never change the article being served
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "cmpid", "ocid", "smid", "ref", "cmp"}
+
+NEXT_INDEX_KEY = "__next_index__"
+
+
+def normalize_url(url):
+    """
+    Normalize a URL so that trivially different links to the same article collapse:
+    lowercase scheme and host, drop "www.", default ports, fragments, tracking
+    parameters and trailing slashes, and sort the remaining query parameters.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme == "http":
+        scheme = "https"
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def url_key(url):
+    """Hash a normalized URL into a fixed-size key for the persistent index."""
+    return hashlib.sha1(normalize_url(url).encode("utf-8")).digest()[:12]
+
+
+def top_story_urls(json_file, limit=LIMIT, qualify_spec=None):
+    """
+    Return the source URLs of the `limit` stories with the most sources in a news source file,
+    among the stories that pass the qualification filter (see story_collection/qualification.py).
+    Runs in a worker process; uses a bounded heap instead of sorting every story.
+    """
+    story_filter = StoryFilter(qualify_spec)
+    try:
+        table = records.load_news_sources([json_file])
+    except Exception as e:
+        print(f"Error reading {json_file}: {e}")
+        return []
+
+    # Each JSON file is expected to be a dictionary where each key maps to an object
+    # that contains a "sources" array.
+    candidates = range(table.num_stories)
+    if story_filter:
+        candidates = [s for s in candidates
+                      if story_filter([table.biases[table.bias[row]] for row in table.story_rows(s)])]
+    # limit=0 takes every story, leaving the selection to a value-ordered crawl (see priority.py)
+    stories = heapq.nlargest(limit, candidates, key=lambda s: len(table.story_rows(s))) if limit else candidates
+    return [url for s in stories for url in (table.urls[row] for row in table.story_rows(s)) if url]
+
+
+def open_index(csv_file):
+    """
+    Open the persistent URL index next to the CSV, rebuilding it from the CSV when it is missing.
+    The index maps hashed normalized URLs to their CSV index, and JSON file names to their mtime.
+    """
+    index_path = csv_file + ".idx"
+    fresh = not glob.glob(index_path + "*")
+    index = dbm.open(index_path, "c")
+    if fresh and os.path.exists(csv_file):
+        next_index = 0
+        with open(csv_file, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                index[url_key(row["url"])] = row["index"]
+                next_index = max(next_index, int(row["index"]) + 1)
+        index[NEXT_INDEX_KEY] = str(next_index)
+        print(f"Rebuilt URL index from {csv_file} ({next_index} rows)")
+    return index
+
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Add new URLs from JSON sources to CSV."
+        description="Add new URLs from JSON (or JSON lines) sources to CSV."
     )
     parser.add_argument("json_dir", help="Directory containing JSON files")
     parser.add_argument("csv_file", help="CSV file path to read and update")
+    parser.add_argument("--limit", type=int, default=LIMIT,
+                        help=f"Number of stories with the most sources to take from each file, 0 for all (default: {LIMIT})")
+    parser.add_argument("--qualify", type=str, default=DEFAULT_SPEC,
+                        help=f"Only take stories whose sources meet these bias counts, or 'none' (default: {DEFAULT_SPEC}). "
+                             "Use --full after changing it, so unchanged files are reparsed")
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count(),
+                        help="Number of processes used to parse JSON files (default: all cores)")
+    parser.add_argument("--full", action="store_true",
+                        help="Reparse all JSON files, not only those that changed since the last run")
+    profiling.add_argument(parser)
     args = parser.parse_args()
+    profiling.start(args.profile)
+    StoryFilter(args.qualify)  # Fail on an invalid spec before starting the workers
 
     json_dir = args.json_dir
     csv_file = args.csv_file
-
-    # Load the existing CSV if it exists, else create a new DataFrame with 'index' and 'url' columns.
-    if os.path.exists(csv_file):
-        df = pd.read_csv(csv_file)
-    else:
-        df = pd.DataFrame(columns=["index", "url"])
-
-    # Create a set of existing URLs for quick lookup.
-    existing_urls = set(df["url"].tolist())
-
-    new_urls = set()
-
-    # Get all JSON files in the directory.
-    json_files = glob.glob(os.path.join(json_dir, "*.json"))
-    for json_file in tqdm(json_files):
-        try:
-            with open(json_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except Exception as e:
-            print(f"Error reading {json_file}: {e}")
-            continue
-
-        # Each JSON file is expected to be a dictionary where each key maps to an object
-        # that contains a "sources" array.
-        data = sorted(data.values(), key=lambda x: len(
-            x["sources"]), reverse=True)[:LIMIT]
-
-        for value in data:
-            sources = value.get("sources", [])
-            for source in sources:
-                url = source.get("url")
-                if url and url not in existing_urls:
-                    new_urls.add(url)
-                    # Update to avoid duplicates across files.
-                    existing_urls.add(url)
-
-    if new_urls:
-        # Determine the next index.
-        next_index = int(df["index"].max()) + 1 if not df.empty else 0
-
-        new_rows = []
-        for url in new_urls:
-            new_rows.append({"index": next_index, "url": url})
-            next_index += 1
-
-        # Create a DataFrame for the new rows and append it to the existing DataFrame.
-        new_df = pd.DataFrame(new_rows)
-        df = pd.concat([df, new_df], ignore_index=True)
-
-        # Write the updated DataFrame back to the CSV.
-        df.to_csv(csv_file, index=False)
-        print(f"Added {len(new_urls)} new URL(s) to {csv_file}")
+    index = open_index(csv_file)
+
+    try:
+        next_index = int(index.get(NEXT_INDEX_KEY, b"0"))
+
+        # Only parse JSON files that are new or changed since the last run.
+        json_files = []
+        # .jsonl files are written by the streaming pipeline, one story per line
+        for json_file in glob.glob(os.path.join(json_dir, "*.json")) + glob.glob(os.path.join(json_dir, "*.jsonl")):
+            file_key = "file:" + os.path.basename(json_file)
+            mtime = str(os.path.getmtime(json_file)).encode()
+            if args.full or index.get(file_key) != mtime:
+                json_files.append((json_file, file_key, mtime))
+        print(f"{len(json_files)} new or changed JSON file(s) to parse")
+
+        write_header = not os.path.exists(csv_file) or os.path.getsize(csv_file) == 0
+        added = 0
+        with open(csv_file, "a", encoding="utf-8", newline="") as f, \
+                ProcessPoolExecutor(max_workers=args.num_workers) as executor:
+            writer = csv.writer(f)
+            if write_header:
+                writer.writerow(["index", "url"])
+
+            results = executor.map(top_story_urls, [jf for jf, _, _ in json_files],
+                                   [args.limit] * len(json_files), [args.qualify] * len(json_files),
+                                   chunksize=16)
+            for (_, file_key, mtime), urls in tqdm(zip(json_files, results), total=len(json_files)):
+                new_rows = {}
+                for url in urls:
+                    key = url_key(url)
+                    if key in new_rows or key in index:
+                        continue
+                    new_rows[key] = (next_index, url)
+                    next_index += 1
+                writer.writerows(new_rows.values())
+                # Flush the rows before indexing them, so a crash never indexes a URL missing from the CSV
+                f.flush()
+                for key, (row_index, _) in new_rows.items():
+                    index[key] = str(row_index)
+                index[NEXT_INDEX_KEY] = str(next_index)
+                index[file_key] = mtime
+                added += len(new_rows)
+    finally:
+        index.close()
+
+    if added:
+        print(f"Added {added} new URL(s) to {csv_file}")
     else:
         print("No new URLs found.")
 
@@ -0,0 +1,126 @@
+import re
+import dbm
+import struct
+import hashlib
+import threading
+
+from common import serialization
+
+# Near-duplicate detection for syndicated (AP/Reuters-style) copies of the same article.
+#
+# Each maintext gets a MinHash signature over word shingles. Signatures are split into
+# LSH bands; articles that share a band are candidates and count as duplicates when their
+# estimated Jaccard similarity reaches THRESHOLD. Every article is assigned a cluster ID
+# (the ID of the first article seen in the cluster, its canonical copy). Per-domain counts
+# of non-canonical copies tell which domains mostly syndicate wire copy.
+
+SHINGLE = 5
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+THRESHOLD = 0.8
+
+SYNDICATION_MIN_ARTICLES = 10
+SYNDICATION_RATIO = 0.8
+
+_MERSENNE = (1 << 61) - 1
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE | 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE)
+    for i in range(NUM_PERM)
+]
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text, k=SHINGLE):
+    words = _WORD.findall(text.lower())
+    if len(words) < k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def minhash(text):
+    """MinHash signature (NUM_PERM integers) of a text's word shingles."""
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+              for s in shingles(text)]
+    if not hashes:
+        return None
+    return [min((a * h + b) % _MERSENNE for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def _band_keys(signature):
+    for band in range(BANDS):
+        chunk = struct.pack(f">{ROWS}Q", *signature[band * ROWS:(band + 1) * ROWS])
+        yield b"b%d:" % band + hashlib.blake2b(chunk, digest_size=8).digest()
+
+
+class DuplicateIndex:
+    """
+    Persistent LSH index (a dbm file) from band hashes to cluster IDs.
+    Safe to share between the worker threads of download_links.
+    """
+
+    def __init__(self, path):
+        self.db = dbm.open(path, "c")
+        self.lock = threading.Lock()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def _get_json(self, key):
+        value = self.db.get(key)
+        return serialization.loads(value) if value is not None else None
+
+    def add(self, article_id, maintext, domain):
+        """
+        Index an article. Returns (cluster_id, is_duplicate), where cluster_id is the ID of the
+        canonical copy. Re-adding a known article returns its existing cluster.
+        """
+        article_key = f"a:{article_id}".encode()
+        signature = minhash(maintext or "")
+        with self.lock:
+            if article_key in self.db:
+                cluster_id = self.db[article_key].decode()
+                return cluster_id, cluster_id != str(article_id)
+            if signature is None:
+                self.db[article_key] = str(article_id)
+                return str(article_id), False
+
+            cluster_id = None
+            for key in _band_keys(signature):
+                candidate = self.db.get(key)
+                if candidate is None:
+                    continue
+                canonical = self._get_json(b"c:" + candidate)
+                if canonical and similarity(signature, canonical["sig"]) >= THRESHOLD:
+                    cluster_id = candidate.decode()
+                    break
+
+            is_duplicate = cluster_id is not None
+            if not is_duplicate:
+                cluster_id = str(article_id)
+                self.db[b"c:" + cluster_id.encode()] = serialization.dumps({"sig": signature, "domain": domain})
+                for key in _band_keys(signature):
+                    if key not in self.db:
+                        self.db[key] = cluster_id
+            self.db[article_key] = cluster_id
+
+            stats = self._get_json(f"d:{domain}".encode()) or {"articles": 0, "duplicates": 0}
+            stats["articles"] += 1
+            stats["duplicates"] += int(is_duplicate)
+            self.db[f"d:{domain}".encode()] = serialization.dumps(stats)
+        return cluster_id, is_duplicate
+
+    def syndicates(self, domain):
+        """Whether a domain's articles are mostly copies of articles first seen elsewhere."""
+        with self.lock:
+            stats = self._get_json(f"d:{domain}".encode())
+        if not stats or stats["articles"] < SYNDICATION_MIN_ARTICLES:
+            return False
+        return stats["duplicates"] / stats["articles"] >= SYNDICATION_RATIO
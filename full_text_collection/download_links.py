@@ -1,29 +1,41 @@
 import os
-import json
+import re
+import csv
 import time
 import random
 import requests
 import gzip
 import platform
 import argparse
+import threading
+import multiprocessing
 from queue import Queue, Empty
 from threading import Thread, Event
+from urllib.parse import urlsplit
+from concurrent.futures import ProcessPoolExecutor
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util import Retry
+from requests.utils import get_encoding_from_headers
 
 import certifi
-import pandas as pd
-from newsplease import NewsPlease, SimpleCrawler
-import undetected_chromedriver as uc
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+
+# newsplease, undetected_chromedriver and selenium are imported inside the functions
+# that use them, so importing this module (e.g. for the CLI or the pipeline) stays fast.
+
+from common import cassette, latency, metrics, profiling, serialization
+from full_text_collection.extraction import ExtractionEngine
+from full_text_collection.dedup import DuplicateIndex
+from full_text_collection.browser_pool import BrowserPool
+from full_text_collection import prefilter
 
 session = requests.Session()
 retries = Retry(total=3, backoff_factor=1,
                 status_forcelist=[500, 502, 503, 504])
 adapter = HTTPAdapter(max_retries=retries)
 session.mount("https://", adapter)
+session.mount("http://", adapter)
+# Under GN_CASSETTE, record or replay the session's requests (the HTTP tier and PDF downloads)
+cassette.mount_requests(session, retries)
 
 # List of bad sources, domain to failed times
 bad_sources = {}
@@ -35,6 +47,34 @@ skip = [
 scroll_pause_time = 2
 FAIL_THRESHOLD = 8
 
+# Default timeouts until a domain has enough samples for an adaptive one (see common/latency.py)
+HTTP_TIMEOUT = 10
+PAGE_LOAD_TIMEOUT = 30
+LATENCY_PROFILE = "latency_profile.json"
+
+# Domains whose certificates failed verification once; they are fetched unverified from then on
+insecure_ssl_domains = set()
+
+# PDF text extraction runs in a process pool, created on first use (see get_pdf_pool)
+PDF_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+pdf_pool = None
+pdf_pool_lock = threading.Lock()
+
+# Per-domain extractor profile, created on first use (see get_extraction_engine)
+extraction_engine = None
+
+# Near-duplicate index over extracted maintext (see dedup.py), opened with --dedup
+duplicate_index = None
+# Skip fetching from domains known to mostly carry wire copies already collected elsewhere
+skip_syndicated = False
+
+# Global crawl budget (see priority.Budget), set by download_links_queue
+budget = None
+
+# Accepted page languages for the pre-extraction filter (see prefilter.py); None accepts all
+prefilter_languages = {"en"}
+use_prefilter = True
+
 # Define a global list of user agents for both Selenium and requests
 user_agents = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
@@ -45,6 +85,8 @@ user_agents = [
 
 def new_chrome_options(extension_path=None, profile_directory=None):
     """Create a new ChromeOptions object with custom settings."""
+    import undetected_chromedriver as uc
+
     options = uc.ChromeOptions()
     options.add_argument(f"user-agent={random.choice(user_agents)}")
     options.add_argument("--disable-blink-features=AutomationControlled")
@@ -68,53 +110,189 @@ def new_chrome_options(extension_path=None, profile_directory=None):
     return options
 
 
-def save_pdf_from_response(response, pdf_filename):
-    """Save the PDF content from the response to a file."""
+def is_pdf_link(link):
+    """Whether a URL path names a PDF file."""
+    return urlsplit(link).path.lower().endswith(".pdf")
+
+
+_META_CHARSET = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?([\w-]+)", re.I)
+
+
+def open_stream(link, timeout, user_agent=None):
+    """
+    Start a streamed GET. SSL verification is decided once per domain: after a domain's first
+    SSLError, it is retried (and from then on fetched) unverified.
+    """
+    domain = link.split("/")[2]
+    while True:
+        verify = False if domain in insecure_ssl_domains else certifi.where()
+        try:
+            return session.get(link, timeout=timeout, stream=True, verify=verify,
+                               headers={"User-Agent": user_agent or random.choice(user_agents)})
+        except requests.exceptions.SSLError:
+            if domain in insecure_ssl_domains:
+                raise
+            print(f"SSL verification failed for {domain}, fetching it unverified from now on.")
+            insecure_ssl_domains.add(domain)
+
+
+def is_pdf_response(response, first):
+    return first.startswith(b"%PDF") or "application/pdf" in response.headers.get("Content-Type", "")
+
+
+def save_pdf_stream(first, chunks, pdf_filename):
+    """Write a PDF's first chunk and the rest of its stream to disk; returns its size."""
+    # Per-thread temporary file, since a hedged fetch may stream the same PDF twice
+    tmp_filename = f"{pdf_filename}.{threading.get_ident()}.tmp"
+    size = len(first)
+    with open(tmp_filename, "wb") as pdf_file:
+        pdf_file.write(first)
+        for chunk in chunks:
+            if chunk:  # Filter out keep-alive new chunks
+                pdf_file.write(chunk)
+                size += len(chunk)
+    os.replace(tmp_filename, pdf_filename)
+    print(f"Saved PDF: {pdf_filename}")
+    return size
+
+
+def decode_html(response, body):
+    """Decode a page by its declared charset (header, then <meta>), falling back to UTF-8."""
+    encoding = get_encoding_from_headers(response.headers)
+    # requests assumes ISO-8859-1 for any text/* without a charset, which is rarely right for pages
+    if encoding == "ISO-8859-1" and "charset" not in response.headers.get("Content-Type", "").lower():
+        encoding = None
+    if encoding is None:
+        match = _META_CHARSET.search(body[:4096])
+        encoding = match.group(1).decode("ascii") if match else "utf-8"
     try:
-        with open(pdf_filename, 'wb') as pdf_file:
-            for chunk in response.iter_content(chunk_size=1024):
-                if chunk:  # Filter out keep-alive new chunks
-                    pdf_file.write(chunk)
-        return f"Saved PDF: {pdf_filename}"
-    except Exception as e:
-        return f"Error saving PDF to file: {e}"
+        return body.decode(encoding, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
 
 
-def download_pdf(link, pdf_filename, stream=True, verify_ssl=True):
-    """Attempt to download a PDF with the given parameters."""
+def fetch_page(link, timeout, user_agent, pdf_filename):
+    """
+    Fetch a page with one streamed request and sniff its first bytes. A PDF is streamed on to
+    pdf_filename and returned as ("pdf", size); anything else as ("html", text). Returns None
+    if the request fails, like the fetchers hedged_call expects.
+    """
     try:
-        response = requests.get(
-            link,
-            timeout=10,
-            stream=stream,
-            verify=certifi.where() if verify_ssl else False,
-            headers={'User-Agent': random.choice(user_agents)},
-        )
-        if response.status_code == 200:
-            return save_pdf_from_response(response, pdf_filename)
-        else:
-            return f"Failed to download PDF: HTTP {response.status_code}"
-    except requests.exceptions.RequestException as e:
-        return f"Download error: {e}"
+        with open_stream(link, timeout, user_agent) as response:
+            if response.status_code != 200:
+                return None
+            chunks = response.iter_content(chunk_size=64 * 1024)
+            first = next(chunks, b"")
+            if is_pdf_response(response, first):
+                return "pdf", save_pdf_stream(first, chunks, pdf_filename)
+            body = first + b"".join(chunks)
+            return ("html", decode_html(response, body)) if body.strip() else None
+    except Exception as e:
+        print(f"HTTP fetch failed for {link}: {e}")
+        return None
+
+
+def download_pdf(link, pdf_filename):
+    """
+    Stream a PDF to disk with a single request. Raises ValueError if the response is not a PDF.
+    """
+    response = open_stream(link, 10)
+    with response:
+        response.raise_for_status()
+        chunks = response.iter_content(chunk_size=64 * 1024)
+        first = next(chunks, b"")
+        if not is_pdf_response(response, first):
+            content_type = response.headers.get("Content-Type", "")
+            raise ValueError(f"Not a PDF ({content_type or 'unknown content type'}): {link}")
+        return save_pdf_stream(first, chunks, pdf_filename)
+
+
+def extract_pdf_text(pdf_filename, link):
+    """Extract an article dict from a PDF file. Runs in the PDF process pool."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf_filename)
+    text = "\n".join((page.extract_text() or "").strip() for page in reader.pages).strip()
+    info = reader.metadata or {}
+    return {
+        "url": link,
+        "source_domain": link.split("/")[2],
+        "title": info.get("/Title") or None,
+        "authors": [info["/Author"]] if info.get("/Author") else [],
+        "date_publish": None,
+        "image_url": None,
+        "language": None,
+        "maintext": text or None,
+    }
+
+
+def get_pdf_pool():
+    """Process pool for PDF text extraction, so parsing never blocks the fetch workers."""
+    global pdf_pool
+    with pdf_pool_lock:
+        if pdf_pool is None:
+            pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return pdf_pool
 
 
-def process_pdf_download(link, pdf_filename):
-    """Handle the PDF download process with multiple fallbacks."""
-    # Attempt with streaming and SSL verification
-    result = download_pdf(link, pdf_filename, stream=True, verify_ssl=True)
-    if "Saved PDF" in result:
-        return result
+def shutdown_pdf_pool():
+    """Wait for pending PDF extractions and stop the pool."""
+    global pdf_pool
+    with pdf_pool_lock:
+        pool, pdf_pool = pdf_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
 
-    # Retry without streaming
-    print(f"Retrying {link} without streaming.")
-    result = download_pdf(link, pdf_filename, stream=False, verify_ssl=True)
-    if "Saved PDF" in result:
-        return result
 
-    # Final retry with SSL verification disabled
-    print(f"Retrying {link} with SSL verification disabled.")
-    result = download_pdf(link, pdf_filename, stream=False, verify_ssl=False)
-    return result
+def pdf_paths(output_dir, task_id):
+    pdf_file = os.path.join(output_dir, "pdf", f"{task_id}.pdf")
+    os.makedirs(os.path.dirname(pdf_file), exist_ok=True)
+    return pdf_file, os.path.join(output_dir, "json", f"{task_id}.json")
+
+
+def process_pdf_download(task_id, link, output_dir):
+    """Download a PDF once and hand its text extraction to the process pool."""
+    domain = link.split("/")[2]
+    pdf_file, article_file = pdf_paths(output_dir, task_id)
+
+    tic = time.perf_counter()
+    try:
+        with metrics.span("fetch"):
+            size = download_pdf(link, pdf_file)
+        if budget is not None:
+            budget.charge(size)
+    except Exception:
+        metrics.observe_request("pdf", domain, "error", time.perf_counter() - tic, 0)
+        raise
+    metrics.observe_request("pdf", domain, 200, time.perf_counter() - tic, size)
+    submit_pdf_extraction(task_id, link, pdf_file, article_file)
+
+
+def submit_pdf_extraction(task_id, link, pdf_file, article_file):
+    """Extract a downloaded PDF's text in the process pool and save it as the task's JSON."""
+    def on_extracted(future):
+        try:
+            article = future.result()
+            if not article["maintext"]:
+                raise ValueError(f"No text in PDF for {task_id}: {link}")
+            save_article_json(article, article_file)
+            metrics.ITEMS.inc(stage="download_links", outcome="success")
+        except Exception as e:
+            metrics.observe_error("pdf_extract", e)
+            metrics.ITEMS.inc(stage="download_links", outcome="failed")
+            print(f"Failed to extract PDF text for {task_id}: {e}")
+
+    get_pdf_pool().submit(extract_pdf_text, pdf_file, link).add_done_callback(on_extracted)
+
+
+def task_done(output_dir, task_id):
+    """
+    Whether a task is finished: downloaded as HTML, extracted from a PDF, or rejected for good.
+    A PDF without its JSON is not done, so its extraction is submitted again (see _process_task).
+    """
+    return (os.path.exists(os.path.join(output_dir, "html", f"{task_id}.html.gz"))
+            or os.path.exists(os.path.join(output_dir, "json", f"{task_id}.json"))
+            or os.path.exists(os.path.join(output_dir, "rejected", str(task_id))))
 
 
 def scroll_to_bottom(driver, pause_time=1):
@@ -134,6 +312,10 @@ def scroll_to_bottom(driver, pause_time=1):
 
 def load_page(driver, link, pause_time=2):
     """Loads a page in Selenium and waits for it to be fully loaded."""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
     try:
         driver.get(link)
 
@@ -161,6 +343,8 @@ def load_page(driver, link, pause_time=2):
 
 def extract_body_content(driver):
     """Extracts the body content of the current page."""
+    from selenium.webdriver.common.by import By
+
     try:
         return driver.find_element(By.TAG_NAME, "body").get_attribute("outerHTML")
     except Exception as e:
@@ -175,21 +359,29 @@ def save_html_content(html_content, html_filename):
 
 
 def save_article_json(article, article_filename):
-    """Saves the article JSON content to a file."""
-    with open(article_filename, "w", encoding="utf-8") as f:
-        json.dump(article.get_serializable_dict(), f, indent=4)
+    """Saves the extracted article dict to a JSON file."""
+    serialization.dump(article, article_filename)
     print(f"Saved article: {article_filename}")
 
 
 def download_html_with_selenium(task_id, link, driver):
-    """Downloads the article using Selenium."""
+    """Downloads the article using Selenium, or in a context of a BrowserPool passed as the driver."""
+    key = ("selenium", link.split("/")[2])
+    tic = time.perf_counter()
+    timeout = latency.TRACKER.timeout(key, PAGE_LOAD_TIMEOUT)
     try:
-        load_page(driver, link)
-        html = driver.page_source
+        if isinstance(driver, BrowserPool):
+            html = driver.render(link, timeout)
+        else:
+            driver.set_page_load_timeout(timeout)
+            load_page(driver, link)
+            html = driver.page_source
         if not html:
             raise ValueError(f"Failed to fetch HTML with Selenium for {task_id}: {link}")
+        latency.TRACKER.observe(key, time.perf_counter() - tic)
         return html
     except Exception as e:
+        latency.TRACKER.observe_failure(key, time.perf_counter() - tic, timeout)
         print(f"Error downloading with Selenium: {e}")
         return None
 
@@ -214,6 +406,8 @@ def reset_driver(driver=None,
                  user_data_dir=None,
                  profile_directory=None):
     """Resets the Selenium driver."""
+    import undetected_chromedriver as uc
+
     quit_driver(driver)
 
     options = new_chrome_options(
@@ -234,77 +428,192 @@ def reset_driver(driver=None,
 
 def save_bad_sources():
     """Saves the bad sources to a JSON file."""
-    with open("bad_sources.json", "w", encoding="utf-8") as f:
-        json.dump(bad_sources, f, indent=4)
+    serialization.dump(bad_sources, "bad_sources.json", pretty=True, atomic=True)
     print("Saved bad sources to bad_sources.json")
 
+def get_extraction_engine():
+    """Returns the shared extraction engine, loading extraction_profile.json on first use."""
+    global extraction_engine
+    if extraction_engine is None:
+        extraction_engine = ExtractionEngine("extraction_profile.json")
+    return extraction_engine
+
+
 def load_bad_sources():
     """Loads the bad sources from a JSON file."""
     global bad_sources
     if os.path.exists("bad_sources.json"):
-        with open("bad_sources.json", "r", encoding="utf-8") as f:
-            bad_sources = json.load(f)
+        bad_sources = serialization.load("bad_sources.json")
     print("Loaded bad sources from bad_sources.json")
 
 
+def reject_page(task_id, link, output_dir, reason, action):
+    """
+    Skip a page the prefilter flagged. Rejections are marked in rejected/{id} with their reason,
+    so the page is not fetched again; render-class pages (walls, thin pages) stay retryable.
+    """
+    if action == prefilter.REJECT:
+        marker = os.path.join(output_dir, "rejected", str(task_id))
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        with open(marker, "w", encoding="utf-8") as f:
+            f.write(f"{reason}\t{link}\n")
+        metrics.ITEMS.inc(stage="download_links", outcome="rejected")
+        print(f"Prefilter rejected {task_id} ({reason}): {link}")
+    else:
+        metrics.ITEMS.inc(stage="download_links", outcome="deferred")
+        print(f"Prefilter deferred {task_id} ({reason}) to a later run with a browser: {link}")
+
+
 def process_task(task_id, link, driver, output_dir):
     """
     Processes a single task: downloads as PDF if link is a PDF, otherwise saves the HTML content.
     """
+    with profiling.tag(domain=link.split("/")[2]):
+        _process_task(task_id, link, driver, output_dir)
+
+
+def _process_task(task_id, link, driver, output_dir):
     domain = link.split("/")[2]
     newsplease_fails = bad_sources.get(domain, {}).get("newsplease", 0)
     selenium_fails = bad_sources.get(domain, {}).get("selenium", 0)
     if newsplease_fails > FAIL_THRESHOLD and selenium_fails > FAIL_THRESHOLD:
+        metrics.ITEMS.inc(stage="download_links", outcome="skipped")
         print(f"Skipping {task_id} due to repeated failures for {domain}.")
         return
+    if skip_syndicated and duplicate_index is not None and duplicate_index.syndicates(domain):
+        metrics.ITEMS.inc(stage="download_links", outcome="syndicated")
+        print(f"Skipping {task_id}: {domain} mostly syndicates wire copy.")
+        return
 
     html_file = os.path.join(output_dir, "html", f"{task_id}.html.gz")
     article_file = os.path.join(output_dir, "json", f"{task_id}.json")
     user_agent = random.choice(user_agents)
 
     try:
+        pdf_file, _ = pdf_paths(output_dir, task_id)
+        if os.path.exists(pdf_file):
+            # Downloaded by an earlier run whose text extraction failed or never finished
+            submit_pdf_extraction(task_id, link, pdf_file, article_file)
+            return
+        if is_pdf_link(link):
+            process_pdf_download(task_id, link, output_dir)
+            return
+
         html = None
+        prefiltered = False  # Whether html already passed the prefilter
 
         if newsplease_fails <= FAIL_THRESHOLD:
-            # Try to use newsplease to download the article
-            html = SimpleCrawler.fetch_url(link, timeout=10, user_agent=user_agent)
-            if not html:
+            # HTTP tier (keyed "newsplease" in bad_sources and the latency profile): one streamed
+            # request whose first bytes decide between a page and a PDF behind an extensionless URL
+            tic = time.perf_counter()
+            with metrics.span("fetch"):
+                fetched = latency.hedged_call(
+                    ("newsplease", domain),
+                    lambda timeout: fetch_page(link, timeout, user_agent, pdf_file),
+                    HTTP_TIMEOUT)
+            kind, payload = fetched or (None, None)
+            size = payload if kind == "pdf" else len(payload or "")
+            metrics.observe_request("newsplease", domain, 200 if fetched else "error",
+                                    time.perf_counter() - tic, size)
+            if budget is not None and fetched:
+                budget.charge(size)
+            if kind == "pdf":
+                submit_pdf_extraction(task_id, link, pdf_file, article_file)
+                return
+            html = payload
+            if html and use_prefilter:
+                with metrics.span("prefilter"):
+                    flagged = prefilter.check(html, prefilter_languages)
+                if flagged:
+                    reason, action = flagged
+                    prefilter.LOG.record(domain, reason, action)
+                    if action == prefilter.RENDER and driver is not None and selenium_fails <= FAIL_THRESHOLD:
+                        # Walls and script-built pages may render fine in a browser
+                        print(f"Prefilter ({reason}) routes {task_id} to the browser: {link}")
+                        html = None
+                    else:
+                        reject_page(task_id, link, output_dir, reason, action)
+                        return
+                prefiltered = html is not None
+            elif not html:
                 # If newsplease fails, try to download using Selenium
                 print(f"Newsplease failed to fetch html for {task_id}: {link}")
                 if domain not in bad_sources:
                     bad_sources[domain] = {"newsplease": 0, "selenium": 0}
                 bad_sources[domain]["newsplease"] += 1
 
-        if not html and selenium_fails <= FAIL_THRESHOLD:
-            html = download_html_with_selenium(task_id, link, driver)
+        # Without a driver (HTTP-only callers such as the pipeline), Selenium is not attempted
+        if not html and driver is not None and selenium_fails <= FAIL_THRESHOLD:
+            tic = time.perf_counter()
+            with metrics.span("render"):
+                html = download_html_with_selenium(task_id, link, driver)
+            metrics.observe_request("selenium", domain, 200 if html else "error",
+                                    time.perf_counter() - tic, len(html or ""))
+            if budget is not None and html:
+                budget.charge(len(html))
             if not html:
                 if domain not in bad_sources:
                     bad_sources[domain] = {"newsplease": 0, "selenium": 0}
                 bad_sources[domain]["selenium"] += 1
-                raise ValueError(f"Failed to fetch html for {task_id}: {link}")
+
+        if not html:
+            raise ValueError(f"Failed to fetch html for {task_id}: {link}")
+
+        if use_prefilter and not prefiltered:
+            with metrics.span("prefilter"):
+                flagged = prefilter.check(html, prefilter_languages)
+            if flagged:
+                reason, action = flagged
+                prefilter.LOG.record(domain, reason, action)
+                reject_page(task_id, link, output_dir, reason, action)
+                return
 
         # Save html content
-        save_html_content(html, html_file)
+        with metrics.span("persist"):
+            save_html_content(html, html_file)
 
         # Parse the article
-        article = NewsPlease.from_html(html, url=link)
-        if not (article and article.maintext):
+        with metrics.span("parse"):
+            article = get_extraction_engine().extract(html, link)
+        if not (article and article.get("maintext")):
             raise ValueError(f"Failed to parse article for {task_id}: {link}")
 
+        # Duplicates keep a reference to their cluster's canonical copy instead of the maintext
+        if duplicate_index is not None:
+            with metrics.span("dedup"):
+                cluster_id, is_duplicate = duplicate_index.add(task_id, article["maintext"], domain)
+            article["cluster_id"] = cluster_id
+            if is_duplicate:
+                article["duplicate_of"] = cluster_id
+                article["maintext"] = None
+                metrics.ITEMS.inc(stage="dedup", outcome="duplicate")
+
         # Save article content
-        save_article_json(article, article_file)
+        with metrics.span("persist"):
+            save_article_json(article, article_file)
+        metrics.ITEMS.inc(stage="download_links", outcome="success")
 
     except Exception as e:
+        metrics.observe_error("download_links", e)
+        metrics.ITEMS.inc(stage="download_links", outcome="failed")
         print(f"Unexpected error processing task {task_id}: {e}")
 
 
+def is_slow_domain(domain):
+    """Whether a domain's pages are consistently slow to load, over HTTP or in the browser."""
+    return (latency.TRACKER.is_slow(("newsplease", domain))
+            or latency.TRACKER.is_slow(("selenium", domain)))
+
+
 class Worker(Thread):
     def __init__(self, task_queue, output_dir, stop_event,
                  driver_executable_path=None, browser_executable_path=None,
                  extension_path=None, user_data_dir=None,
-                 profile_directory=None):
+                 profile_directory=None, slow_queue=None, browser_pool=None):
         super().__init__()
         self.task_queue = task_queue
+        # Tasks of domains found to be slow are handed to the slow lane, if there is one
+        self.slow_queue = slow_queue
         self.output_dir = output_dir
         self.stop_event = stop_event
         self.driver_executable_path = driver_executable_path
@@ -312,15 +621,20 @@ class Worker(Thread):
         self.extension_path = extension_path
         self.user_data_dir = user_data_dir
         self.profile_directory = profile_directory
+        # With a shared browser pool, the thread renders in the pool's contexts instead of its own Chrome
+        self.browser_pool = browser_pool
         self.driver = None
 
     def run(self):
-        # Initialize a single driver for this thread with the new parameters
-        self.driver = reset_driver(driver_executable_path=self.driver_executable_path,
-                                   browser_executable_path=self.browser_executable_path,
-                                   extension_path=self.extension_path,
-                                   user_data_dir=self.user_data_dir,
-                                   profile_directory=self.profile_directory)
+        if self.browser_pool is not None:
+            self.driver = self.browser_pool
+        else:
+            # Initialize a single driver for this thread with the new parameters
+            self.driver = reset_driver(driver_executable_path=self.driver_executable_path,
+                                       browser_executable_path=self.browser_executable_path,
+                                       extension_path=self.extension_path,
+                                       user_data_dir=self.user_data_dir,
+                                       profile_directory=self.profile_directory)
         successful = 0
 
         while not self.stop_event.is_set():
@@ -330,10 +644,23 @@ class Worker(Thread):
             except Empty:
                 continue
 
-            process_task(task_id, link, self.driver, self.output_dir)
+            if self.slow_queue is not None and is_slow_domain(link.split("/")[2]):
+                self.slow_queue.put((task_id, link))
+                self.task_queue.task_done()
+                continue
+
+            # Claimed after the reroute, so a task moved to the slow lane is charged only there
+            if budget is not None and not budget.take():
+                # Out of budget: leave the task (and the rest of the queue) for a later run
+                self.task_queue.task_done()
+                break
+
+            metrics.QUEUE_DEPTH.set(self.task_queue.qsize(), queue="download_links")
+            with metrics.busy("download_links"), metrics.span("task"):
+                process_task(task_id, link, self.driver, self.output_dir)
             successful += 1
 
-            if successful % 64 == 0 and successful > 0:
+            if successful % 64 == 0 and successful > 0 and self.browser_pool is None:
                 # Reset the driver every 128 tasks
                 self.driver = reset_driver(self.driver,
                                            driver_executable_path=self.driver_executable_path,
@@ -345,14 +672,27 @@ class Worker(Thread):
             # Finished processing this task
             self.task_queue.task_done()
 
-        # Stop event set or no more tasks: close the driver
-        quit_driver(self.driver)
+        # Stop event set or no more tasks: close the driver (the pool is closed by its owner)
+        if self.browser_pool is None:
+            quit_driver(self.driver)
 
 
 def download_links_queue(input_file, output_dir, start=0, end=None, num_workers=4,
                          driver_executable_path=None, browser_executable_path=None,
-                         extension_path=None, user_data_dir=None, profile_directory=None):
-    """Download HTML content for a list of URLs using a queue of workers."""
+                         extension_path=None, user_data_dir=None, profile_directory=None,
+                         dedup=False, skip_syndicated_domains=False, slow_workers=1,
+                         sources_dir=None, crawl_budget=None,
+                         render_backend="selenium", browsers=1, contexts_per_browser=8,
+                         languages=("en",)):
+    """
+    Download HTML content for a list of URLs using a queue of workers. With sources_dir (the
+    news source files behind the CSV), the most valuable URLs are fetched first; with a
+    crawl_budget (priority.Budget), the run stops once the budget is used up. The "contexts"
+    render_backend renders in a shared BrowserPool of browsers * contexts_per_browser contexts
+    instead of one Chrome per worker. Pages not in one of the languages are rejected before
+    extraction (see prefilter.py); languages=None disables the prefilter.
+    """
+    global duplicate_index, skip_syndicated, budget, prefilter_languages, use_prefilter
     os.makedirs(output_dir, exist_ok=True)
     html_output_dir = os.path.join(output_dir, "html")
     os.makedirs(html_output_dir, exist_ok=True)
@@ -362,40 +702,72 @@ def download_links_queue(input_file, output_dir, start=0, end=None, num_workers=
     if user_data_dir:
         os.makedirs(user_data_dir, exist_ok=True)
     
+    use_prefilter = languages is not None
+    prefilter_languages = set(languages) if languages and "any" not in languages else None
     load_bad_sources()
-
-    # Patch upfront (to ensure undetected_chromedriver setup)
-    temp_driver = reset_driver(
-        driver_executable_path=driver_executable_path,
-        browser_executable_path=browser_executable_path,
-        extension_path=extension_path,
-        user_data_dir=user_data_dir,
-        profile_directory=profile_directory)
-    temp_driver.close()
+    latency.TRACKER.load(LATENCY_PROFILE)
+    prefilter.LOG.load(prefilter.REJECT_LOG)
+    if dedup:
+        duplicate_index = DuplicateIndex(os.path.join(output_dir, "dedup.idx"))
+        skip_syndicated = skip_syndicated_domains
+
+    browser_pool = None
+    if render_backend == "contexts":
+        if extension_path or user_data_dir or profile_directory:
+            print("[INFO] Extensions and Chrome profiles are ignored by the contexts backend.")
+        browser_pool = BrowserPool(browsers=browsers, contexts=contexts_per_browser, user_agents=user_agents,
+                                   executable_path=browser_executable_path)
+        browser_pool.start()
+        # Every context can render while other threads fetch over HTTP
+        num_workers = max(num_workers, browser_pool.capacity)
+    else:
+        # Patch upfront (to ensure undetected_chromedriver setup)
+        temp_driver = reset_driver(
+            driver_executable_path=driver_executable_path,
+            browser_executable_path=browser_executable_path,
+            extension_path=extension_path,
+            user_data_dir=user_data_dir,
+            profile_directory=profile_directory)
+        temp_driver.close()
 
     stop_event = Event()
     task_queue = Queue()
+    # Slow lane: consistently slow domains get their own workers, so they cannot hold up the rest
+    slow_queue = Queue()
+
+    with open(input_file, "r", encoding="utf-8", newline="") as f:
+        rows = [(int(row["index"]), row["url"]) for row in csv.DictReader(f)]
 
-    data = pd.read_csv(input_file)
+    if sources_dir:
+        from full_text_collection.priority import prioritize
+        rows = prioritize(rows, sources_dir)
+        print(f"Ordered {len(rows)} URLs by value using {sources_dir}")
+    budget = crawl_budget
 
-    # Break tasks into batches of 50
-    for row in data.itertuples(index=False):
-        if row.index < start:
+    for index, url in rows:
+        if index < start:
+            continue
+        if end and index >= end:
             continue
-        if end and row.index >= end:
-            break
 
-        domain = row.url.split("/")[2]
+        domain = url.split("/")[2]
         if domain in skip:  # Skip known bad sources
             continue
 
-        output_file = os.path.join(output_dir, "html", f"{row.index}.html.gz")
-        if os.path.exists(output_file):
+        if task_done(output_dir, index):
             continue
 
-        task_queue.put((row.index, row.url))
+        if slow_workers and is_slow_domain(domain):
+            slow_queue.put((index, url))
+        else:
+            task_queue.put((index, url))
 
-    print(f"Total tasks: {task_queue.qsize()}")
+    print(f"Total tasks: {task_queue.qsize()} (slow lane: {slow_queue.qsize()})")
+    metrics.QUEUE_DEPTH.set(task_queue.qsize(), queue="download_links")
+    metrics.QUEUE_DEPTH.set(slow_queue.qsize(), queue="download_links_slow")
+    metrics.WORKERS_TOTAL.set(num_workers, pool="download_links")
+    metrics.WORKERS_TOTAL.set(slow_workers, pool="download_links_slow")
+    latency.set_workers(num_workers + slow_workers)
 
     # Start workers with the new parameters
     workers = [Worker(task_queue, output_dir, stop_event,
@@ -403,29 +775,46 @@ def download_links_queue(input_file, output_dir, start=0, end=None, num_workers=
                       browser_executable_path=browser_executable_path,
                       extension_path=extension_path,
                       user_data_dir=user_data_dir,
-                      profile_directory=profile_directory)
+                      profile_directory=profile_directory,
+                      slow_queue=slow_queue if slow_workers else None,
+                      browser_pool=browser_pool)
                for _ in range(num_workers)]
+    workers += [Worker(slow_queue, output_dir, stop_event,
+                       driver_executable_path=driver_executable_path,
+                       browser_executable_path=browser_executable_path,
+                       extension_path=extension_path,
+                       user_data_dir=user_data_dir,
+                       profile_directory=profile_directory,
+                       browser_pool=browser_pool)
+                for _ in range(slow_workers)]
     for w in workers:
         w.start()
 
     try:
         # Poll the queue instead of q.join() for interrupt handling
-        while not task_queue.empty():
+        while not (task_queue.empty() and slow_queue.empty()):
+            if budget is not None and budget.exhausted():
+                print(f"Crawl budget exhausted ({budget}).")
+                break
             time.sleep(1)
     except KeyboardInterrupt:
         print("User interrupted. Stopping workers...")
         # Signal workers to stop
         stop_event.set()
 
-        # Clear any remaining tasks in the queue
-        while not task_queue.empty():
-            try:
-                task_queue.get_nowait()
-                task_queue.task_done()
-            except Empty:
-                break
+        # Clear any remaining tasks in the queues
+        for queue in (task_queue, slow_queue):
+            while not queue.empty():
+                try:
+                    queue.get_nowait()
+                    queue.task_done()
+                except Empty:
+                    break
 
     save_bad_sources()
+    latency.TRACKER.save(LATENCY_PROFILE)
+    prefilter.LOG.save(prefilter.REJECT_LOG)
+    get_extraction_engine().save()
 
     # Wait for all workers to finish
     print("Waiting for workers to finish...")
@@ -433,6 +822,13 @@ def download_links_queue(input_file, output_dir, start=0, end=None, num_workers=
     for w in workers:
         w.join()
 
+    if duplicate_index is not None:
+        duplicate_index.close()
+        duplicate_index = None
+
+    if browser_pool is not None:
+        browser_pool.close()
+    shutdown_pdf_pool()
     print("All workers have finished.")
 
 
@@ -449,8 +845,26 @@ if __name__ == "__main__":
     parser.add_argument("--user_data_dir", type=str, default=None, help="Path to the Chrome user data directory")
     parser.add_argument("--profile_directory", type=str, default=None, help="Path to the Chrome profile directory")
     parser.add_argument("--display_backend", type=str, default="xvfb", help="Display backend to use (e.g., x11, xvfb)")
+    parser.add_argument("--slow_workers", type=int, default=1, help="Worker threads reserved for consistently slow domains; 0 disables the slow lane (default: 1)")
+    parser.add_argument("--priority_sources", type=str, default=None, help="Directory of news source JSON files; fetch the most valuable URLs first")
+    parser.add_argument("--max_urls", type=int, default=None, help="Stop after this many URLs (default: no limit)")
+    parser.add_argument("--max_mb", type=float, default=None, help="Stop after downloading this many MiB (default: no limit)")
+    parser.add_argument("--max_minutes", type=float, default=None, help="Stop after this many minutes (default: no limit)")
+    parser.add_argument("--dedup", action="store_true", help="Store near-duplicate articles by reference to their cluster's canonical copy")
+    parser.add_argument("--skip_syndicated", action="store_true", help="With --dedup, skip domains known to mostly syndicate wire copy")
+    parser.add_argument("--render_backend", choices=["selenium", "contexts"], default="selenium", help="selenium: one undetected Chrome per worker; contexts: isolated contexts in a few shared browsers (default: selenium)")
+    parser.add_argument("--browsers", type=int, default=1, help="With --render_backend contexts, browser processes to launch (default: 1)")
+    parser.add_argument("--contexts", type=int, default=8, help="With --render_backend contexts, concurrent contexts per browser (default: 8)")
+    parser.add_argument("--languages", type=str, default="en", help="Comma-separated page languages to extract, or 'any'; other pages are rejected before extraction (default: en)")
+    parser.add_argument("--no_prefilter", action="store_true", help="Extract every fetched page, without the language, wall and thin-page checks")
+    parser.add_argument("--metrics_port", type=int, default=None, help="Expose Prometheus metrics on this local port (default: off)")
+    profiling.add_argument(parser)
     args = parser.parse_args()
 
+    metrics.start_metrics_server(args.metrics_port)
+    profiling.start(args.profile)
+    from full_text_collection.priority import Budget
+
     # If running on Linux, attempt to start a virtual display
     display = None
     if platform.system() == "Linux":
@@ -473,7 +887,19 @@ if __name__ == "__main__":
             browser_executable_path=args.browser_executable_path,
             extension_path=args.extension_path,
             user_data_dir=args.user_data_dir,
-            profile_directory=args.profile_directory
+            profile_directory=args.profile_directory,
+            dedup=args.dedup,
+            skip_syndicated_domains=args.skip_syndicated,
+            slow_workers=args.slow_workers,
+            sources_dir=args.priority_sources,
+            render_backend=args.render_backend,
+            browsers=args.browsers,
+            contexts_per_browser=args.contexts,
+            languages=None if args.no_prefilter else args.languages.split(","),
+            crawl_budget=Budget(
+                max_urls=args.max_urls,
+                max_bytes=int(args.max_mb * 2 ** 20) if args.max_mb is not None else None,
+                max_seconds=args.max_minutes * 60 if args.max_minutes is not None else None)
         )
     finally:
         if display:
@@ -0,0 +1,257 @@
+import os
+import time
+import threading
+
+from common import serialization
+
+# Per-domain extractor selection.
+#
+# NewsPlease chains several extractors on every page. For each domain we instead try the
+# candidate extractors on the first few pages, record which one gives the best maintext and
+# how fast, and from then on run only the fastest one that works. A cheap "css" extractor is
+# learned per domain from successful parses: the XPath of the element that holds the article
+# body. It is only scored with an XPath learned from an earlier page, so it is preferred
+# only if that XPath carries over between pages. When the preferred extractor's output
+# degrades, we fall back to the full NewsPlease chain and, after repeated degradation,
+# forget its stats and explore again.
+
+EXPLORE_SAMPLES = 3  # Pages per domain on which all candidates are compared (css from the second page on)
+DEGRADE_RATIO = 0.5  # Maintext shorter than this fraction of the domain's average counts as degraded
+DEGRADE_LIMIT = 3  # Degraded results in a row before the domain is explored again
+MIN_PARAGRAPH = 40  # Characters for a maintext line to be used when learning the body element
+
+# Bump when the extraction logic changes, so re-extraction (reextract.py) redoes cached pages
+EXTRACTION_VERSION = 1
+VERSIONED_PACKAGES = ("news-please", "newspaper4k", "lxml")
+
+
+def _html_tree(html):
+    import lxml.html
+
+    return lxml.html.fromstring(html)
+
+
+def _meta(tree, *names):
+    for name in names:
+        values = tree.xpath(f'//meta[@property="{name}" or @name="{name}"]/@content')
+        if values:
+            return values[0].strip()
+    return None
+
+
+def _element_text(element):
+    paragraphs = [p.text_content().strip() for p in element.xpath(".//p")]
+    paragraphs = [p for p in paragraphs if p]
+    if paragraphs:
+        return "\n".join(paragraphs)
+    return element.text_content().strip()
+
+
+def _xpath_for(element):
+    """An XPath that identifies an element by tag and id, or by tag and classes."""
+    if element.get("id"):
+        return f'//{element.tag}[@id="{element.get("id")}"]'
+    classes = (element.get("class") or "").split()
+    if classes:
+        conditions = " and ".join(f'contains(concat(" ", normalize-space(@class), " "), " {c} ")' for c in classes)
+        return f"//{element.tag}[{conditions}]"
+    return None
+
+
+def learn_body_xpath(html, maintext):
+    """
+    Find the smallest element whose text contains (nearly) all substantial maintext lines,
+    and return an XPath for it, or None if no such element can be addressed.
+    """
+    lines = [line.strip()[:MIN_PARAGRAPH] for line in maintext.split("\n") if len(line.strip()) >= MIN_PARAGRAPH]
+    if not lines:
+        return None
+    tree = _html_tree(html)
+    best, best_len = None, None
+    for element in tree.iter("article", "main", "section", "div"):
+        text = element.text_content()
+        found = sum(1 for line in lines if line in text)
+        if found < 0.9 * len(lines):
+            continue
+        xpath = _xpath_for(element)
+        if xpath and (best_len is None or len(text) < best_len):
+            best, best_len = xpath, len(text)
+    return best
+
+
+def extract_newsplease(html, url, profile):
+    from newsplease import NewsPlease
+
+    article = NewsPlease.from_html(html, url=url)
+    return article.get_serializable_dict() if article else None
+
+
+def extract_newspaper(html, url, profile):
+    from newspaper import Article
+
+    article = Article(url)
+    article.download(input_html=html)
+    article.parse()
+    return {
+        "url": url,
+        "source_domain": url.split("/")[2],
+        "title": article.title or None,
+        "authors": list(article.authors),
+        "date_publish": article.publish_date.strftime("%Y-%m-%d %H:%M:%S") if article.publish_date else None,
+        "image_url": article.top_image or None,
+        "language": article.meta_lang or None,
+        "maintext": article.text or None,
+    }
+
+
+def extract_css(html, url, profile):
+    xpath = profile.get("body_xpath")
+    if not xpath:
+        return None
+    tree = _html_tree(html)
+    elements = tree.xpath(xpath)
+    if not elements:
+        return None
+    title = _meta(tree, "og:title") or (tree.findtext(".//title") or "").strip() or None
+    author = _meta(tree, "author", "article:author")
+    return {
+        "url": url,
+        "source_domain": url.split("/")[2],
+        "title": title,
+        "authors": [author] if author else [],
+        "date_publish": _meta(tree, "article:published_time", "pubdate", "date"),
+        "image_url": _meta(tree, "og:image"),
+        "language": tree.get("lang"),
+        "maintext": _element_text(elements[0]) or None,
+    }
+
+
+def extractor_version():
+    """Version tag of the extraction logic and the packages it runs on."""
+    from importlib.metadata import PackageNotFoundError, version
+
+    parts = [f"gn{EXTRACTION_VERSION}"]
+    for package in VERSIONED_PACKAGES:
+        try:
+            parts.append(f"{package}={version(package)}")
+        except PackageNotFoundError:
+            parts.append(f"{package}=-")
+    return ";".join(parts)
+
+
+EXTRACTORS = {
+    "newsplease": extract_newsplease,
+    "newspaper": extract_newspaper,
+    "css": extract_css,
+}
+
+
+class ExtractionEngine:
+    """Chooses and runs an extractor per domain, backed by a persistent JSON profile."""
+
+    def __init__(self, profile_path="extraction_profile.json"):
+        self.profile_path = profile_path
+        self.lock = threading.Lock()
+        self.profiles = serialization.load(profile_path) if os.path.exists(profile_path) else {}
+
+    def save(self):
+        with self.lock:
+            serialization.dump(self.profiles, self.profile_path, atomic=True)
+
+    def _profile(self, domain):
+        with self.lock:
+            return self.profiles.setdefault(domain, {"preferred": None, "degraded": 0, "avg_len": 0, "explored": 0,
+                                                     "body_xpath": None, "extractors": {}})
+
+    def _run(self, name, html, url, profile):
+        """Run one extractor and record its outcome, latency and maintext length."""
+        tic = time.perf_counter()
+        try:
+            result = EXTRACTORS[name](html, url, profile)
+        except Exception:
+            result = None
+        elapsed_ms = (time.perf_counter() - tic) * 1000
+        length = len((result or {}).get("maintext") or "")
+        with self.lock:
+            stats = profile["extractors"].setdefault(name, {"ok": 0, "fail": 0, "ms": 0.0, "len": 0.0})
+            if length:
+                stats["ok"] += 1
+                # Running means over successful runs
+                stats["ms"] += (elapsed_ms - stats["ms"]) / stats["ok"]
+                stats["len"] += (length - stats["len"]) / stats["ok"]
+            else:
+                stats["fail"] += 1
+        return result if length else None
+
+    def _learn(self, html, result, profile):
+        try:
+            xpath = learn_body_xpath(html, result["maintext"])
+        except Exception:
+            xpath = None
+        if xpath:
+            with self.lock:
+                profile["body_xpath"] = xpath
+
+    def _choose(self, profile):
+        """Pick the fastest extractor whose success rate and maintext length are close to the best."""
+        candidates = {name: s for name, s in profile["extractors"].items()
+                      if s["ok"] >= EXPLORE_SAMPLES and s["ok"] / (s["ok"] + s["fail"]) >= 0.9}
+        if not candidates:
+            return None
+        best_len = max(s["len"] for s in candidates.values())
+        good = {name: s for name, s in candidates.items() if s["len"] >= 0.8 * best_len}
+        return min(good, key=lambda name: good[name]["ms"])
+
+    def extract(self, html, url):
+        """
+        Extract an article from HTML. Returns a serializable dict with at least "maintext",
+        "title" and "url", or None if no extractor found any maintext.
+        """
+        domain = url.split("/")[2]
+        profile = self._profile(domain)
+        preferred = profile["preferred"]
+
+        if preferred:
+            result = self._run(preferred, html, url, profile)
+            length = len((result or {}).get("maintext") or "")
+            if length and length >= DEGRADE_RATIO * profile["avg_len"]:
+                with self.lock:
+                    profile["degraded"] = 0
+                    profile["avg_len"] += (length - profile["avg_len"]) * 0.1
+                return result
+            with self.lock:
+                profile["degraded"] += 1
+                if profile["degraded"] >= DEGRADE_LIMIT:
+                    # Start its stats over, so exploring does not pick it again from old counts
+                    profile["preferred"] = None
+                    profile["degraded"] = 0
+                    profile["explored"] = 0
+                    profile["extractors"].pop(preferred, None)
+            if preferred == "newsplease":
+                return result
+            result = self._run("newsplease", html, url, profile)
+            if result:
+                self._learn(html, result, profile)
+            return result
+
+        # Explore: the full NewsPlease chain is the reference, then every cheaper candidate.
+        # css runs with the XPath of earlier pages, and learns from this one afterwards.
+        result = self._run("newsplease", html, url, profile)
+        reference = result
+        for name in EXTRACTORS:
+            if name == "newsplease" or (name == "css" and not profile["body_xpath"]):
+                continue
+            candidate = self._run(name, html, url, profile)
+            if result is None:
+                result = candidate
+        if reference:
+            self._learn(html, reference, profile)
+        if result:
+            with self.lock:
+                stats = [s["len"] for s in profile["extractors"].values() if s["ok"]]
+                profile["avg_len"] = max(stats) if stats else 0
+                profile["explored"] = profile.get("explored", 0) + 1
+                # One page more than the samples, since css is first scored on the second page
+                if profile["explored"] > EXPLORE_SAMPLES:
+                    profile["preferred"] = self._choose(profile)
+        return result
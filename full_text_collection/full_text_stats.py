@@ -1,7 +1,8 @@
-import json
 import os
 import argparse
-from tqdm import tqdm
+
+from common import records
+from common.idset import FingerprintSet
 
 def main(args):
     # some topics don't contain stories
@@ -11,41 +12,26 @@ def main(args):
             all_topic.append(topic)
     print(f'The number of collected topics: {len(all_topic)}')
 
-    # the number of stories
-    all_story = []
-    for topic in os.listdir(f'{args.tag}_news'):
-        for story in os.listdir(f'{args.tag}_news/{topic}'):  # get rid of the 0-logs.json file
-            if story == '0-logs.json':
-                continue
-            all_story.append(f'{args.tag}_news/{topic}/{story}')
-    print(f'The number of collected stories: {len(all_story)}')
+    # one story file in memory at a time; articles are kept as compact columns (0-logs.json is skipped)
+    table = records.load_full_texts(f'{args.tag}_news')
+    print(f'The number of collected stories: {table.num_stories}')
 
     # the number of articles
-    all_article = []
-    for story in tqdm(all_story):
-        with open(story, 'r', encoding='utf-8') as f:
-            article = json.load(f)
-            all_article += article
-    print(f'The number of collected articles: {len(all_article)}')
-
-    # the number of unique articles
-    urls = [_['url'] for _ in all_article]
-    print(f'The number of unique urls: {len(list(set(urls)))}')
-
-    # the number of words
-    counted_url = []
+    print(f'The number of collected articles: {len(table)}')
+
+    # the number of unique articles, by URL fingerprint
+    print(f'The number of unique urls: {len(FingerprintSet(table.url_hash))}')
+
+    # the number of words in the first copy of each url
+    counted_url = FingerprintSet()
     word_cnt = 0
-    url_cnt = 0
-    for article in tqdm(all_article):
-        if article['url'] in counted_url:
+    for url_hash, words in zip(table.url_hash, table.words):
+        if url_hash in counted_url:
             continue
-        else:
-            url_cnt += 1
-            counted_url.append(article['url'])
-            if article['maintext'] is None:
-                continue
-            word_cnt += len(article['maintext'].replace('\n', ' ').split(' '))
+        counted_url.add(url_hash)
+        word_cnt += words
     print(f'The number of words in the unique articles is {word_cnt}')
+    print(f'Memory held by the article table: {table.nbytes() / 2 ** 20:.1f} MiB')
 
 
 if __name__ == '__main__':
@@ -2,10 +2,47 @@ import time
 import pathlib
 import json
 import argparse
-from newsplease import NewsPlease
+from datetime import datetime
+
+from common import latency, metrics, profiling, serialization
+from full_text_collection.extraction import ExtractionEngine
+from story_collection.qualification import DEFAULT_SPEC, StoryFilter
+
+extraction_engine = None
+story_filter = None
+simple_crawler = None  # newsplease's SimpleCrawler, imported in main() to keep the module light
+
+# Fetch timeout until a domain has enough samples for an adaptive one (see common/latency.py)
+HTTP_TIMEOUT = 6
+
+
+def format_date(value):
+    """Format a publish date from any extractor as mm/dd/YYYY, or None."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).strftime('%m/%d/%Y')
+    except ValueError:
+        return None
 
 
 def main(args):
+    global extraction_engine, story_filter, simple_crawler
+    from newsplease import SimpleCrawler
+
+    simple_crawler = SimpleCrawler
+    story_filter = StoryFilter(args.qualify)
+    extraction_engine = ExtractionEngine(f'full_text_collection/{args.tag}_extraction_profile.json')
+    latency_profile = f'full_text_collection/{args.tag}_latency_profile.json'
+    latency.TRACKER.load(latency_profile)
+    try:
+        run(args)
+    finally:
+        extraction_engine.save()
+        latency.TRACKER.save(latency_profile)
+
+
+def run(args):
     if args.source != 'all':
         tic = time.time()
         get_news_for_topic(args.source)
@@ -25,46 +62,54 @@ def main(args):
                     'topic': topic,
                     'error_message': str(e)
                 })
-                with open(f'full_text_collection/{args.tag}_bad_topics.json', 'w', encoding='utf-8') as f:
-                    json.dump(bad_topics, f, indent=4, ensure_ascii=False)
+                serialization.dump(bad_topics, f'full_text_collection/{args.tag}_bad_topics.json', pretty=True)
 
 
 def get_news_for_topic(topic):
-    with open(f'story_collection/{args.tag}_interest/{topic}.json', 'r', encoding='utf-8') as f:
-        stories = json.load(f)
+    stories = serialization.load(f'story_collection/{args.tag}_interest/{topic}.json',
+                                 schema=serialization.StoryFile)
     # if the loading succeeded, make directory
     pathlib.Path(f'{args.tag}_news/{topic}').mkdir(parents=True, exist_ok=True)
     logs = {'Topic Progress': f'-1 / {len(stories)}'}
-    with open(f'{args.tag}_news/{topic}/0-logs.json', 'w', encoding='utf-8') as f:
-        json.dump(logs, f, indent=4, ensure_ascii=False)
+    serialization.dump(logs, f'{args.tag}_news/{topic}/0-logs.json')
 
     tic = time.time()
     for story_idx, (story, all_metadata) in enumerate(stories.items()):
         if story == 'stats':
             continue
+        # Skip stories that would be thrown away later, before fetching any of their articles
+        if not story_filter([metadata['bias'] for metadata in all_metadata]):
+            metrics.ITEMS.inc(stage='qualify', outcome='rejected')
+            continue
         story_log = []
         all_article = []
         for article_idx, metadata in enumerate(all_metadata):
             try:
                 # get article and process
-                article = NewsPlease.from_url(metadata['source_link'], timeout=6)
-                article.__setattr__('article_idx', metadata['index'])
-                article.__setattr__('bias', metadata['bias'])
-                article.__setattr__('factuality', metadata['factuality'])
-                article.__setattr__('name', metadata['name'])
-                if article.date_publish is not None:
-                    article.__setattr__('date_publish', article.date_publish.strftime('%m/%d/%Y'))
-                else:
-                    article.__setattr__('date_publish', None)
+                domain = metadata['source_link'].split('/')[2]
+                fetch_tic = time.perf_counter()
+                with metrics.busy('full_texts'), profiling.tag(domain=domain), metrics.span('fetch'):
+                    html = latency.hedged_call(
+                        ('newsplease', domain),
+                        lambda timeout: simple_crawler.fetch_url(metadata['source_link'], timeout=timeout),
+                        HTTP_TIMEOUT)
+                metrics.observe_request('newsplease', domain, 200 if html else 'error',
+                                        time.perf_counter() - fetch_tic, len(html or ''))
+                if not html:
+                    raise ValueError(f"Failed to fetch html: {metadata['source_link']}")
+                with profiling.tag(domain=domain), metrics.span('parse'):
+                    article = extraction_engine.extract(html, metadata['source_link'])
+                if not article:
+                    raise ValueError(f"Failed to parse article: {metadata['source_link']}")
 
                 # store the collected full text
                 all_article.append({
-                    key: article.__getattribute__(key) for key in [
-                        'article_idx',
-                        'bias',
-                        'factuality',
-                        'name',
-                        'date_publish',
+                    'article_idx': metadata.get('index', article_idx),
+                    'bias': metadata['bias'],
+                    'factuality': metadata.get('factuality'),
+                    'name': metadata.get('name'),
+                    'date_publish': format_date(article.get('date_publish')),
+                    **{key: article.get(key) for key in [
                         'image_url',
                         'language',
                         'url',
@@ -72,35 +117,36 @@ def get_news_for_topic(topic):
                         'title',
                         'authors',
                         'maintext'
-                    ]
+                    ]}
                 })
                 # store the data, update the logs
-                with open(f'{args.tag}_news/{topic}/{story}.json', 'w', encoding='utf-8') as f:
-                    json.dump(all_article, f, indent=4, ensure_ascii=False)
+                with metrics.span('persist'):
+                    serialization.dump(all_article, f'{args.tag}_news/{topic}/{story}.json')
+                metrics.ITEMS.inc(stage='full_texts', outcome='success')
 
                 # store the successful story_log
                 story_log.append({
-                    'article_idx': metadata['index'],
+                    'article_idx': metadata.get('index', article_idx),
                     'status': 'Successful',
                 })
                 logs[story] = story_log
                 toc = time.time()
                 logs['Topic Progress'] = f'{story_idx + 1} / {len(stories)}, time elapsed: {toc - tic: .2f}'
-                with open(f'{args.tag}_news/{topic}/0-logs.json', 'w', encoding='utf-8') as f:
-                    json.dump(logs, f, indent=4, ensure_ascii=False)
+                serialization.dump(logs, f'{args.tag}_news/{topic}/0-logs.json')
 
             except BaseException as e:
+                metrics.observe_error('full_texts', e)
+                metrics.ITEMS.inc(stage='full_texts', outcome='failed')
                 # store the failed story_log
                 story_log.append({
-                    'article_idx': metadata['index'],
+                    'article_idx': metadata.get('index', article_idx),
                     'status': 'Failed',
                     'error_message': str(e)
                 })
                 logs[story] = story_log
                 toc = time.time()
                 logs['Topic Progress'] = f'{story_idx + 1} / {len(stories)}, time elapsed: {toc - tic: .2f}'
-                with open(f'{args.tag}_news/{topic}/0-logs.json', 'w', encoding='utf-8') as f:
-                    json.dump(logs, f, indent=4, ensure_ascii=False)
+                serialization.dump(logs, f'{args.tag}_news/{topic}/0-logs.json')
 
 
 if __name__ == '__main__':
@@ -109,5 +155,12 @@ if __name__ == '__main__':
                         help='the source topic, being "all" means collecting all topics')
     parser.add_argument('--tag', type=str, default='latest',
                         help='the tag to use for data version labeling')
+    parser.add_argument('--qualify', type=str, default=DEFAULT_SPEC,
+                        help=f"only fetch stories whose articles meet these bias counts, or 'none' (default: {DEFAULT_SPEC})")
+    parser.add_argument('--metrics_port', type=int, default=None,
+                        help='expose Prometheus metrics on this local port (default: off)')
+    profiling.add_argument(parser)
     args = parser.parse_args()
+    metrics.start_metrics_server(args.metrics_port)
+    profiling.start(args.profile)
     main(args)
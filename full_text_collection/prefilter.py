@@ -0,0 +1,151 @@
+import os
+import re
+import threading
+from collections import Counter
+
+from common import metrics, serialization
+
+# Cheap checks on fetched HTML before the (expensive) article extraction.
+#
+# Only regular expressions over the raw HTML are used, no parsing. A page is flagged when:
+#
+#   language   its declared language (<html lang>, content-language, og:locale) or, if none
+#              is declared, a stopword-based guess on a text sample is not an accepted one
+#   not_html   the body is JSON, XML or a feed rather than a page
+#   not_article  og:type marks it as a video, profile, product, ...
+#   challenge  a short page carrying a bot check or "enable JavaScript" signature
+#   consent    a short page carrying a cookie/consent wall signature
+#   paywall    a short page carrying a subscription wall signature
+#   thin       too little visible text, or visible text drowned in markup (index pages)
+#
+# Signatures only count on short pages, since full articles often carry consent banners and
+# subscribe prompts around their text. challenge, consent and thin pages fetched over HTTP
+# can be worth rendering in a browser (RENDER); everything else is rejected outright.
+# Reasons are counted per domain in prefilter_rejects.json.
+
+MIN_TEXT = 500  # Visible characters below which a page is thin
+STUB_TEXT = 1500  # Visible characters below which wall signatures count
+MIN_DENSITY = 0.02  # Visible text per character of markup (scripts and styles excluded)
+SAMPLE_WORDS = 300
+MIN_SAMPLE_WORDS = 50
+MIN_STOPWORD_RATIO = 0.08
+
+REJECT, RENDER = "reject", "render"
+RENDERABLE = {"challenge", "consent", "thin"}
+
+STOPWORDS = {
+    "en": set("the of and to in is that for on with as was by at it from are be this have has said".split()),
+    "es": set("el la de que y en los del las por un una para con se es al lo como".split()),
+    "fr": set("le la les de des et en du un une que est pour dans qui sur au par pas".split()),
+    "de": set("der die das und in den von zu mit ist des sich im dem nicht ein eine auf".split()),
+    "pt": set("o a os as de do da dos das e em um uma para com que por no na".split()),
+    "it": set("il la di che e in un una per del della con non sono le gli al da".split()),
+}
+
+SIGNATURES = {
+    "challenge": ["just a moment...", "cf-browser-verification", "challenge-platform", "please enable javascript",
+                  "enable javascript and cookies", "are you a robot", "verify you are human", "captcha",
+                  "access denied"],
+    "consent": ["before you continue to", "consent.yahoo.com", "we value your privacy", "cookie consent",
+                "manage your privacy settings", "accept all cookies"],
+    "paywall": ["subscribe to continue", "subscribe to read", "subscribers only", "for subscribers",
+                "to continue reading", "create a free account to continue", "you have reached your limit",
+                "free articles remaining"],
+}
+NON_ARTICLE_TYPES = ("video", "music", "profile", "product", "book")
+REJECT_LOG = "prefilter_rejects.json"
+
+_LANG = re.compile(r"<html[^>]*?\slang\s*=\s*[\"']?([A-Za-z]{2,3})", re.I)
+_CONTENT_LANGUAGE = re.compile(r"<meta[^>]+http-equiv\s*=\s*[\"']?content-language[\"']?[^>]*content\s*=\s*[\"']?([A-Za-z]{2,3})", re.I)
+_OG_LOCALE = re.compile(r"<meta[^>]+property\s*=\s*[\"']og:locale[\"'][^>]*content\s*=\s*[\"']?([A-Za-z]{2,3})", re.I)
+_OG_TYPE = re.compile(r"<meta[^>]+property\s*=\s*[\"']og:type[\"'][^>]*content\s*=\s*[\"']?([\w.]+)", re.I)
+_INVISIBLE = re.compile(r"<(script|style|noscript|template|svg)\b.*?</\1\s*>|<!--.*?-->", re.I | re.S)
+_TAG = re.compile(r"<[^>]+>")
+_SPACE = re.compile(r"\s+")
+_WORD = re.compile(r"[^\W\d_]+")
+
+
+def declared_language(html):
+    """The primary language subtag declared by the page, lowercased, or None."""
+    head = html[:20000]
+    for pattern in (_LANG, _CONTENT_LANGUAGE, _OG_LOCALE):
+        match = pattern.search(head)
+        if match:
+            return match.group(1).lower()
+    return None
+
+
+def visible_text(html):
+    """Visible text and the length of the markup it came from (scripts and styles excluded)."""
+    markup = _INVISIBLE.sub(" ", html)
+    return _SPACE.sub(" ", _TAG.sub(" ", markup)).strip(), len(markup)
+
+
+def guess_language(text):
+    """Stopword-based guess on a text sample: a language code, "other", or None if too short."""
+    words = _WORD.findall(text.lower())[:SAMPLE_WORDS]
+    if len(words) < MIN_SAMPLE_WORDS:
+        return None
+    hits = {lang: sum(1 for word in words if word in stopwords) for lang, stopwords in STOPWORDS.items()}
+    lang = max(hits, key=hits.get)
+    return lang if hits[lang] / len(words) >= MIN_STOPWORD_RATIO else "other"
+
+
+def check(html, languages=("en",)):
+    """
+    Return (reason, action) for a page that should not be extracted, or None for a page worth
+    extracting. languages are the accepted language codes; None accepts every language.
+    """
+    start = html.lstrip()[:200].lower()
+    if start.startswith(("{", "[", "<?xml")) or "<rss" in start or "<feed" in start:
+        return "not_html", REJECT
+
+    match = _OG_TYPE.search(html[:20000])
+    if match and match.group(1).lower().startswith(NON_ARTICLE_TYPES):
+        return "not_article", REJECT
+
+    text, markup_length = visible_text(html)
+    if len(text) < STUB_TEXT:
+        lowered = html.lower()
+        for reason, signatures in SIGNATURES.items():
+            if any(signature in lowered for signature in signatures):
+                return reason, RENDER if reason in RENDERABLE else REJECT
+    if len(text) < MIN_TEXT or len(text) < MIN_DENSITY * markup_length:
+        return "thin", RENDER
+
+    if languages:
+        lang = declared_language(html) or guess_language(text)
+        if lang is not None and lang not in languages:
+            return "language", REJECT
+    return None
+
+
+FLAGGED = metrics.Counter("gn_prefilter_rejects_total", "Pages flagged before extraction by reason and action",
+                          ["reason", "action"])
+
+
+class RejectLog:
+    """Prefilter reasons counted per domain, persisted to a JSON file."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}  # domain -> Counter of reasons
+
+    def record(self, domain, reason, action):
+        FLAGGED.inc(reason=reason, action=action)
+        with self.lock:
+            self.counts.setdefault(domain, Counter())[reason] += 1
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return
+        with self.lock:
+            self.counts = {domain: Counter(reasons) for domain, reasons in serialization.load(path).items()}
+
+    def save(self, path):
+        with self.lock:
+            data = {domain: dict(reasons) for domain, reasons in sorted(self.counts.items())}
+        serialization.dump(data, path, pretty=True, atomic=True)
+
+
+LOG = RejectLog()
@@ -0,0 +1,120 @@
+import glob
+import math
+import os
+import threading
+import time
+from collections import Counter
+
+from common import records
+from full_text_collection.create_url_mapping import url_key
+
+# Value-based ordering of the URL mapping, so a run that stops early has fetched the most
+# useful subset. Each URL is scored from the news source files it came from:
+#
+#   coverage  stories with more sources are worth more (log-scaled)
+#   balance   articles from the side a story is short on are worth more
+#   rarity    articles from outlets seen rarely in the corpus are worth more
+#   recency   newer articles are worth more (publish date if known, else CSV order)
+#
+# Budget caps a run by URLs, bytes downloaded or wall-clock time, whichever runs out first.
+
+WEIGHTS = {"coverage": 1.0, "balance": 1.0, "rarity": 0.5, "recency": 0.5}
+SIDES = {"Left": "left", "Lean Left": "left", "Center": "center", "Right": "right", "Lean Right": "right"}
+
+
+def url_features(sources_dir):
+    """Features of every URL in the news source files of a directory, keyed by url_key."""
+    # .json from download_news_sources.py, .jsonl from the pipeline and the service
+    files = sorted(glob.glob(os.path.join(sources_dir, "*.json")) + glob.glob(os.path.join(sources_dir, "*.jsonl")))
+    table = records.load_news_sources(files)
+    outlet_counts = Counter(table.outlet)
+    max_sources = max((len(table.story_rows(s)) for s in range(table.num_stories)), default=1)
+    dates = [d for d in table.date if d != records.UNKNOWN_DATE]
+    first_date, last_date = (min(dates), max(dates)) if dates else (0, 0)
+
+    features = {}
+    for s in range(table.num_stories):
+        rows = table.story_rows(s)
+        sides = Counter(SIDES.get(table.biases[table.bias[row]]) for row in rows)
+        for row in rows:
+            url = table.urls[row]
+            if not url:
+                continue
+            side = SIDES.get(table.biases[table.bias[row]])
+            date = table.date[row]
+            feature = {
+                "coverage": math.log1p(len(rows)) / math.log1p(max_sources),
+                # 1 when the article is its side's only one, lower the more the side dominates
+                "balance": 1 - (sides[side] - 1) / len(rows) if side else 0.0,
+                "rarity": 1 / math.log2(1 + outlet_counts[table.outlet[row]]),
+                "recency": ((date - first_date) / (last_date - first_date)
+                            if date != records.UNKNOWN_DATE and last_date > first_date else None),
+            }
+            key = url_key(url)
+            # A URL listed by several stories keeps its most valuable appearance
+            if key not in features or score(features[key]) < score(feature):
+                features[key] = feature
+    return features
+
+
+def score(feature):
+    return sum(WEIGHTS[name] * (feature[name] or 0.0) for name in WEIGHTS)
+
+
+def prioritize(tasks, sources_dir):
+    """
+    Order (index, url) tasks by value, highest first. URLs missing from the news source files
+    rank last; the CSV index stands in for recency where no publish date is known.
+    """
+    features = url_features(sources_dir)
+    if not tasks:
+        return []
+    last_index = max(index for index, _ in tasks) or 1
+
+    def value(task):
+        index, url = task
+        feature = features.get(url_key(url))
+        if feature is None:
+            return -1.0
+        if feature["recency"] is None:
+            feature = dict(feature, recency=index / last_index)
+        return score(feature)
+
+    return sorted(tasks, key=value, reverse=True)
+
+
+class Budget:
+    """A global crawl budget in URLs, bytes and seconds; None means unlimited. Thread-safe."""
+
+    def __init__(self, max_urls=None, max_bytes=None, max_seconds=None):
+        self.max_urls = max_urls
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.urls = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Claim one URL from the budget. Returns False once the budget is exhausted."""
+        with self.lock:
+            if self._exhausted():
+                return False
+            self.urls += 1
+            return True
+
+    def charge(self, nbytes):
+        with self.lock:
+            self.bytes += nbytes
+
+    def _exhausted(self):
+        return ((self.max_urls is not None and self.urls >= self.max_urls)
+                or (self.max_bytes is not None and self.bytes >= self.max_bytes)
+                or (self.max_seconds is not None and time.monotonic() - self.started >= self.max_seconds))
+
+    def exhausted(self):
+        with self.lock:
+            return self._exhausted()
+
+    def __str__(self):
+        return f"{self.urls} URLs, {self.bytes / 2 ** 20:.1f} MiB, {time.monotonic() - self.started:.0f}s"
@@ -0,0 +1,187 @@
+import os
+import csv
+import dbm
+import gzip
+import time
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from common import metrics, profiling, serialization
+from full_text_collection import prefilter
+from full_text_collection.extraction import ExtractionEngine, extractor_version
+
+# Offline re-extraction of archived pages: html/{id}.html.gz -> json/{id}.json, without any
+# network traffic. Run it after upgrading newsplease or changing extraction.py.
+#
+# The HTML is streamed through a process pool in batches, with a bounded number of batches
+# in flight. The extraction cache (extraction_cache.idx, next to html/) records for every
+# task the hash of its HTML, the extractor version (extraction.extractor_version) and the
+# outcome. A task is skipped when both are unchanged, so rerunning after an interruption or
+# on a grown corpus only extracts what is new. JSON files are written atomically. Pages the
+# prefilter rejects outright (language, not_html, not_article, paywall) get no JSON.
+# Near-duplicate fields (cluster_id, duplicate_of) of existing JSON files are kept.
+
+BATCH = 32  # Tasks per job sent to a worker
+IN_FLIGHT = 4  # Batches queued per worker
+
+_engine = None
+_languages = None
+_use_prefilter = True
+
+
+def read_urls(csv_file):
+    """CSV index -> URL of the URL mapping."""
+    with open(csv_file, "r", encoding="utf-8", newline="") as f:
+        return {int(row["index"]): row["url"] for row in csv.DictReader(f)}
+
+
+def _init_worker(profile_path, languages, use_prefilter):
+    global _engine, _languages, _use_prefilter
+    # The extractor profile is only read: each worker adapts its own copy, and none is saved
+    _engine = ExtractionEngine(profile_path)
+    _languages = languages
+    _use_prefilter = use_prefilter
+
+
+def _extract_batch(batch, version, force):
+    return [_extract_one(task, version, force) for task in batch]
+
+
+def _extract_one(task, version, force):
+    """Re-extract one page. Returns (task_id, cache value or None if unchanged, outcome)."""
+    task_id, url, html_file, article_file, cached = task
+    try:
+        with gzip.open(html_file, "rb") as f:
+            raw = f.read()
+        key = f"{version}|{hashlib.blake2b(raw, digest_size=16).hexdigest()}"
+        if not force and cached and cached.startswith(key + "|"):
+            outcome = cached.rsplit("|", 1)[1]
+            if outcome != "ok" or os.path.exists(article_file):
+                return task_id, None, "cached"
+        html = raw.decode("utf-8", errors="replace")
+
+        if _use_prefilter:
+            # Only outright rejections: walls and thin pages were archived after the browser
+            # tier, and extraction decides whether they hold an article
+            flagged = prefilter.check(html, _languages)
+            if flagged and flagged[1] == prefilter.REJECT:
+                return task_id, f"{key}|rejected", "rejected"
+
+        article = _engine.extract(html, url)
+        if not (article and article.get("maintext")):
+            return task_id, f"{key}|empty", "empty"
+        if os.path.exists(article_file):
+            previous = serialization.load(article_file)
+            if previous.get("duplicate_of") is not None:
+                article["maintext"] = None
+            for field in ("cluster_id", "duplicate_of"):
+                if field in previous:
+                    article[field] = previous[field]
+        serialization.dump(article, article_file, atomic=True)
+        return task_id, f"{key}|ok", "ok"
+    except Exception as e:
+        print(f"[ERROR] Re-extracting {task_id}: {e}")
+        return task_id, None, "failed"
+
+
+def tasks(output_dir, json_dir, urls, cache):
+    """Stream (task_id, url, html_file, article_file, cached) for every archived page with a known URL."""
+    html_dir = os.path.join(output_dir, "html")
+    with os.scandir(html_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".html.gz"):
+                continue
+            task_id = entry.name[:-len(".html.gz")]
+            url = urls.get(int(task_id)) if task_id.isdigit() else None
+            if url is None:
+                metrics.ITEMS.inc(stage="reextract", outcome="no_url")
+                continue
+            cached = cache.get(task_id)
+            yield (task_id, url, entry.path, os.path.join(json_dir, f"{task_id}.json"),
+                   cached.decode() if cached else None)
+
+
+def batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reextract(output_dir, csv_file, json_dir=None, num_workers=None, force=False,
+              profile_path="extraction_profile.json", languages=("en",)):
+    """
+    Re-extract every archived page under output_dir/html into json_dir (default output_dir/json).
+    languages=None disables the prefilter. Returns a dict of outcome counts.
+    """
+    json_dir = json_dir or os.path.join(output_dir, "json")
+    os.makedirs(json_dir, exist_ok=True)
+    num_workers = num_workers or os.cpu_count()
+    version = extractor_version()
+    use_prefilter = languages is not None
+    languages = set(languages) if languages and "any" not in languages else None
+    urls = read_urls(csv_file)
+    print(f"[INFO] Extractor version {version}; {len(urls)} URLs in {csv_file}")
+
+    counts = {}
+    cache = dbm.open(os.path.join(output_dir, "extraction_cache.idx"), "c")
+    tic = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker,
+                                 initargs=(profile_path, languages, use_prefilter)) as executor:
+            pending = set()
+            source = batches(tasks(output_dir, json_dir, urls, cache), BATCH)
+            exhausted = False
+            while pending or not exhausted:
+                # Keep a bounded number of batches queued, so the listing streams instead of piling up
+                while not exhausted and len(pending) < num_workers * IN_FLIGHT:
+                    batch = next(source, None)
+                    if batch is None:
+                        exhausted = True
+                        break
+                    pending.add(executor.submit(_extract_batch, batch, version, force))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for task_id, value, outcome in future.result():
+                        if value is not None:
+                            cache[task_id] = value
+                        counts[outcome] = counts.get(outcome, 0) + 1
+                        metrics.ITEMS.inc(stage="reextract", outcome=outcome)
+                processed = sum(counts.values())
+                if processed and processed % (BATCH * 100) < BATCH:
+                    print(f"[INFO] {processed} pages, {processed / (time.perf_counter() - tic):.0f}/s: {counts}")
+    finally:
+        cache.close()
+
+    elapsed = time.perf_counter() - tic
+    total = sum(counts.values())
+    print(f"[INFO] Re-extracted {total} pages in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f}/s): {counts}")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-extract articles from archived HTML without refetching")
+    parser.add_argument("-i", "--input_file", required=True, help="URL mapping CSV the pages were downloaded from")
+    parser.add_argument("-o", "--output_dir", required=True, help="download_links output directory (with html/)")
+    parser.add_argument("--json_dir", type=str, default=None, help="Where to write the JSON files (default: OUTPUT_DIR/json)")
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count(), help="Extraction processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="Ignore the extraction cache and redo every page")
+    parser.add_argument("--profile_path", type=str, default="extraction_profile.json", help="Per-domain extractor profile to start from (default: extraction_profile.json)")
+    parser.add_argument("--languages", type=str, default="en", help="Comma-separated page languages to extract, or 'any' (default: en)")
+    parser.add_argument("--no_prefilter", action="store_true", help="Extract every page, without the prefilter checks")
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.start(args.profile)
+
+    reextract(args.output_dir, args.input_file, json_dir=args.json_dir, num_workers=args.num_workers,
+              force=args.force, profile_path=args.profile_path,
+              languages=None if args.no_prefilter else args.languages.split(","))
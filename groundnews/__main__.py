@@ -0,0 +1,54 @@
+import sys
+import runpy
+
+# Single entry point for all collectors:  python -m groundnews <command> [args...]
+#
+# Only the module behind the chosen command is imported, so light commands such as
+# `stats` or `url-map` never pay for pandas, newsplease or selenium.
+
+COMMANDS = {
+    "topics": ("topic_collection.get_topic_list", "Collect topics by BFS from a discover category"),
+    "compile-topics": ("topic_collection.compile_topic_list", "Merge per-category topic lists into one"),
+    "story-ids": ("api.get_story_ids", "Collect story IDs for each interest"),
+    "sources": ("api.download_news_sources", "Fetch news sources for collected story IDs"),
+    "url-map": ("full_text_collection.create_url_mapping", "Append new article URLs to the URL mapping CSV"),
+    "fetch": ("full_text_collection.download_links", "Download and parse articles from the URL mapping CSV"),
+    "reextract": ("full_text_collection.reextract", "Re-extract articles from archived HTML without refetching"),
+    "full-texts": ("full_text_collection.get_full_texts", "Collect full texts for story files"),
+    "pipeline": ("pipeline.orchestrator", "Run all stages from interests to full texts as one stream"),
+    "serve": ("pipeline.service", "Keep the collectors warm behind a local HTTP/JSON job API"),
+    "stats": ("story_collection.stats", "Print statistics of collected stories"),
+    "index": ("story_collection.story_index", "Build or query the inverted index over collected stories"),
+    "full-text-stats": ("full_text_collection.full_text_stats", "Print statistics of collected full texts"),
+    "bench": ("benchmark.run_benchmark", "Benchmark the collectors against a local mock server"),
+}
+
+
+def usage():
+    lines = ["usage: python -m groundnews <command> [args...]", "", "commands:"]
+    width = max(len(name) for name in COMMANDS)
+    for name, (_, help_text) in COMMANDS.items():
+        lines.append(f"  {name:<{width}}  {help_text}")
+    lines.append("")
+    lines.append("Run `python -m groundnews <command> --help` for the options of a command.")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f"groundnews: unknown command '{command}'\n\n{usage()}", file=sys.stderr)
+        return 2
+
+    module = COMMANDS[command][0]
+    sys.argv = [f"groundnews {command}", *rest]
+    runpy.run_module(module, run_name="__main__", alter_sys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+import os
+import csv
+import json
+import random
+import asyncio
+import argparse
+import httpx
+
+from api import get_story_ids, download_news_sources
+from full_text_collection import create_url_mapping, download_links, prefilter
+from common import aio, cassette, latency, metrics, profiling, serialization
+from common.idset import UuidSet
+from story_collection.qualification import DEFAULT_SPEC, StoryFilter, source_biases
+
+# Streams work from an interest list to full texts through bounded queues:
+#
+#   interests -> [story_ids] -> story IDs -> [sources] -> URLs -> [url_map] -> (index, URL) -> [fetch]
+#
+# Every stage runs concurrently with its own worker count, so the first article is fetched
+# as soon as its story is discovered. Each stage checkpoints to the same files the standalone
+# scripts use (story ID CSVs and progress.csv, the URL mapping CSV and its index, html/ and json/),
+# plus sources_done.txt for the story IDs whose sources have been fetched and URLs mapped.
+# A story is only marked done once its URLs are in the mapping, and mapped URLs that have
+# not been fetched are queued again on startup, so nothing held in a queue is lost on a kill.
+# Disk writes stay off the event loop: appends and checkpoints go through an AsyncWriter
+# (common/aio.py), and the URL mapping writes each story's rows, index and done mark in a thread.
+
+
+def append_done(path, story_ids):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(story_id + "\n" for story_id in story_ids))
+
+
+class Pipeline:
+    def __init__(self, args):
+        self.args = args
+        self.story_filter = StoryFilter(args.qualify)
+        self.output_dir = args.output_dir
+        self.story_queue = asyncio.Queue(maxsize=args.queue_size)
+        self.url_queue = asyncio.Queue(maxsize=args.queue_size)
+        self.fetch_queue = asyncio.Queue(maxsize=args.queue_size)
+        self.sources_dir = os.path.join(self.output_dir, "news_sources")
+        self.sources_done_path = os.path.join(self.output_dir, "sources_done.txt")
+        self.sources_done = UuidSet()
+        if os.path.exists(self.sources_done_path):
+            with open(self.sources_done_path, "r", encoding="utf-8") as f:
+                self.sources_done = UuidSet(line.strip() for line in f if line.strip())
+        # Story IDs already queued or done, so stories shared by several interests are fetched once
+        self.stories_seen = UuidSet(self.sources_done)
+        self.writer = None
+
+    async def emit_story_ids(self, interest_slug, story_ids):
+        for story_id in story_ids:
+            if story_id not in self.stories_seen:
+                self.stories_seen.add(story_id)
+                await self.story_queue.put((interest_slug, story_id))
+        metrics.QUEUE_DEPTH.set(self.story_queue.qsize(), queue="stories")
+
+    # --- Stage 1: story IDs per interest ---
+
+    async def story_ids_stage(self, client, resolved, progress):
+        semaphore = asyncio.Semaphore(self.args.story_workers)
+        interest_queue = asyncio.Queue()
+        for item in resolved:
+            interest_queue.put_nowait(item)
+
+        async def worker():
+            while not interest_queue.empty():
+                interest_slug, interest_id = interest_queue.get_nowait()
+                # Story IDs found by an earlier, interrupted run whose sources are still missing
+                filename = os.path.join(self.output_dir, "story_ids_by_interest", f"story_ids_{interest_slug}.csv")
+                known_ids = await asyncio.to_thread(get_story_ids.read_existing_story_csv, filename)
+                await self.emit_story_ids(interest_slug, sorted(known_ids))
+                if not progress.is_finished(interest_slug):
+                    await get_story_ids.process_event(interest_id, interest_slug, self.args.offset, self.args.n,
+                                                      client, semaphore, self.output_dir, progress,
+                                                      emit=self.emit_story_ids, writer=self.writer)
+
+        await asyncio.gather(*[worker() for _ in range(self.args.story_workers)])
+        print("[INFO] Story ID stage finished.")
+
+    # --- Stage 2: sources for each story ---
+
+    async def sources_stage(self, client):
+        async def worker():
+            while True:
+                item = await self.story_queue.get()
+                if item is None:
+                    break
+                interest_slug, story_id = item
+                with metrics.busy("sources"):
+                    data = await download_news_sources.fetch_news_source(client, story_id)
+                if data:
+                    # One JSON object per line, so the file can be appended to as stories arrive
+                    await self.writer.append(serialization.append_lines,
+                                             os.path.join(self.sources_dir, f"{interest_slug}.jsonl"),
+                                             [{story_id: data}])
+                    # Only qualifying stories go on to have their articles fetched. The story is
+                    # marked done by the URL mapping stage, once its URLs are in the CSV
+                    qualified = self.story_filter(source_biases(data))
+                    metrics.ITEMS.inc(stage="qualify", outcome="qualified" if qualified else "rejected")
+                    urls = [source["url"] for source in data.get("sources", []) if qualified and source.get("url")]
+                    await self.url_queue.put((story_id, urls))
+                metrics.QUEUE_DEPTH.set(self.url_queue.qsize(), queue="urls")
+                base, extra = download_news_sources.STORY_SLEEP
+                await asyncio.sleep((base + extra * random.random()) * self.args.sleep_scale)
+
+        await asyncio.gather(*[worker() for _ in range(self.args.source_workers)])
+        print("[INFO] Sources stage finished.")
+
+    # --- Stage 3: URL mapping (single writer, assigns the CSV index) ---
+
+    async def url_map_stage(self):
+        # Mapped URLs of an earlier run that were never fetched go first
+        for item in await asyncio.to_thread(self.unfetched_urls):
+            await self.fetch_queue.put(item)
+        metrics.QUEUE_DEPTH.set(self.fetch_queue.qsize(), queue="fetch")
+
+        mapping = await asyncio.to_thread(self.open_mapping)
+        try:
+            while True:
+                item = await self.url_queue.get()
+                if item is None:
+                    break
+                story_id, urls = item
+                new_rows = await asyncio.to_thread(self.map_story, mapping, urls)
+                # Queued appends, the story's sources line among them, are written before a submitted call
+                await self.writer.submit(append_done, self.sources_done_path, [story_id], key=self.sources_done_path)
+                self.sources_done.add(story_id)
+                for row in new_rows:
+                    await self.fetch_queue.put(row)
+                metrics.QUEUE_DEPTH.set(self.fetch_queue.qsize(), queue="fetch")
+        finally:
+            await asyncio.to_thread(self.close_mapping, mapping)
+        print("[INFO] URL mapping stage finished.")
+
+    def open_mapping(self):
+        """The URL mapping index, CSV file and writer, and the next free index."""
+        index = create_url_mapping.open_index(self.args.url_csv)
+        write_header = not os.path.exists(self.args.url_csv) or os.path.getsize(self.args.url_csv) == 0
+        f = open(self.args.url_csv, "a", encoding="utf-8", newline="")
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(["index", "url"])
+        return {"index": index, "file": f, "writer": writer,
+                "next_index": int(index.get(create_url_mapping.NEXT_INDEX_KEY, b"0"))}
+
+    def close_mapping(self, mapping):
+        mapping["file"].close()
+        mapping["index"].close()
+
+    def map_story(self, mapping, urls):
+        """Append a story's new URLs to the mapping. Returns the new (index, URL) rows."""
+        index = mapping["index"]
+        new_rows = {}
+        for url in urls:
+            key = create_url_mapping.url_key(url)
+            if key in index or key in new_rows:
+                continue
+            new_rows[key] = (mapping["next_index"], url)
+            mapping["next_index"] += 1
+        mapping["writer"].writerows(new_rows.values())
+        # Rows are flushed before they are indexed, and indexed before the story is done
+        mapping["file"].flush()
+        for key, (row_index, _) in new_rows.items():
+            index[key] = str(row_index)
+        index[create_url_mapping.NEXT_INDEX_KEY] = str(mapping["next_index"])
+        return list(new_rows.values())
+
+    def unfetched_urls(self):
+        """(index, URL) rows of the URL mapping CSV that have no download yet."""
+        if not os.path.exists(self.args.url_csv):
+            return []
+        with open(self.args.url_csv, "r", encoding="utf-8", newline="") as f:
+            return [(int(row["index"]), row["url"]) for row in csv.DictReader(f)
+                    if not download_links.task_done(self.args.fetch_dir, row["index"])]
+
+    # --- Stage 4: full-text fetch (HTTP tier of download_links, in threads) ---
+
+    async def fetch_stage(self):
+        fetch_dir = self.args.fetch_dir
+
+        async def worker():
+            while True:
+                item = await self.fetch_queue.get()
+                if item is None:
+                    break
+                task_id, url = item
+                if url.split("/")[2] in download_links.skip:
+                    continue
+                if download_links.task_done(fetch_dir, task_id):
+                    continue
+                with metrics.busy("fetch"):
+                    await asyncio.to_thread(download_links.process_task, task_id, url, None, fetch_dir)
+
+        await asyncio.gather(*[worker() for _ in range(self.args.fetch_workers)])
+        await asyncio.to_thread(download_links.shutdown_pdf_pool)
+        print("[INFO] Fetch stage finished.")
+
+    async def run(self, interests):
+        for d in ("story_ids_by_interest", "interests", "news_sources"):
+            os.makedirs(os.path.join(self.output_dir, d), exist_ok=True)
+        os.makedirs(os.path.join(self.args.fetch_dir, "html"), exist_ok=True)
+        os.makedirs(os.path.join(self.args.fetch_dir, "json"), exist_ok=True)
+        download_links.load_bad_sources()
+        latency.TRACKER.load(download_links.LATENCY_PROFILE)
+        latency.set_workers(self.args.fetch_workers)
+        prefilter.LOG.load(prefilter.REJECT_LOG)
+
+        progress = get_story_ids.ProgressTracker(os.path.join(self.output_dir, "progress.csv"), len(interests))
+        progress.load()
+        interest_cache_path = os.path.join(self.output_dir, "interest_cache.json")
+        interest_cache = get_story_ids.load_interest_cache(interest_cache_path)
+
+        monitor = aio.LoopMonitor(self.args.stall_ms / 1000).start()
+        self.writer = aio.AsyncWriter()
+        self.writer.start()
+        try:
+            async with httpx.AsyncClient(transport=cassette.async_transport()) as client:
+                # Finished interests are still resolved, so their unfetched story IDs are picked up
+                semaphore = asyncio.Semaphore(self.args.story_workers)
+                resolved = [item for item in await asyncio.gather(*[
+                    get_story_ids.resolve_interest(name, endpoint, client, semaphore, self.output_dir, interest_cache,
+                                                   self.args.metadata_max_age * 86400, self.writer)
+                    for name, endpoint in interests.items()
+                ]) if item is not None]
+                # Cache entries are replaced rather than mutated, so a shallow copy is a stable snapshot
+                await self.writer.snapshot(interest_cache_path, get_story_ids.save_interest_cache,
+                                           dict(interest_cache), interest_cache_path)
+
+                checkpoint_task = asyncio.create_task(get_story_ids.checkpoint_loop(progress, writer=self.writer))
+                sources_task = asyncio.create_task(self.sources_stage(client))
+                url_map_task = asyncio.create_task(self.url_map_stage())
+                fetch_task = asyncio.create_task(self.fetch_stage())
+                try:
+                    # Shut down downstream stages one after another, once their inputs are exhausted
+                    await self.story_ids_stage(client, resolved, progress)
+                    for _ in range(self.args.source_workers):
+                        await self.story_queue.put(None)
+                    await sources_task
+                    await self.url_queue.put(None)
+                    await url_map_task
+                    for _ in range(self.args.fetch_workers):
+                        await self.fetch_queue.put(None)
+                    await fetch_task
+                finally:
+                    checkpoint_task.cancel()
+        finally:
+            # Queued rows and marks are written before the final progress checkpoint
+            await self.writer.close()
+            monitor.stop()
+            progress.checkpoint()
+            download_links.save_bad_sources()
+            latency.TRACKER.save(download_links.LATENCY_PROFILE)
+            prefilter.LOG.save(prefilter.REJECT_LOG)
+            download_links.get_extraction_engine().save()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stream interests through story IDs, sources, URL mapping and full-text fetching concurrently."
+    )
+    parser.add_argument('-i', '--input-file', type=str, default='interests.json',
+                        help="Path to the JSON file containing interest names and endpoints (default: interests.json).")
+    parser.add_argument('-n', '--n', type=int, default=10,
+                        help="Total number of unique story IDs to collect per interest (default: 10).")
+    parser.add_argument('--offset', type=int, default=0, help="Initial offset for the API (default: 0).")
+    parser.add_argument('-o', '--output-dir', type=str, default='.',
+                        help="Directory for story IDs, metadata, sources and progress (default: current directory).")
+    parser.add_argument('--url-csv', type=str, default='urls.csv', help="URL mapping CSV to append to (default: urls.csv).")
+    parser.add_argument('--fetch-dir', type=str, default='download',
+                        help="Directory where HTML and JSON files will be saved (default: download).")
+    parser.add_argument('--qualify', type=str, default=DEFAULT_SPEC,
+                        help=f"Only fetch articles of stories whose sources meet these bias counts, or 'none' (default: {DEFAULT_SPEC}).")
+    parser.add_argument('--story-workers', type=int, default=5, help="Concurrent interests in the story ID stage (default: 5).")
+    parser.add_argument('--source-workers', type=int, default=5, help="Concurrent sources fetches (default: 5).")
+    parser.add_argument('--fetch-workers', type=int, default=8, help="Concurrent full-text fetches (default: 8).")
+    parser.add_argument('--queue-size', type=int, default=1000, help="Capacity of each queue between stages (default: 1000).")
+    parser.add_argument('--metadata-max-age', type=float, default=7,
+                        help="Days after which cached interest metadata is refetched (default: 7).")
+    parser.add_argument('--sleep-scale', type=float, default=1.0,
+                        help="Multiplier for the rate-limiting sleeps between requests (default: 1.0).")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Expose Prometheus metrics on this local port (default: off).")
+    profiling.add_argument(parser)
+    aio.add_argument(parser)
+    args = parser.parse_args()
+
+    get_story_ids.SLEEP_SCALE = args.sleep_scale
+    download_news_sources.SLEEP_SCALE = args.sleep_scale
+    metrics.start_metrics_server(args.metrics_port)
+    profiling.start(args.profile)
+
+    with open(args.input_file, "r", encoding="utf-8") as f:
+        interests = json.load(f)
+
+    try:
+        asyncio.run(Pipeline(args).run(interests))
+    except KeyboardInterrupt:
+        print("[INFO] Interrupted. Progress has been checkpointed; rerun to resume.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,517 @@
+import os
+import csv
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+import itertools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import httpx
+
+from api import get_story_ids, download_news_sources
+from full_text_collection import create_url_mapping, download_links, prefilter
+from common import aio, cassette, latency, metrics, profiling, serialization
+from story_collection.qualification import DEFAULT_SPEC, StoryFilter, source_biases
+
+# Long-running collector service. State that every CLI run rebuilds from disk stays warm
+# between jobs: the HTTP connection pool, the URL mapping index, bad_sources, latency and
+# extractor profiles, the interest cache and, with --render-backend contexts, a browser pool.
+#
+# Jobs are submitted over a local HTTP/JSON API:
+#
+#   POST /jobs                      {"kind": "interests", "interests": {name: endpoint}, "n": 10,
+#                                    "sources": true, "fetch": true}
+#                                   {"kind": "stories", "story_ids": [...], "interest": "slug", "fetch": true}
+#                                   {"kind": "urls", "urls": [...]}
+#   GET  /jobs                      status of every job
+#   GET  /jobs/<id>                 status of one job
+#   GET  /jobs/<id>/results?since=N results from position N on
+#   GET  /jobs/<id>/stream          results as JSON lines, until the job ends
+#   GET  /articles/<index>          an extracted article
+#   GET  /metrics                   Prometheus metrics
+#
+# A job runs as a task on the service's event loop; its stages share the service-wide
+# worker limits, so concurrent jobs cannot overload the API or the fetchers. Checkpoints
+# (progress, bad_sources, latency and prefilter logs, extractor profile) are written after
+# every job and on shutdown. A job fails as a whole only on an unexpected error, which
+# cancels its remaining tasks; malformed URLs are reported as failed results. Article results carry the article's index and path rather than
+# the article itself, so finished jobs stay small; concurrent jobs asking for the same URL
+# share one fetch.
+
+JOB_KINDS = ("interests", "stories", "urls")
+MAX_FINISHED_JOBS = 1000  # Finished jobs kept for polling; older ones are forgotten
+
+
+def valid_url(url):
+    parts = urlsplit(url) if isinstance(url, str) else None
+    return bool(parts and parts.scheme in ("http", "https") and parts.netloc)
+
+
+async def gather_all(aws):
+    """Await every awaitable; if one fails, cancel the others before raising."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        await cancel_all(tasks)
+        raise
+
+
+async def cancel_all(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class Job:
+    def __init__(self, job_id, kind, params):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.status = "queued"
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.results = []
+        self.changed = threading.Condition()  # Notified on every result and status change
+
+    def add_result(self, result):
+        with self.changed:
+            self.results.append(result)
+            self.changed.notify_all()
+
+    def set_status(self, status, error=None):
+        with self.changed:
+            self.status = status
+            self.error = error
+            if status == "running":
+                self.started = time.time()
+            elif status in ("done", "failed"):
+                self.finished = time.time()
+            self.changed.notify_all()
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    def summary(self):
+        with self.changed:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "error": self.error,
+                "results": len(self.results),
+                "created": self.created,
+                "started": self.started,
+                "finished": self.finished,
+            }
+
+    def results_since(self, since, wait=None):
+        """Results from position since on, waiting up to wait seconds for new ones."""
+        with self.changed:
+            if wait and len(self.results) <= since and not self.done:
+                self.changed.wait(wait)
+            return self.results[since:]
+
+
+class Service:
+    def __init__(self, args):
+        self.args = args
+        self.output_dir = args.output_dir
+        self.fetch_dir = args.fetch_dir
+        self.sources_dir = os.path.join(self.output_dir, "news_sources")
+        self.story_filter = StoryFilter(args.qualify)
+        self.jobs = {}
+        self.job_ids = itertools.count(1)
+        self.jobs_lock = threading.Lock()
+        self.loop = None
+        self.client = None
+        self.browser_pool = None
+        self.fetches = {}  # URL index -> in-flight fetch task, shared by concurrent callers
+
+    # --- Warm state ---
+
+    async def start(self):
+        for d in ("story_ids_by_interest", "interests", "news_sources"):
+            os.makedirs(os.path.join(self.output_dir, d), exist_ok=True)
+        os.makedirs(os.path.join(self.fetch_dir, "html"), exist_ok=True)
+        os.makedirs(os.path.join(self.fetch_dir, "json"), exist_ok=True)
+        self.loop = asyncio.get_running_loop()
+        self.client = httpx.AsyncClient(transport=cassette.async_transport())
+        # Appends, metadata and checkpoints are written off the loop
+        self.writer = aio.AsyncWriter()
+        self.writer.start()
+
+        download_links.load_bad_sources()
+        latency.TRACKER.load(download_links.LATENCY_PROFILE)
+        latency.set_workers(self.args.fetch_workers)
+        prefilter.LOG.load(prefilter.REJECT_LOG)
+        download_links.get_extraction_engine()
+        self.progress = get_story_ids.ProgressTracker(os.path.join(self.output_dir, "progress.csv"))
+        self.progress.load()
+        self.checkpoint_task = asyncio.create_task(get_story_ids.checkpoint_loop(self.progress, writer=self.writer))
+        self.interest_cache_path = os.path.join(self.output_dir, "interest_cache.json")
+        self.interest_cache = get_story_ids.load_interest_cache(self.interest_cache_path)
+
+        # The URL mapping stays open; the lock keeps a single writer assigning CSV indices
+        self.url_index = create_url_mapping.open_index(self.args.url_csv)
+        self.next_index = int(self.url_index.get(create_url_mapping.NEXT_INDEX_KEY, b"0"))
+        write_header = not os.path.exists(self.args.url_csv) or os.path.getsize(self.args.url_csv) == 0
+        self.url_file = open(self.args.url_csv, "a", encoding="utf-8", newline="")
+        self.url_writer = csv.writer(self.url_file)
+        if write_header:
+            self.url_writer.writerow(["index", "url"])
+        self.url_lock = asyncio.Lock()
+        self.monitor = aio.LoopMonitor(self.args.stall_ms / 1000).start()
+
+        self.story_semaphore = asyncio.Semaphore(self.args.story_workers)
+        self.source_semaphore = asyncio.Semaphore(self.args.source_workers)
+        self.fetch_semaphore = asyncio.Semaphore(self.args.fetch_workers)
+
+        if self.args.render_backend == "contexts":
+            from full_text_collection.browser_pool import BrowserPool
+
+            self.browser_pool = BrowserPool(browsers=self.args.browsers, contexts=self.args.contexts,
+                                            user_agents=download_links.user_agents)
+            await asyncio.to_thread(self.browser_pool.start)
+
+    async def checkpoint(self):
+        # Progress and the interest cache change on the loop: snapshots are taken there and written off it.
+        # Cache entries are replaced rather than mutated, so a shallow copy is a stable snapshot
+        await self.writer.snapshot(self.progress.progress_csv_path, self.progress.write, self.progress.snapshot())
+        await self.writer.snapshot(self.interest_cache_path, get_story_ids.save_interest_cache,
+                                   dict(self.interest_cache), self.interest_cache_path)
+        await self.writer.flush()
+        await asyncio.to_thread(self.save_profiles)
+
+    def save_profiles(self):
+        download_links.save_bad_sources()
+        latency.TRACKER.save(download_links.LATENCY_PROFILE)
+        prefilter.LOG.save(prefilter.REJECT_LOG)
+        download_links.get_extraction_engine().save()
+
+    async def stop(self):
+        self.checkpoint_task.cancel()
+        await self.checkpoint()
+        await self.writer.close()
+        self.monitor.stop()
+        await self.client.aclose()
+        self.url_file.close()
+        self.url_index.close()
+        if self.browser_pool is not None:
+            await asyncio.to_thread(self.browser_pool.close)
+        await asyncio.to_thread(download_links.shutdown_pdf_pool)
+
+    # --- Jobs ---
+
+    def submit(self, request):
+        """Create a job from an API request and schedule it on the loop. Called from HTTP threads."""
+        kind = request.get("kind")
+        if kind not in JOB_KINDS:
+            raise ValueError(f"kind must be one of {', '.join(JOB_KINDS)}, got {kind!r}")
+        for field in ("urls", "story_ids"):
+            if not isinstance(request.get(field, []), list):
+                raise ValueError(f"{field} must be a list")
+        with self.jobs_lock:
+            job = Job(str(next(self.job_ids)), kind, request)
+            self.jobs[job.id] = job
+            finished = [j for j in self.jobs.values() if j.done]
+            for old in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self.jobs[old.id]
+        asyncio.run_coroutine_threadsafe(self.run_job(job), self.loop)
+        metrics.ITEMS.inc(stage="service", outcome=f"submitted_{kind}")
+        return job
+
+    def get_job(self, job_id):
+        with self.jobs_lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        with self.jobs_lock:
+            return [job.summary() for job in self.jobs.values()]
+
+    async def run_job(self, job):
+        job.set_status("running")
+        try:
+            params = job.params
+            if job.kind == "interests":
+                await self.interests_job(job, params)
+            elif job.kind == "stories":
+                await gather_all([
+                    self.story(job, params.get("interest", "service"), story_id, params.get("fetch", True))
+                    for story_id in params.get("story_ids", [])
+                ])
+            else:
+                await gather_all([self.url(job, url) for url in params.get("urls", [])])
+            job.set_status("done")
+            metrics.ITEMS.inc(stage="service", outcome="done")
+        except Exception as e:
+            metrics.observe_error("service", e)
+            print(f"[ERROR] Job {job.id} failed: {e}")
+            job.set_status("failed", str(e))
+        try:
+            await self.checkpoint()
+        except Exception as e:
+            print(f"[ERROR] Checkpoint after job {job.id} failed: {e}")
+
+    async def interests_job(self, job, params):
+        n = params.get("n", self.args.n)
+        offset = params.get("offset", 0)
+        follow = params.get("sources", False)
+        fetch = params.get("fetch", False)
+
+        async def one(name, endpoint):
+            resolved = await get_story_ids.resolve_interest(name, endpoint, self.client, self.story_semaphore,
+                                                            self.output_dir, self.interest_cache,
+                                                            self.args.metadata_max_age * 86400, self.writer)
+            if resolved is None:
+                job.add_result({"type": "interest", "interest": name, "ok": False})
+                return
+            slug, interest_id = resolved
+            stories = []
+
+            async def emit(interest_slug, story_ids):
+                for story_id in story_ids:
+                    job.add_result({"type": "story_id", "interest": interest_slug, "story_id": story_id})
+                    if follow:
+                        stories.append(asyncio.create_task(self.story(job, interest_slug, story_id, fetch)))
+
+            try:
+                await get_story_ids.process_event(interest_id, slug, offset, n, self.client, self.story_semaphore,
+                                                  self.output_dir, self.progress, emit=emit, writer=self.writer)
+            except BaseException:
+                await cancel_all(stories)
+                raise
+            await gather_all(stories)
+            job.add_result({"type": "interest", "interest": slug, "ok": True})
+
+        await gather_all([one(name, endpoint) for name, endpoint in params.get("interests", {}).items()])
+
+    async def story(self, job, interest_slug, story_id, fetch):
+        async with self.source_semaphore:
+            with metrics.busy("sources"):
+                data = await download_news_sources.fetch_news_source(self.client, story_id)
+            base, extra = download_news_sources.STORY_SLEEP
+            await asyncio.sleep((base + extra * random.random()) * self.args.sleep_scale)
+        if not data:
+            job.add_result({"type": "story", "story_id": story_id, "ok": False})
+            return
+        await self.writer.append(serialization.append_lines,
+                                 os.path.join(self.sources_dir, f"{interest_slug}.jsonl"), [{story_id: data}])
+        qualified = self.story_filter(source_biases(data))
+        urls = [source["url"] for source in data.get("sources", []) if source.get("url")]
+        job.add_result({"type": "story", "story_id": story_id, "ok": True, "qualified": qualified, "urls": len(urls)})
+        if fetch and qualified:
+            await gather_all([self.url(job, url) for url in urls])
+
+    async def map_url(self, url):
+        """The URL's index in the URL mapping, appending it if it is new."""
+        async with self.url_lock:
+            return await asyncio.to_thread(self._map_url, url)
+
+    def _map_url(self, url):
+        # Runs in a thread, one call at a time under url_lock
+        key = create_url_mapping.url_key(url)
+        if key in self.url_index:
+            return int(self.url_index[key])
+        index = self.next_index
+        self.url_writer.writerow([index, url])
+        self.url_file.flush()
+        self.url_index[key] = str(index)
+        self.next_index += 1
+        self.url_index[create_url_mapping.NEXT_INDEX_KEY] = str(self.next_index)
+        return index
+
+    def article_file(self, index):
+        return os.path.join(self.fetch_dir, "json", f"{index}.json")
+
+    async def url(self, job, url):
+        if not valid_url(url):
+            job.add_result({"type": "article", "index": None, "url": url, "ok": False, "error": "invalid URL"})
+            metrics.ITEMS.inc(stage="service", outcome="invalid_url")
+            return
+        index = await self.map_url(url)
+        if url.split("/")[2] not in download_links.skip and not download_links.task_done(self.fetch_dir, index):
+            fetch = self.fetches.get(index)
+            if fetch is None:
+                fetch = asyncio.create_task(self.fetch(index, url))
+                self.fetches[index] = fetch
+                fetch.add_done_callback(lambda _: self.fetches.pop(index, None))
+            else:
+                metrics.ITEMS.inc(stage="service", outcome="fetch_shared")
+            # Shielded, so one caller giving up does not cancel the fetch for the others
+            await asyncio.shield(fetch)
+        article_file = self.article_file(index)
+        ok = os.path.exists(article_file)
+        job.add_result({"type": "article", "index": index, "url": url, "ok": ok,
+                        "path": article_file if ok else None})
+
+    async def fetch(self, index, url):
+        async with self.fetch_semaphore:
+            with metrics.busy("fetch"):
+                await asyncio.to_thread(download_links.process_task, index, url, self.browser_pool, self.fetch_dir)
+
+
+# --- HTTP API ---
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data):
+        body = serialization.dumps(data)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/jobs":
+            self.send_json(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            job = self.service.submit(request)
+        except (ValueError, AttributeError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        self.send_json(202, job.summary())
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        if parts == ["metrics"]:
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if parts == ["jobs"]:
+            self.send_json(200, self.service.list_jobs())
+            return
+        if len(parts) == 2 and parts[0] == "articles":
+            self.send_article(parts[1])
+            return
+        job = self.service.get_job(parts[1]) if len(parts) >= 2 and parts[0] == "jobs" else None
+        if job is None:
+            self.send_json(404, {"error": "not found"})
+        elif len(parts) == 2:
+            self.send_json(200, job.summary())
+        elif parts[2] == "results":
+            since = parse_qs(url.query).get("since", ["0"])[0]
+            if not since.isdigit():
+                self.send_json(400, {"error": f"since must be a non-negative integer, got {since!r}"})
+                return
+            since = int(since)
+            self.send_json(200, {**job.summary(), "since": since, "items": job.results_since(since)})
+        elif parts[2] == "stream":
+            self.stream(job)
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def send_article(self, index):
+        path = self.service.article_file(int(index)) if index.isdigit() else None
+        if path is None or not os.path.exists(path):
+            self.send_json(404, {"error": "not found"})
+            return
+        with open(path, "rb") as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream(self, job):
+        """Write results as JSON lines while the job runs; the response ends with the job."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        sent = 0
+        try:
+            while True:
+                finished = job.done
+                items = job.results_since(sent, wait=1.0)
+                for item in items:
+                    self.wfile.write(serialization.dumps(item) + b"\n")
+                self.wfile.flush()
+                sent += len(items)
+                if finished and not items:
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def start_api(service, host, port):
+    handler = type("Handler", (_Handler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="service-api", daemon=True).start()
+    print(f"[INFO] Collector service listening on http://{host}:{port}/jobs")
+    return server
+
+
+async def serve(args):
+    service = Service(args)
+    await service.start()
+    server = start_api(service, args.host, args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        server.shutdown()
+        await service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the collectors as a long-lived service with warm clients and a local HTTP/JSON job API."
+    )
+    parser.add_argument('--host', type=str, default='127.0.0.1', help="Address to listen on (default: 127.0.0.1).")
+    parser.add_argument('--port', type=int, default=8765, help="Port to listen on (default: 8765).")
+    parser.add_argument('-n', '--n', type=int, default=10,
+                        help="Default number of story IDs to collect per interest (default: 10).")
+    parser.add_argument('-o', '--output-dir', type=str, default='.',
+                        help="Directory for story IDs, metadata, sources and progress (default: current directory).")
+    parser.add_argument('--url-csv', type=str, default='urls.csv', help="URL mapping CSV to append to (default: urls.csv).")
+    parser.add_argument('--fetch-dir', type=str, default='download',
+                        help="Directory where HTML and JSON files will be saved (default: download).")
+    parser.add_argument('--qualify', type=str, default=DEFAULT_SPEC,
+                        help=f"Only fetch articles of stories whose sources meet these bias counts, or 'none' (default: {DEFAULT_SPEC}).")
+    parser.add_argument('--story-workers', type=int, default=5, help="Concurrent story ID requests (default: 5).")
+    parser.add_argument('--source-workers', type=int, default=5, help="Concurrent sources fetches (default: 5).")
+    parser.add_argument('--fetch-workers', type=int, default=8, help="Concurrent full-text fetches (default: 8).")
+    parser.add_argument('--render-backend', choices=["none", "contexts"], default="none",
+                        help="none: HTTP tier only; contexts: keep a browser pool warm for pages that need rendering (default: none).")
+    parser.add_argument('--browsers', type=int, default=1, help="Browser processes of the browser pool (default: 1).")
+    parser.add_argument('--contexts', type=int, default=8, help="Contexts per browser of the browser pool (default: 8).")
+    parser.add_argument('--metadata-max-age', type=float, default=7,
+                        help="Days after which cached interest metadata is refetched (default: 7).")
+    parser.add_argument('--sleep-scale', type=float, default=1.0,
+                        help="Multiplier for the rate-limiting sleeps between requests (default: 1.0).")
+    profiling.add_argument(parser)
+    aio.add_argument(parser)
+    args = parser.parse_args()
+
+    get_story_ids.SLEEP_SCALE = args.sleep_scale
+    download_news_sources.SLEEP_SCALE = args.sleep_scale
+    profiling.start(args.profile)
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("[INFO] Service stopped. State has been checkpointed.")
+
+
+if __name__ == '__main__':
+    main()
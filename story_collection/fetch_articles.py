@@ -1,7 +1,13 @@
+import os
 import httpx
 import json
 import time
 
+from common import cassette
+
+# API host; override with GROUND_NEWS_API to run against a local stand-in (see benchmark/)
+API_BASE = os.environ.get("GROUND_NEWS_API", "https://web-api-cdn.ground.news")
+
 # Load story IDs from file
 with open("event_ids.json", "r", encoding="utf-8") as f:
     events = json.load(f) 
@@ -13,6 +19,7 @@ headers = {
 }
 
 saved_articles = []
+client = httpx.Client(transport=cassette.transport())  # Records or replays under GN_CASSETTE
 MAX_RETRIES = 3  # Number of retries for failed requests
 
 for event in events:
@@ -23,13 +30,13 @@ for event in events:
         print(f"[ERROR] Missing event_id in: {event}")
         continue
     
-    url = f"https://web-api-cdn.ground.news/api/public/event/{story_id}/sources"
+    url = f"{API_BASE}/api/public/event/{story_id}/sources"
 
     print(f"Fetching: {url}")  
 
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            response = httpx.get(url, headers=headers, timeout=10)
+            response = client.get(url, headers=headers, timeout=10)
 
             if response.status_code == 200:
                 data = response.json()
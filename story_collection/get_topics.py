@@ -5,6 +5,8 @@ import httpx
 import json
 import time
 
+from common.idset import UuidSet
+
 BASE_URL = "https://web-api-cdn.ground.news/api/public/interest/453a847a-ac24-45d3-a937-63fc9d6a1318/events"
 
 headers = {
@@ -12,7 +14,7 @@ headers = {
     "Accept": "application/json"
 }
 
-all_event_ids = set() 
+all_event_ids = UuidSet()
 
 for offset in range(1, 9900):
     url = f"{BASE_URL}?sort=time&offset={offset}"
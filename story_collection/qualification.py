@@ -0,0 +1,39 @@
+from collections import Counter
+
+from story_collection.story_index import BUCKETS, parse_term
+
+# Story qualification from bias metadata alone, so stories can be filtered before any of
+# their articles are fetched. A filter is a comma-separated list of count predicates in the
+# story index syntax, e.g. "articles>=4,left>=2,right>=2" (the test of stats.qualify with
+# its default threshold). An empty spec or "none" accepts every story.
+
+DEFAULT_SPEC = "articles>=4,left>=2,right>=2"
+
+
+class StoryFilter:
+    def __init__(self, spec=DEFAULT_SPEC):
+        self.spec = spec or ""
+        self.predicates = []
+        if self.spec.strip().lower() not in ("", "none"):
+            for term in self.spec.split(","):
+                field, op, value = parse_term(term)
+                if op != ">=":
+                    raise ValueError(f"Qualification terms must be counts such as left>=2, got {term!r}")
+                self.predicates.append((field, value))
+
+    def __bool__(self):
+        return bool(self.predicates)
+
+    def __call__(self, biases):
+        """Whether a story qualifies, given the bias labels of its articles."""
+        if not self.predicates:
+            return True
+        labels = Counter(biases)
+        counts = {bucket: sum(labels[label] for label in bucket_labels) for bucket, bucket_labels in BUCKETS.items()}
+        counts["articles"] = len(biases)
+        return all(counts[field] >= value for field, value in self.predicates)
+
+
+def source_biases(story):
+    """Bias labels of the sources in a sourcesForWeb response."""
+    return [(source.get("sourceInfo") or {}).get("bias") or "Unknown" for source in (story or {}).get("sources", [])]
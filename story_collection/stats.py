@@ -1,18 +1,25 @@
-import os
-import json
+import glob
 import argparse
 from collections import Counter
 
+from story_collection import story_index
+
 threshold = 4
-def qualify(articles, threshold=4):
-    sufficient_quantity = len(articles) >= threshold
-    bias = Counter([_['bias'] for _ in articles])
+def qualify(biases, threshold=4):
+    """Whether a story, given its articles' bias labels, has enough articles from both sides."""
+    sufficient_quantity = len(biases) >= threshold
+    bias = Counter(biases)
     sufficient_left = (bias['Lean Left'] + bias['Left'] >= threshold // 2)
     sufficient_right = (bias['Lean Right'] + bias['Right'] >= threshold // 2)
     sufficient_bias = sufficient_left and sufficient_right
     return sufficient_bias and sufficient_quantity
 
 
+def qualified_stories(index, threshold=4):
+    """Story numbers in a StoryIndex that qualify, as an intersection of bias bucket postings."""
+    return index.query([f'articles>={threshold}', f'left>={threshold // 2}', f'right>={threshold // 2}'])
+
+
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser()
@@ -22,34 +29,29 @@ if __name__ == '__main__':
 
     topic_name = 'all'
     if topic_name == 'all':
-        file_list = os.listdir(f'story_collection/{args.tag}_interest/')
-        data = {}
-        for file in file_list:
-            with open(f'story_collection/{args.tag}_interest/' + file, 'r', encoding='utf-8') as f:
-                data = data | json.load(f)
-
+        file_list = sorted(glob.glob(f'story_collection/{args.tag}_interest/*.json'))
     else:
-        with open(f'story_collection/{args.tag}_interest/' + topic_name + '.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        file_list = [data]
+        file_list = [f'story_collection/{args.tag}_interest/' + topic_name + '.json']
+    # Only files that changed since the last run are reindexed
+    index = story_index.open_updated('interest', args.tag, files=file_list)
 
     print('the number of topics:')
     print(len(file_list))
 
     print('the number of stories:')
-    print(len(data))
+    print(len(index.query([])))
 
     print('the number of article info:')
-    print(sum([len(data[story]) for story in data]))
+    print(len(index.query([], target='A')))
 
+    qualified = [index.story(s) for s in qualified_stories(index, threshold)]
     print(f'the number of stories that have {threshold} or more articles '
           f'and have {threshold//2} or more on both sides: ', end='\n')
-    print(sum([qualify(data[story]) for story in data if story != 'stats']))
+    print(len(qualified))
 
     print('the number of articles in these stories: ', end='\n')
-    print(sum([len(data[story]) for story in data if story != 'stats' and qualify(data[story])]))
+    print(sum([story['articles'][1] for story in qualified]))
 
     print('the number of words (split by space) in the current article abstract: ', end='\n')
-    print(sum([len(article['abstract'].split(' '))
-               for story in data if story != 'stats' and qualify(data[story])
-               for article in data[story]]))
+    print(sum([story['words'] for story in qualified]))
+    index.close()
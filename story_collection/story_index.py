@@ -0,0 +1,422 @@
+import os
+import re
+import dbm
+import glob
+import shutil
+import argparse
+import tempfile
+from array import array
+from datetime import timedelta
+from collections import defaultdict
+
+from common import records, serialization
+
+# On-disk inverted index over collected stories and their articles.
+#
+# Postings map a term to the sorted numbers of the stories (S|...) or articles (A|...) it
+# occurs in. Terms are field=value for outlet, domain, bias, factuality, topic and month,
+# plus bias bucket counts: a story with three Right/Lean Right articles is posted under
+# right>=1, right>=2 and right>=3, so "at least k" is a single lookup. Queries intersect
+# postings, smallest first. The index is kept next to its input and updated incrementally:
+# only files whose mtime changed since the last build are reindexed, and files no longer in
+# the input are dropped.
+#
+# A story can occur in several files (the same story under several interests). It is
+# indexed from the last of them in input order, like merging the files' dicts, and the
+# index remembers every file that contains it. When that file changes or disappears, the
+# story is indexed again from the next file that still has it, so an incremental update
+# gives the same index as a full rebuild ("check" compares the two).
+#
+# Keys in the dbm file:
+#   S|<term>, A|<term>   postings (array of uint32)
+#   s:<story ID>         story number
+#   c:<story ID>         files containing the story
+#   m:<number>           story metadata (ID, file, article numbers, word count, keys it is posted under)
+#   a:<number>           article ID, "<story ID>/<article index>"
+#   f:<path>             mtime and story IDs of an indexed file
+
+BUCKETS = {
+    "left": ("Left", "Lean Left"),
+    "center": ("Center",),
+    "right": ("Right", "Lean Right"),
+}
+BUCKET_CAP = 64  # Bucket counts are posted up to this count; larger thresholds are rejected
+FIELDS = ("outlet", "domain", "bias", "factuality", "topic", "month")
+
+LOADERS = {
+    "interest": lambda files: records.load_story_metadata(files, unique_titles=False),
+    "sources": lambda files: records.load_news_sources(files, keep_urls=False),
+    "full_text": records.load_full_text_files,
+}
+
+FORMAT = b"2"  # Key layout version; an index in another layout is rebuilt
+
+_TERM = re.compile(r"^(\w+)(>=|=)(.+)$")
+
+
+def month_of(date):
+    if date == records.UNKNOWN_DATE:
+        return None
+    return (records._EPOCH + timedelta(days=date)).strftime("%Y-%m")
+
+
+def parse_term(text):
+    """Parse "field=value" or "bucket>=k" (also "articles>=k") into (field, op, value)."""
+    match = _TERM.match(text.strip())
+    if not match:
+        raise ValueError(f"Invalid term {text!r}, expected field=value or bucket>=count")
+    field, op, value = match.groups()
+    if op == "=" and field not in FIELDS:
+        raise ValueError(f"Unknown field {field!r}, expected one of {', '.join(FIELDS)}")
+    if op == ">=":
+        if field not in BUCKETS and field != "articles":
+            raise ValueError(f"Unknown bucket {field!r}, expected articles or one of {', '.join(BUCKETS)}")
+        value = int(value)
+        if not 1 <= value <= BUCKET_CAP:
+            raise ValueError(f"Bucket thresholds must be between 1 and {BUCKET_CAP}, got {value}")
+    return field, op, value
+
+
+def _term_key(field, op, value):
+    if op == ">=":
+        return f"{field}>={value}"
+    return f"{field}={value}"
+
+
+class StoryIndex:
+    def __init__(self, path):
+        self.path = path
+        self.db = dbm.open(path, "c")
+        if self.db.get(b"__format__") != FORMAT:
+            # Older layouts lack the story -> files keys, so start over
+            self.db.close()
+            self.db = dbm.open(path, "n")
+            self.db[b"__format__"] = FORMAT
+        # Buffered posting changes, key -> [added, removed], written by flush()
+        self.pending = defaultdict(lambda: (set(), set()))
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    # --- Postings ---
+
+    def _stored(self, key):
+        posting = array("I")
+        value = self.db.get(key.encode("utf-8"))
+        if value:
+            posting.frombytes(value)
+        return posting
+
+    def _add(self, key, number):
+        added, removed = self.pending[key]
+        added.add(number)
+        removed.discard(number)
+
+    def _remove(self, key, number):
+        added, removed = self.pending[key]
+        added.discard(number)
+        removed.add(number)
+
+    def flush(self):
+        for key, (added, removed) in self.pending.items():
+            numbers = (set(self._stored(key)) - removed) | added
+            if numbers:
+                self.db[key.encode("utf-8")] = array("I", sorted(numbers)).tobytes()
+            elif key.encode("utf-8") in self.db:
+                del self.db[key.encode("utf-8")]
+        self.pending.clear()
+
+    def posting(self, target, term):
+        """Sorted story ("S") or article ("A") numbers posted under a term key."""
+        return self._stored(f"{target}|{term}")
+
+    # --- Building ---
+
+    def _delete(self, key):
+        if key in self.db:
+            del self.db[key]
+
+    def _next(self, counter):
+        number = int(self.db.get(counter, b"0"))
+        self.db[counter] = str(number + 1)
+        return number
+
+    def _drop_story(self, number):
+        meta_key = f"m:{number}".encode()
+        if meta_key not in self.db:
+            return
+        meta = serialization.loads(self.db[meta_key])
+        first, count = meta["articles"]
+        for key in meta["keys"]:
+            if key.startswith("S|"):
+                self._remove(key, number)
+            else:
+                for article in range(first, first + count):
+                    self._remove(key, article)
+        for article in range(first, first + count):
+            self._delete(f"a:{article}".encode())
+        del self.db[meta_key]
+
+    def _add_story(self, table, s, path):
+        story_id = table.story_titles[s]
+        story_key = f"s:{story_id}".encode("utf-8")
+        if story_key in self.db:
+            number = int(self.db[story_key])
+            self._drop_story(number)
+        else:
+            number = self._next(b"__stories__")
+            self.db[story_key] = str(number)
+
+        rows = table.story_rows(s)
+        first = int(self.db.get(b"__articles__", b"0"))
+        self.db[b"__articles__"] = str(first + len(rows))
+
+        keys = {"S|all", "A|all"}
+        topic = table.topics[table.story_topic[s]]
+        bucket_counts = defaultdict(int)
+        for offset, row in enumerate(rows):
+            article = first + offset
+            self.db[f"a:{article}".encode("utf-8")] = f"{story_id}/{table.article_idx[row]}"
+            bias = table.biases[table.bias[row]]
+            terms = {
+                "outlet": table.outlets[table.outlet[row]],
+                "domain": table.domains[table.domain[row]],
+                "bias": bias,
+                "factuality": table.factualities[table.factuality[row]],
+                "topic": topic,
+                "month": month_of(table.date[row]),
+            }
+            self._add("A|all", article)
+            for field, value in terms.items():
+                if value:
+                    key = _term_key(field, "=", value)
+                    self._add("A|" + key, article)
+                    keys.add("A|" + key)
+                    keys.add("S|" + key)
+            for bucket, labels in BUCKETS.items():
+                if bias in labels:
+                    bucket_counts[bucket] += 1
+        bucket_counts["articles"] = len(rows)
+
+        self._add("S|all", number)
+        for key in keys:
+            if key.startswith("S|") and key != "S|all":
+                self._add(key, number)
+        for bucket, count in bucket_counts.items():
+            for k in range(1, min(count, BUCKET_CAP) + 1):
+                key = f"S|{bucket}>={k}"
+                self._add(key, number)
+                keys.add(key)
+
+        words = sum(table.words[row] for row in rows)
+        self.db[f"m:{number}".encode()] = serialization.dumps({
+            "id": story_id, "file": path, "articles": [first, len(rows)], "words": words, "keys": sorted(keys),
+        })
+        return number
+
+    def _files_of(self, story_id):
+        key = f"c:{story_id}".encode("utf-8")
+        return set(serialization.loads(self.db[key])) if key in self.db else set()
+
+    def _set_files_of(self, story_id, paths):
+        key = f"c:{story_id}".encode("utf-8")
+        if paths:
+            self.db[key] = serialization.dumps(sorted(paths))
+        else:
+            self._delete(key)
+
+    def update(self, files, kind, full=False):
+        """
+        Index new or changed files of one kind (see LOADERS) and drop indexed files missing
+        from files. Returns the number of files reindexed or dropped.
+        """
+        load = LOADERS[kind]
+        order = {path: i for i, path in enumerate(files)}
+        indexed = [key[2:].decode("utf-8") for key in self.db.keys() if key.startswith(b"f:")]
+
+        # Changed files and the stories they gained or lost
+        tables = {}  # path -> (table, story ID -> story), for files loaded in this update
+        affected = set()
+        changed = 0
+        for path in [path for path in indexed if path not in order] + list(files):
+            file_key = f"f:{path}".encode("utf-8")
+            state = serialization.loads(self.db[file_key]) if file_key in self.db else None
+            if path in order:
+                mtime = os.path.getmtime(path)
+                if state and state["mtime"] == mtime and not full:
+                    continue
+                table = load([path])
+                tables[path] = (table, {table.story_titles[s]: s for s in range(table.num_stories)})
+                ids = set(tables[path][1])
+                self.db[file_key] = serialization.dumps({"mtime": mtime, "ids": sorted(ids)})
+            else:
+                ids = set()
+                del self.db[file_key]
+            old_ids = set(state["ids"]) if state else set()
+            for story_id in old_ids - ids:
+                self._set_files_of(story_id, self._files_of(story_id) - {path})
+            for story_id in ids - old_ids:
+                self._set_files_of(story_id, self._files_of(story_id) | {path})
+            affected |= old_ids | ids
+            changed += 1
+
+        # Index each affected story from the last file that contains it
+        for story_id in sorted(affected):
+            story_key = f"s:{story_id}".encode("utf-8")
+            paths = [path for path in self._files_of(story_id) if path in order]
+            if not paths:
+                if story_key in self.db:
+                    self._drop_story(int(self.db[story_key]))
+                    del self.db[story_key]
+                continue
+            owner = max(paths, key=order.get)
+            if owner not in tables:
+                current = self.story(int(self.db[story_key])) if story_key in self.db else None
+                if current and current["file"] == owner:
+                    continue
+                table = load([owner])
+                tables[owner] = (table, {table.story_titles[s]: s for s in range(table.num_stories)})
+            table, stories = tables[owner]
+            self._add_story(table, stories[story_id], owner)
+            # Keep the buffered postings bounded
+            if len(self.pending) > 100_000:
+                self.flush()
+        self.flush()
+        return changed
+
+    # --- Queries ---
+
+    def query(self, terms, target="S"):
+        """
+        Numbers of the stories (target "S") or articles ("A") matching all terms. Terms are
+        strings or parsed tuples (see parse_term); several values for the same field are ORed.
+        """
+        by_field = defaultdict(list)
+        for term in terms:
+            field, op, value = parse_term(term) if isinstance(term, str) else term
+            if op == ">=" and target == "A":
+                raise ValueError("Bucket counts apply to stories only")
+            by_field[(field, op)].append(_term_key(field, op, value))
+
+        result = None
+        postings = []
+        for keys in by_field.values():
+            union = set()
+            for key in keys:
+                union.update(self.posting(target, key))
+            postings.append(union)
+        for posting in sorted(postings, key=len):
+            result = posting if result is None else result & posting
+            if not result:
+                break
+        if result is None:
+            result = set(self.posting(target, "all"))
+        return sorted(result)
+
+    def story(self, number):
+        """Metadata of a story number: ID, file, [first article, count], words."""
+        return serialization.loads(self.db[f"m:{number}".encode()])
+
+    def article_id(self, number):
+        return self.db[f"a:{number}".encode()].decode("utf-8")
+
+    def stories(self, terms):
+        return [self.story(number)["id"] for number in self.query(terms, "S")]
+
+    def articles(self, terms):
+        return [self.article_id(number) for number in self.query(terms, "A")]
+
+
+def default_files(kind, tag):
+    if kind == "interest":
+        return sorted(glob.glob(f"story_collection/{tag}_interest/*.json"))
+    if kind == "full_text":
+        return [p for p in sorted(glob.glob(f"{tag}_news/*/*.json")) if os.path.basename(p) != "0-logs.json"]
+    return sorted(glob.glob("news_sources/*.json") + glob.glob("news_sources/*.jsonl"))
+
+
+def snapshot(index):
+    """Stories and postings of an index by story and article ID, independent of their numbering."""
+    index.flush()
+    stories, postings = {}, {}
+    story_ids, article_ids = {}, {}
+    for key in index.db.keys():
+        if key.startswith(b"m:"):
+            meta = serialization.loads(index.db[key])
+            story_ids[int(key[2:])] = meta["id"]
+            stories[meta["id"]] = (meta["file"], meta["words"], meta["articles"][1], sorted(meta["keys"]))
+        elif key.startswith(b"a:"):
+            article_ids[int(key[2:])] = index.db[key].decode("utf-8")
+    for key in index.db.keys():
+        if key[:2] in (b"S|", b"A|"):
+            ids = story_ids if key.startswith(b"S|") else article_ids
+            numbers = index.posting(key[:1].decode(), key[2:].decode("utf-8"))
+            postings[key.decode("utf-8")] = sorted(str(ids.get(number)) for number in numbers)
+    return stories, postings
+
+
+def check(kind, tag, index_path=None, files=None):
+    """Compare the incrementally updated index with a full rebuild. Returns the differing story IDs and terms."""
+    files = files if files is not None else default_files(kind, tag)
+    index = open_updated(kind, tag, index_path, files)
+    tmp_dir = tempfile.mkdtemp()
+    rebuilt = StoryIndex(os.path.join(tmp_dir, "full.idx"))
+    try:
+        rebuilt.update(files, kind, full=True)
+        (stories, postings), (full_stories, full_postings) = snapshot(index), snapshot(rebuilt)
+    finally:
+        index.close()
+        rebuilt.close()
+        shutil.rmtree(tmp_dir)
+    differing = sorted(key for key in stories.keys() | full_stories.keys()
+                       if stories.get(key) != full_stories.get(key))
+    differing += sorted(key for key in postings.keys() | full_postings.keys()
+                        if postings.get(key) != full_postings.get(key))
+    if differing:
+        print(f"[ERROR] {len(differing)} stories or postings differ from a full rebuild, e.g. {differing[:5]}")
+    else:
+        print(f"[INFO] Index matches a full rebuild: {len(full_stories)} stories, {len(full_postings)} postings")
+    return differing
+
+
+def open_updated(kind, tag, index_path=None, files=None, full=False):
+    """Open the index for a kind of input, updating it from the files that changed."""
+    index_path = index_path or f"story_collection/{tag}_{kind}.idx"
+    index = StoryIndex(index_path)
+    files = files if files is not None else default_files(kind, tag)
+    changed = index.update(files, kind, full=full)
+    if changed:
+        print(f"[INFO] Indexed {changed} new or changed file(s) into {index_path}")
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build and query the inverted index over collected stories.")
+    parser.add_argument('command', choices=['build', 'query', 'check'],
+                        help='build (update) the index, query it, or check it against a full rebuild')
+    parser.add_argument('--tag', type=str, default='latest', help='the tag to use for data version labeling')
+    parser.add_argument('--kind', choices=sorted(LOADERS), default='interest',
+                        help='input files: story_collection/{tag}_interest, news_sources or {tag}_news (default: interest)')
+    parser.add_argument('--input', type=str, nargs='*', default=None, help='input files, instead of the default location of the kind')
+    parser.add_argument('--index', type=str, default=None, help='index path (default: story_collection/{tag}_{kind}.idx)')
+    parser.add_argument('--full', action='store_true', help='reindex all files, not only those that changed')
+    parser.add_argument('-w', '--where', action='append', default=[],
+                        help='a term such as outlet=NPR, month=2024-03 or right>=2; may be repeated')
+    parser.add_argument('--articles', action='store_true', help='list matching article IDs instead of story IDs')
+    parser.add_argument('--count', action='store_true', help='only print the number of matches')
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        raise SystemExit(1 if check(args.kind, args.tag, args.index, args.input) else 0)
+    index = open_updated(args.kind, args.tag, args.index, args.input, args.full)
+    try:
+        if args.command == 'query':
+            matches = index.articles(args.where) if args.articles else index.stories(args.where)
+            if args.count:
+                print(len(matches))
+            else:
+                for match in matches:
+                    print(match)
+    finally:
+        index.close()